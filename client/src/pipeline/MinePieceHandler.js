@@ -14,18 +14,32 @@ function vtp({ url, piece, translate, renderer, getters }) {
   const reader = vtkXMLPolyDataReader.newInstance();
   reader.setUrl(url).then(() => {
     const polydata = reader.getOutputData();
-    const points = polydata.getPoints().getData();
-
-    // Apply tranformation to the points coordinates
-    vtkMatrixBuilder
-      .buildFromRadian()
-      .translate(...translate)
-      .apply(points);
-
-    polydata.getPoints().modified();
-
     const mapper = vtkMapper.newInstance({ scalarVisibility: false });
     const actor = vtkActor.newInstance();
+
+    // Files converted with a local origin hold points relative to it, which
+    // only needs the actor to be moved instead of every point
+    const originArray = polydata.getFieldData().getArrayByName('Origin');
+    const origin =
+      (originArray && originArray.getData()) ||
+      (piece.extra_json_attributes && piece.extra_json_attributes.origin);
+
+    if (origin) {
+      actor.setPosition(
+        origin[0] + translate[0],
+        origin[1] + translate[1],
+        origin[2] + translate[2]
+      );
+    } else {
+      // Apply tranformation to the points coordinates
+      vtkMatrixBuilder
+        .buildFromRadian()
+        .translate(...translate)
+        .apply(polydata.getPoints().getData());
+
+      polydata.getPoints().modified();
+    }
+
     actor.getProperty().setInterpolationToFlat();
     actor.getProperty().set({
       ambient: 1.0,
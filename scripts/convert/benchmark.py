@@ -0,0 +1,470 @@
+"""
+    Benchmark of the DXF to VTP converter on synthetic DXF files.
+
+    Generates DXF files with configurable numbers of POLYLINE, LWPOLYLINE,
+    LINE, TEXT, MTEXT and 3DFACE entities, and of polyface mesh shells,
+    spread over many colors and layers at
+    UTM coordinates like those of the mine, then times their conversion
+    by dxf_to_vtp() of converter.py, end to end and per stage as its
+    ConversionStatistics report them, with the conversion options given.
+    With --cold-start, also times the conversion by a fresh interpreter
+    running the command line, with the standalone engine or through the
+    ParaView reader plugin in pvpython.  Results are written as JSON, and
+    can be compared with those of a previous revision:
+
+        python benchmark.py --cases small medium --output after.json --compare before.json
+"""
+import json, math, os, platform, random, subprocess, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import numpy
+
+import engine
+import converter
+
+
+# Bounds of the generated entities, those of the mineplan boundaries
+SITE_BOUNDS = (650200, 652700, 4766170, 4768695, -500, 1200)
+
+# Number of entities of each type in the generated files of each case
+CASES = {
+    'small': { 'polylines': 2000, 'lwpolylines': 2000, 'lines': 4000, 'texts': 1000, 'mtexts': 200 },
+    'medium': { 'polylines': 20000, 'lwpolylines': 20000, 'lines': 40000, 'texts': 10000, 'mtexts': 2000 },
+    'large': { 'polylines': 100000, 'lwpolylines': 100000, 'lines': 200000, 'texts': 50000, 'mtexts': 10000 },
+    # A single polyface shell of a million triangles, like an ore-body shell
+    'shell': { 'faces': 20000, 'shells': 1, 'shell_size': 708 },
+}
+
+# The command line converting a file in a fresh interpreter for --cold-start
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cli.py')
+
+# Order in which the stages of ConversionStatistics are printed, those of
+# the conversion options used only
+STAGES = ('load', 'index', 'scan', 'split', 'workers', 'merge', 'parse', 'handlers', 'glyphs', 'blocks', 'build',
+          'append', 'write')
+
+
+#------------------------------------------------------------------------------
+# Synthetic DXF files
+#------------------------------------------------------------------------------
+def generate_dxf(path, polylines=0, lwpolylines=0, lines=0, texts=0, mtexts=0, colors=16, layers=40,
+                 vertices=(2, 40), labels=50, seed=0, faces=0, shells=0, shell_size=20):
+    """
+        Write a DXF file with the given number of entities of each type, in
+        random order.  Polylines have between vertices[0] and vertices[1]
+        vertices, and text entities use labels distinct strings, since mine
+        plans repeat the same few labels.  faces are 3DFACE triangles and
+        quads, and shells polyface meshes of a shell_size by shell_size grid
+        of vertices, each of its squares split into two triangles.
+    """
+    rand = random.Random(seed)
+    xmin, xmax, ymin, ymax, zmin, zmax = SITE_BOUNDS
+    layerNames = ['LEVEL_{0:04d} {1}'.format(rand.randint(1100, 1400),
+                                             rand.choice(['WALLS', 'DRIVES', 'FAULTS', 'SERVICES']))
+                  for _ in range(layers)]
+    labelStrings = [rand.choice(['L{0}', '-{0}.5', 'DRIVE {0}', 'XC{0} N']).format(rand.randint(1, 1400))
+                    for _ in range(labels)]
+
+    kinds = ['POLYLINE'] * polylines + ['LWPOLYLINE'] * lwpolylines + ['LINE'] * lines + \
+        ['TEXT'] * texts + ['MTEXT'] * mtexts + ['3DFACE'] * faces + ['POLYFACE'] * shells
+    rand.shuffle(kinds)
+
+    handle = [0x100]
+
+    def nextHandle():
+        handle[0] += 1
+        return '{0:X}'.format(handle[0])
+
+    with open(path, 'w') as fp:
+        def tag(code, value):
+            fp.write('{0:>3}\n{1}\n'.format(code, value))
+
+        tag(0, 'SECTION')
+        tag(2, 'HEADER')
+        tag(9, '$ACADVER')
+        tag(1, 'AC1015')
+        tag(9, '$DWGCODEPAGE')
+        tag(3, 'ANSI_1252')
+        tag(0, 'ENDSEC')
+        tag(0, 'SECTION')
+        tag(2, 'ENTITIES')
+
+        for kind in kinds:
+            layer = rand.choice(layerNames)
+            color = rand.randint(1, colors)
+            x, y, z = rand.uniform(xmin, xmax), rand.uniform(ymin, ymax), rand.uniform(zmin, zmax)
+
+            tag(0, 'POLYLINE' if kind == 'POLYFACE' else kind)
+            tag(5, nextHandle())
+            tag(8, layer)
+            tag(62, color)
+
+            if kind == 'LINE':
+                angle = rand.uniform(0, 2 * math.pi)
+                length = rand.uniform(1, 20)
+                tag(10, x)
+                tag(20, y)
+                tag(30, z)
+                tag(11, x + length * math.cos(angle))
+                tag(21, y + length * math.sin(angle))
+                tag(31, z)
+            elif kind == 'LWPOLYLINE':
+                count = rand.randint(*vertices)
+                tag(90, count)
+                tag(70, rand.choice([0, 1]))
+                tag(38, z)
+                for _ in range(count):
+                    x, y = x + rand.uniform(-5, 5), y + rand.uniform(-5, 5)
+                    tag(10, x)
+                    tag(20, y)
+            elif kind == 'POLYLINE':
+                tag(66, 1)
+                tag(10, 0)
+                tag(20, 0)
+                tag(30, 0)
+                tag(70, 8)
+                for _ in range(rand.randint(*vertices)):
+                    x, y, z = x + rand.uniform(-5, 5), y + rand.uniform(-5, 5), z + rand.uniform(-0.5, 0.5)
+                    tag(0, 'VERTEX')
+                    tag(5, nextHandle())
+                    tag(8, layer)
+                    tag(10, x)
+                    tag(20, y)
+                    tag(30, z)
+                    tag(70, 32)
+                tag(0, 'SEQEND')
+                tag(5, nextHandle())
+                tag(8, layer)
+            elif kind == '3DFACE':
+                corners = [(x, y, z)] + [(x + rand.uniform(-5, 5), y + rand.uniform(-5, 5), z + rand.uniform(-1, 1))
+                                         for _ in range(3)]
+                if rand.random() < 0.5:
+                    # Triangles repeat their third corner
+                    corners[3] = corners[2]
+                for i, corner in enumerate(corners):
+                    for axis, value in enumerate(corner):
+                        tag(10 * (axis + 1) + i, value)
+            elif kind == 'POLYFACE':
+                size = shell_size
+                tag(66, 1)
+                tag(10, 0)
+                tag(20, 0)
+                tag(30, 0)
+                tag(70, 64)
+                tag(71, size * size)
+                tag(72, 2 * (size - 1) * (size - 1))
+                step = 500.0 / size
+                for i in range(size):
+                    for j in range(size):
+                        tag(0, 'VERTEX')
+                        tag(8, layer)
+                        tag(10, x + i * step)
+                        tag(20, y + j * step)
+                        tag(30, z + 50 * math.sin(i * 0.05) * math.cos(j * 0.05))
+                        tag(70, 192)
+                for i in range(size - 1):
+                    for j in range(size - 1):
+                        a = i * size + j + 1
+                        # The diagonal splitting the square is an invisible edge
+                        for corners in ((a, a + size, -(a + size + 1)), (a + size + 1, a + 1, -a)):
+                            tag(0, 'VERTEX')
+                            tag(8, layer)
+                            tag(10, 0)
+                            tag(20, 0)
+                            tag(30, 0)
+                            tag(70, 128)
+                            for code, index in zip((71, 72, 73), corners):
+                                tag(code, index)
+                tag(0, 'SEQEND')
+                tag(8, layer)
+            elif kind == 'TEXT':
+                tag(10, x)
+                tag(20, y)
+                tag(30, z)
+                tag(40, 2.5)
+                tag(1, rand.choice(labelStrings))
+                tag(50, rand.uniform(0, 360))
+            else:
+                tag(10, x)
+                tag(20, y)
+                tag(30, z)
+                tag(40, 5.0)
+                tag(1, rand.choice(labelStrings))
+                angle = rand.uniform(0, 2 * math.pi)
+                tag(11, math.cos(angle))
+                tag(21, math.sin(angle))
+                tag(31, 0.0)
+
+        tag(0, 'ENDSEC')
+        tag(0, 'EOF')
+
+
+#------------------------------------------------------------------------------
+# Timing of the conversion stages
+#------------------------------------------------------------------------------
+def peak_rss_kb(who='self'):
+    """
+        Peak resident set size in KB of this process, or with who='children'
+        the largest of its waited for child processes, None where unknown
+    """
+    try:
+        import resource
+    except ImportError:
+        return None
+    usage = resource.RUSAGE_CHILDREN if who == 'children' else resource.RUSAGE_SELF
+    peak = resource.getrusage(usage).ru_maxrss
+    # macOS reports bytes, Linux KB
+    return peak // 1024 if sys.platform == 'darwin' else peak
+
+
+def time_stages(input_file, output_path, options=None):
+    """
+        Convert input_file to output_path with dxf_to_vtp() and the given
+        dict of ConversionOptions, collecting ConversionStatistics, and
+        return the seconds spent in each stage it reports along with the
+        size of the result.
+    """
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(**dict(options or {}, statistics='collect'))
+    stats = converter.dxf_to_vtp(input_file, output_path, options)
+    return {
+        'stages': stats['statistics']['stages'],
+        'entities': sum(stats['entityCounts'].values()),
+        'points': stats['points'],
+        'cells': stats['cells'],
+        'outputSize': os.path.getsize(output_path),
+    }
+
+
+def time_conversion(input_file, output_path, options=None):
+    """Seconds dxf_to_vtp() takes to convert input_file with the given dict of ConversionOptions"""
+    start = time.time()
+    converter.dxf_to_vtp(input_file, output_path, converter.DEFAULT_CONVERSION_OPTIONS._replace(**(options or {})))
+    return time.time() - start
+
+
+def _run_case(task):
+    name, input_file, output_path, repeat, options = task
+    # Collecting statistics times every entity, so the end-to-end time is
+    # that of conversions without
+    totals = [time_conversion(input_file, output_path, options) for _ in range(repeat)]
+    runs = [time_stages(input_file, output_path, options) for _ in range(repeat)]
+
+    result = runs[0]
+    result['stages'] = dict([(stage, min([r['stages'].get(stage, 0.0) for r in runs])) for stage in runs[0]['stages']])
+    result.update({
+        'name': name,
+        'options': options,
+        'inputSize': os.path.getsize(input_file),
+        'total': min(totals),
+        'peakRssKb': peak_rss_kb(),
+        'workerPeakRssKb': peak_rss_kb('children'),
+    })
+    return result
+
+
+def _send_case(connection, task):
+    try:
+        connection.send((_run_case(task), None))
+    except Exception:
+        import traceback
+        connection.send((None, traceback.format_exc()))
+    finally:
+        connection.close()
+
+
+def run_case(name, input_file, work_dir, repeat=1, options=None):
+    """
+        Time the conversion of input_file with the given dict of
+        ConversionOptions, in a process of its own so the peak memory use is
+        that of the converter on this case alone.  Unlike those of a pool,
+        the process is not daemonic, so --parse-jobs can start its workers.
+    """
+    import multiprocessing
+
+    output_path = os.path.join(work_dir, '{0}.vtp'.format(name))
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=_send_case,
+                                      args=(sender, (name, input_file, output_path, repeat, options or {})))
+    process.start()
+    sender.close()
+    try:
+        result, error = receiver.recv()
+    except EOFError:
+        # Killed, e.g. out of memory, before sending anything
+        result, error = None, None
+    process.join()
+    if result is None and error is None:
+        error = 'The benchmark process exited with code {0}'.format(process.exitcode)
+    if error:
+        raise RuntimeError('Case {0} failed:\n{1}'.format(name, error))
+    return result
+
+
+def cold_start(input_file, output_path, engine_name='standalone', interpreter=None):
+    """
+        Seconds a fresh interpreter takes to convert input_file with the
+        command line of cli.py and the given engine, so the imports, and
+        with the paraview engine the ParaView startup and the loading of
+        the reader plugin, are paid as when converting a single file.  The
+        paraview engine runs in interpreter, pvpython by default.
+    """
+    interpreter = interpreter or (sys.executable if engine_name == 'standalone' else 'pvpython')
+    command = [interpreter, CLI_SCRIPT, '--input-file', input_file, '--output-file', output_path,
+               '--engine', engine_name]
+    start = time.time()
+    subprocess.check_output(command, stderr=subprocess.STDOUT)
+    return time.time() - start
+
+
+def run_cold_starts(input_file, work_dir, engines, repeat=1, pvpython=None):
+    """
+        The fastest cold_start() of each engine, or the error which made it
+        fail, e.g. without pvpython, by engine
+    """
+    results = {}
+    for engine_name in engines:
+        output_path = os.path.join(work_dir, 'cold-start-{0}.vtp'.format(engine_name))
+        try:
+            seconds = min([cold_start(input_file, output_path, engine_name, pvpython) for _ in range(repeat)])
+            results[engine_name] = {'seconds': seconds, 'error': None}
+        except (OSError, subprocess.CalledProcessError) as err:
+            output = getattr(err, 'output', None)
+            error = output.decode('utf-8', 'replace').strip().splitlines()[-1] if output else str(err)
+            results[engine_name] = {'seconds': None, 'error': error}
+    return results
+
+
+def revision():
+    """The git revision of the converter, None outside a git checkout"""
+    try:
+        output = subprocess.check_output(['git', 'describe', '--always', '--dirty'],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)), stderr=subprocess.STDOUT)
+        return output.decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_case(result, previous=None):
+    """Print the timings of a case, relative to those of previous if given"""
+    def change(value, before):
+        return ' ({0:+.0%})'.format(float(value) / before - 1) if before else ''
+
+    previous = previous or { 'stages': {} }
+    print('{0}: {1} entities, {2} points, {3} cells, {4} bytes'.format(
+        result['name'], result['entities'], result['points'], result['cells'], result['outputSize']))
+    stages = [stage for stage in STAGES if stage in result['stages']]
+    for stage in stages + sorted(set(result['stages']) - set(stages)):
+        value = result['stages'][stage]
+        print('  {0:<10} {1:8.3f}s{2}'.format(stage, value, change(value, previous['stages'].get(stage))))
+    print('  {0:<10} {1:8.3f}s{2}'.format('total', result['total'], change(result['total'], previous.get('total'))))
+    if result['peakRssKb'] is not None:
+        print('  {0:<10} {1:8.1f}MB{2}'.format('peak RSS', result['peakRssKb'] / 1024.0,
+                                              change(result['peakRssKb'], previous.get('peakRssKb'))))
+    if result.get('workerPeakRssKb'):
+        print('  {0:<10} {1:8.1f}MB{2}'.format('worker RSS', result['workerPeakRssKb'] / 1024.0,
+                                              change(result['workerPeakRssKb'], previous.get('workerPeakRssKb'))))
+    for engine_name, coldStart in sorted(result.get('coldStart', {}).items()):
+        label = 'cold {0}'.format(engine_name)
+        if coldStart['seconds'] is None:
+            print('  {0:<10} failed: {1}'.format(label, coldStart['error']))
+            continue
+        before = previous.get('coldStart', {}).get(engine_name, {}).get('seconds')
+        print('  {0:<10} {1:8.3f}s{2}'.format(label, coldStart['seconds'], change(coldStart['seconds'], before)))
+    sys.stdout.flush()
+
+
+#------------------------------------------------------------------------------
+# Command-line runnable benchmark
+#------------------------------------------------------------------------------
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Benchmark of the DXF to VTP converter")
+    parser.add_argument('--cases', nargs='+', default=['small', 'medium'], choices=sorted(CASES.keys()),
+                        help="Sizes of the generated files to convert")
+    parser.add_argument('--work-dir', default='benchmark-data',
+                        help="Directory of the generated DXF files and converted VTP files")
+    parser.add_argument('--repeat', type=int, default=1, help="Number of timed runs of each case, the fastest is kept")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the generated files")
+    parser.add_argument('--output', default=None, help="Path to the JSON file of results")
+    parser.add_argument('--compare', default=None, help="JSON file of results of a previous revision to compare with")
+    parser.add_argument('--generate', default=None, metavar='DXF',
+                        help="Only generate a DXF file, with the counts below")
+    for kind in ('polylines', 'lwpolylines', 'lines', 'texts', 'mtexts'):
+        parser.add_argument('--{0}'.format(kind), type=int, default=CASES['small'][kind],
+                            help="Number of {0} of --generate".format(kind))
+    parser.add_argument('--faces', type=int, default=0, help="Number of 3DFACE entities of --generate")
+    parser.add_argument('--shells', type=int, default=0, help="Number of polyface mesh shells of --generate")
+    parser.add_argument('--shell-size', type=int, default=20,
+                        help="Number of vertices along each side of the shells of --generate")
+    parser.add_argument('--colors', type=int, default=16, help="Number of distinct colors of --generate")
+    parser.add_argument('--layers', type=int, default=40, help="Number of distinct layers of --generate")
+    parser.add_argument('--parse-jobs', type=int, default=1,
+                        help="Number of worker processes parsing parts of each file")
+    parser.add_argument('--weld-tolerance', type=float, default=None,
+                        help="Merge points of the line work closer than this distance")
+    parser.add_argument('--origin', type=float, nargs=3, default=None, metavar=('X', 'Y', 'Z'),
+                        help="Write points relative to this origin, in single precision")
+    parser.add_argument('--include-layers', nargs='+', default=None, metavar='PATTERN',
+                        help="Only convert the layers matching one of these patterns")
+    parser.add_argument('--exclude-layers', nargs='+', default=None, metavar='PATTERN',
+                        help="Do not convert the layers matching one of these patterns")
+    parser.add_argument('--text-mode', choices=engine.TEXT_MODES, default='glyphs', help="Text mode of the conversion")
+    parser.add_argument('--block-mode', choices=engine.BLOCK_MODES, default='ignore',
+                        help="Block mode of the conversion")
+    parser.add_argument('--cell-colors', action='store_true', help="Write the entity color of every cell as cell data")
+    parser.add_argument('--cold-start', nargs='+', default=[], choices=converter.ENGINES,
+                        help="Also time the conversion of each case by a fresh interpreter, with these engines")
+    parser.add_argument('--pvpython', default=None,
+                        help="Interpreter of the paraview engine of --cold-start, pvpython on the PATH by default")
+    args = parser.parse_args()
+
+    if args.generate:
+        generate_dxf(args.generate, args.polylines, args.lwpolylines, args.lines, args.texts, args.mtexts,
+                     colors=args.colors, layers=args.layers, seed=args.seed, faces=args.faces, shells=args.shells,
+                     shell_size=args.shell_size)
+        sys.exit(0)
+
+    previous = {}
+    if args.compare:
+        with open(args.compare) as fp:
+            previous = dict([(case['name'], case) for case in json.load(fp)['cases']])
+
+    if not os.path.isdir(args.work_dir):
+        os.makedirs(args.work_dir)
+
+    options = {
+        'parse_jobs': args.parse_jobs,
+        'weld_tolerance': args.weld_tolerance,
+        'origin': args.origin,
+        'include_layers': args.include_layers,
+        'exclude_layers': args.exclude_layers,
+        'text_mode': args.text_mode,
+        'block_mode': args.block_mode,
+        'cell_colors': args.cell_colors,
+    }
+
+    results = {
+        'revision': revision(),
+        'python': platform.python_version(),
+        'numpy': numpy.__version__,
+        'vtk': engine.HAVE_VTK,
+        'options': options,
+        'cases': [],
+    }
+
+    for name in args.cases:
+        input_file = os.path.join(args.work_dir, '{0}-{1}.dxf'.format(name, args.seed))
+        if not os.path.isfile(input_file):
+            generate_dxf(input_file, seed=args.seed, **CASES[name])
+        result = run_case(name, input_file, args.work_dir, args.repeat, options)
+        if args.cold_start:
+            result['coldStart'] = run_cold_starts(input_file, args.work_dir, args.cold_start, args.repeat,
+                                                  args.pvpython)
+        results['cases'].append(result)
+        print_case(result, previous.get(name))
+
+    if args.output:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2, sort_keys=True)
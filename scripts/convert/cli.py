@@ -0,0 +1,478 @@
+"""
+    Command line of the DXF to VTP converter, and its reports.
+
+    Converts a DXF file, or a directory of them, with dxf_to_vtp() of
+    converter.py, or compares the size and speed of its output formats and
+    text modes.  PythonDXFReader.py runs this command line too, as the
+    README describes:
+
+        python cli.py --input-file lev1146.dxf --output-file lev1146.vtp
+"""
+import json, os, sys, time, zlib
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from engine import BLOCK_MODES, HAVE_VTK, TEXT_MODES, DEFAULT_GLYPH_CACHE_SIZE, scanDXFLayers, selectLayers
+from converter import (DEFAULT_CONVERSION_OPTIONS, DEFAULT_VTP_FORMAT, ENGINES, PRECOMPRESSED_ENCODINGS,
+                       QUANTIZED_BITS, VTP_COMPRESSORS, VTP_ENCODINGS, VTPFormat, batch_dxf_to_vtp,
+                       batch_output_paths, check_quantized, dxf_to_vtp, find_dxf_files, mineplan_bounds,
+                       mineplan_origin, mineplan_piece, quantized_path, read_quantized, write_manifest,
+                       write_quantized, write_vtp, _convert_arrays)
+
+
+#------------------------------------------------------------------------------
+# Reports comparing the output formats and text modes of a conversion
+#------------------------------------------------------------------------------
+def _report_arrays(input_file, options):
+    """
+        The points, cells, field data and cell data of the file dxf_to_vtp()
+        writes for input_file with the ConversionOptions options, without
+        the files written next to it, e.g. the instances and labels files
+        of the instances block mode and the labels text mode.
+    """
+    if options.text_mode not in TEXT_MODES:
+        raise ValueError('Unknown text mode: {0}'.format(options.text_mode))
+    if options.block_mode not in BLOCK_MODES:
+        raise ValueError('Unknown block mode: {0}'.format(options.block_mode))
+
+    points, cells, fieldData, _, _, _, cellData = _convert_arrays(
+        input_file, options._replace(statistics=None, split_layers=False))
+    return points, cells, fieldData, cellData
+
+
+def vtp_format_report(input_file, output_dir, options=DEFAULT_CONVERSION_OPTIONS, report=None):
+    """
+        Convert input_file once, then write it to output_dir in every
+        encoding with every compressor, at the level and block size of the
+        vtp_format of the options, in their text and block modes.  Returns a
+        list of dicts with the encoding, compressor, size, write time and
+        time to read the file back with VTK (None without VTK) of each
+        variant, calling report(row) as each completes.
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    points, cells, fieldData, cellData = _report_arrays(input_file, options)
+
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    rows = []
+    for encoding in VTP_ENCODINGS:
+        for compressor in VTP_COMPRESSORS:
+            vtpFormat = VTPFormat(*options.vtp_format)._replace(encoding=encoding, compressor=compressor)
+            path = os.path.join(output_dir, '{0}.{1}.{2}.vtp'.format(name, encoding, compressor))
+            row = { 'encoding': encoding, 'compressor': compressor, 'output': path,
+                    'size': None, 'writeSeconds': None, 'readSeconds': None, 'error': None }
+            try:
+                start = time.time()
+                write_vtp(path, points, cells, fieldData, vtpFormat, cellData=cellData)
+                row['writeSeconds'] = time.time() - start
+                row['size'] = os.path.getsize(path)
+
+                if HAVE_VTK:
+                    from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+                    start = time.time()
+                    reader = vtkXMLPolyDataReader()
+                    reader.SetFileName(path)
+                    reader.Update()
+                    row['readSeconds'] = time.time() - start
+                    if reader.GetOutput().GetNumberOfPoints() != len(points):
+                        row['error'] = 'read back {0} of {1} points'.format(
+                            reader.GetOutput().GetNumberOfPoints(), len(points))
+            except Exception as err:
+                row['error'] = '{0}: {1}'.format(type(err).__name__, err)
+
+            rows.append(row)
+            if report:
+                report(row)
+
+    return rows
+
+
+def print_vtp_format_row(row):
+    def seconds(value):
+        return '-' if value is None else '{0:.3f}'.format(value)
+
+    print('{0:<8} {1:<6} {2:>12} {3:>8} {4:>8}  {5}'.format(
+        row['encoding'], row['compressor'], '-' if row['size'] is None else row['size'],
+        seconds(row['writeSeconds']), seconds(row['readSeconds']), row['error'] or ''))
+    sys.stdout.flush()
+
+
+def _gzip_size(path):
+    """Size of the file at path once gzipped, as a web server would send it"""
+    compressor = zlib.compressobj(9, zlib.DEFLATED, 31)
+    with open(path, 'rb') as fp:
+        return len(compressor.compress(fp.read()) + compressor.flush())
+
+
+def quantized_report(input_file, output_dir, options=DEFAULT_CONVERSION_OPTIONS, report=None):
+    """
+        Convert input_file once, then write it to output_dir as a VTP file
+        in the default format, base64 appended and zlib compressed, and as
+        quantized geometry files of each of QUANTIZED_BITS, in the text and
+        block modes of the options.  Returns a list of dicts with the
+        format, size, size once gzipped, write time, time to read the file
+        back (with VTK for the VTP file, None without VTK) and, for
+        quantized files, the largest error of the points read back along
+        each axis, calling report(row) as each completes.
+    """
+    if not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    points, cells, fieldData, cellData = _report_arrays(input_file, options)
+
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    vtp = os.path.join(output_dir, '{0}.vtp'.format(name))
+    rows = []
+    for bits in (None,) + QUANTIZED_BITS:
+        path = quantized_path(vtp, bits) if bits else vtp
+        row = { 'format': 'q{0}'.format(bits) if bits else 'vtp', 'output': path, 'size': None, 'gzipSize': None,
+                'writeSeconds': None, 'readSeconds': None, 'maxError': None, 'error': None }
+        try:
+            start = time.time()
+            if bits:
+                write_quantized(path, points, cells, fieldData, cellData, bits)
+            else:
+                write_vtp(path, points, cells, fieldData, cellData=cellData)
+            row['writeSeconds'] = time.time() - start
+            row['size'] = os.path.getsize(path)
+            row['gzipSize'] = _gzip_size(path)
+
+            if bits:
+                start = time.time()
+                read_quantized(path)
+                row['readSeconds'] = time.time() - start
+                row['maxError'] = check_quantized(path, points, cells, cellData)
+            elif HAVE_VTK:
+                from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+                start = time.time()
+                reader = vtkXMLPolyDataReader()
+                reader.SetFileName(path)
+                reader.Update()
+                row['readSeconds'] = time.time() - start
+        except Exception as err:
+            row['error'] = '{0}: {1}'.format(type(err).__name__, err)
+
+        rows.append(row)
+        if report:
+            report(row)
+
+    return rows
+
+
+def print_quantized_row(row):
+    def seconds(value):
+        return '-' if value is None else '{0:.3f}'.format(value)
+
+    print('{0:<6} {1:>12} {2:>12} {3:>8} {4:>8} {5:>10}  {6}'.format(
+        row['format'], '-' if row['size'] is None else row['size'], '-' if row['gzipSize'] is None else row['gzipSize'],
+        seconds(row['writeSeconds']), seconds(row['readSeconds']),
+        '-' if row['maxError'] is None else '{0:.2g}'.format(max(row['maxError'])), row['error'] or ''))
+    sys.stdout.flush()
+
+
+def text_mode_report(input_file, output_dir, options=DEFAULT_CONVERSION_OPTIONS, report=None):
+    """
+        Convert input_file to output_dir in each text mode, with the other
+        ConversionOptions options.  Returns a list of dicts with the mode,
+        number of points and cells, size of the files written (with the
+        labels file) and conversion time of each, calling report(row) as
+        each completes.
+    """
+    name = os.path.splitext(os.path.basename(input_file))[0]
+    rows = []
+    for mode in TEXT_MODES:
+        start = time.time()
+        stats = dxf_to_vtp(input_file, os.path.join(output_dir, '{0}.{1}.vtp'.format(name, mode)),
+                           options._replace(text_mode=mode))
+        labels = stats['labels'] or { 'labels': 0, 'size': 0 }
+        row = {
+            'mode': mode,
+            'output': stats['output'],
+            'points': stats['points'] + labels['labels'],
+            'cells': stats['cells'] + labels['labels'],
+            'size': stats['size'] + labels['size'],
+            'seconds': time.time() - start,
+        }
+        rows.append(row)
+        if report:
+            report(row)
+
+    return rows
+
+
+def print_text_mode_row(row, glyphs=None):
+    shrink = ''
+    if glyphs and glyphs['size']:
+        shrink = '{0:.1%} of the size in glyph mode'.format(float(row['size']) / glyphs['size'])
+    print('{0:<8} {1:>10} {2:>10} {3:>12} {4:>8.3f}  {5}'.format(
+        row['mode'], row['points'], row['cells'], row['size'], row['seconds'], shrink))
+    sys.stdout.flush()
+
+
+#------------------------------------------------------------------------------
+# Command-line runnable dxf to vtp converter
+#------------------------------------------------------------------------------
+def weld_reduction(stats):
+    """Fraction of the points removed by vertex welding"""
+    before, after = stats['weldStatistics']
+    return 1 - float(after) / before if before else 0.0
+
+
+def write_statistics(path, statistics):
+    """Write the statistics of one conversion, or a dict of input file to statistics, as JSON"""
+    with open(path, 'w') as fp:
+        json.dump(statistics, fp, indent=2, sort_keys=True)
+
+
+def statistics_entry(stats):
+    """The statistics of a conversion, as written by --statistics, or { "cached": true } when copied from the cache"""
+    return { 'cached': True } if stats['cached'] else stats['statistics']
+
+
+def print_batch_result(result):
+    input_file, output_path, error, seconds, stats = result
+    status = 'ok' if error is None else 'FAILED ({0})'.format(error)
+    if stats and stats['cached']:
+        status = 'cached'
+    if stats and stats['weldStatistics'][0]:
+        status = '{0}, {1:.1%} fewer points'.format(status, weld_reduction(stats))
+    if stats and stats.get('skippedText'):
+        status = '{0}, {1} text entities skipped without VTK'.format(status, stats['skippedText'])
+    print('{0} -> {1}: {2} in {3:.2f}s'.format(input_file, output_path, status, seconds))
+    sys.stdout.flush()
+
+
+def main():
+    import argparse, multiprocessing
+
+    parser = argparse.ArgumentParser(description="DXF to VTP converter")
+    parser.add_argument('--virtual-env', default=None, help="Path to virtual environment root (for dxfgrabber module)")
+    parser.add_argument('--input-file', default=None, help="Path to DXF file to convert")
+    parser.add_argument('--output-file', default=None, help="Path to VTP file to create")
+    parser.add_argument('--input-dir', default=None,
+                        help="Directory, or glob pattern, of DXF files to convert in batch")
+    parser.add_argument('--output-dir', default=None, help="Directory where batch converted VTP files are written")
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(),
+                        help="Number of worker processes for batch conversion")
+    parser.add_argument('--parse-jobs', type=int, default=1,
+                        help="Number of worker processes parsing parts of a single large file, at most the number of "
+                             "cores (ignored by the workers of a batch conversion)")
+    parser.add_argument('--glyph-cache-size', type=int, default=DEFAULT_GLYPH_CACHE_SIZE,
+                        help="Number of distinct text glyphs to cache (0 disables the cache)")
+    parser.add_argument('--rotate-text', action='store_true', help="Rotate text glyphs like their TEXT/MTEXT entity")
+    parser.add_argument('--no-stream', action='store_true',
+                        help="Load the whole document with dxfgrabber instead of streaming entities")
+    parser.add_argument('--weld-tolerance', type=float, default=None,
+                        help="Merge points of the line work closer than this distance, in drawing units (0 merges "
+                             "exact duplicates only)")
+    parser.add_argument('--origin', type=float, nargs=3, default=None, metavar=('X', 'Y', 'Z'),
+                        help="Write points relative to this origin, in single precision")
+    parser.add_argument('--mineplan', default=None,
+                        help="Mineplan JSON whose boundaries give the origin, instead of --origin")
+    parser.add_argument('--lod-tolerances', type=float, nargs='+', default=[], metavar='TOLERANCE',
+                        help="Also write a level of detail with polylines simplified to each tolerance, in drawing "
+                             "units")
+    parser.add_argument('--tiles', type=int, nargs='+', default=None, metavar='N',
+                        help="Also split the output over a grid of NX NY [NZ] tiles, over the mineplan boundaries "
+                             "with --mineplan")
+    parser.add_argument('--encoding', choices=VTP_ENCODINGS, default=DEFAULT_VTP_FORMAT.encoding,
+                        help="Store arrays appended as raw binary or base64, or inline as base64")
+    parser.add_argument('--compressor', choices=list(VTP_COMPRESSORS.keys()), default=DEFAULT_VTP_FORMAT.compressor,
+                        help="Compressor of the arrays (lz4 needs the lz4 module)")
+    parser.add_argument('--compression-level', type=int, default=DEFAULT_VTP_FORMAT.level,
+                        help="Compression level, from 1 (fastest) to 9 (smallest)")
+    parser.add_argument('--block-size', type=int, default=DEFAULT_VTP_FORMAT.blockSize,
+                        help="Size in bytes of the blocks compressed independently")
+    parser.add_argument('--format-report', default=None, metavar='DIR',
+                        help="Write --input-file in every encoding and compressor to DIR, and tabulate their size, "
+                             "write and read time")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory of previous conversions, unchanged inputs are copied from there instead of "
+                             "converted")
+    parser.add_argument('--engine', choices=ENGINES, default='standalone',
+                        help="Convert with the standalone engine, or through the ParaView reader plugin (needs "
+                             "pvpython)")
+    parser.add_argument('--manifest', default=None,
+                        help="Path to a JSON file describing the converted files as mineplan pieces")
+    parser.add_argument('--include-layers', nargs='+', default=None, metavar='PATTERN',
+                        help="Only convert the layers matching one of these patterns, e.g. '*GEOLOGY*' (case "
+                             "insensitive)")
+    parser.add_argument('--exclude-layers', nargs='+', default=None, metavar='PATTERN',
+                        help="Do not convert the layers matching one of these patterns, e.g. '*ANNOTATIONS'")
+    parser.add_argument('--split-layers', action='store_true',
+                        help="Also write the entities of each layer to a file of their own")
+    parser.add_argument('--list-layers', action='store_true',
+                        help="List the layers of --input-file with their entity count, marking those selected, and "
+                             "exit")
+    parser.add_argument('--text-mode', choices=TEXT_MODES, default='glyphs',
+                        help="Draw text as vector text glyphs, or write it as labeled points to a file of its own, "
+                             "for viewers drawing text themselves")
+    parser.add_argument('--text-report', default=None, metavar='DIR',
+                        help="Convert --input-file to DIR in each text mode, and compare their size and conversion "
+                             "time")
+    parser.add_argument('--block-mode', choices=BLOCK_MODES, default='ignore',
+                        help="Drop INSERT entities, write them as instances of their block to files of their own, or "
+                             "expand them into copies of their block")
+    parser.add_argument('--cell-colors', action='store_true',
+                        help="Write the entity color of every cell as cell data, filling the output in a single pass")
+    parser.add_argument('--layer-ids', action='store_true',
+                        help="Also write the layer of every cell as cell data, indexing the LayerNames field data")
+    parser.add_argument('--quantize', type=int, choices=QUANTIZED_BITS, default=None, metavar='BITS',
+                        help="Also write a copy of each file with its points quantized to 16 or 32 bit integers, for "
+                             "web viewers")
+    parser.add_argument('--quantized-report', default=None, metavar='DIR',
+                        help="Write --input-file to DIR as VTP and quantized files, and compare their size, gzipped "
+                             "size, write and read time and error")
+    parser.add_argument('--precompress', nargs='+', choices=list(PRECOMPRESSED_ENCODINGS.keys()), default=[],
+                        metavar='ENCODING', help="Also write gzip and/or br compressed copies of every written file, "
+                                                 "for web servers (br needs the brotli module)")
+    parser.add_argument('--delta', action='store_true',
+                        help="Keep an index of the entities of each file next to it, and only convert the entities "
+                             "added or changed since the previous conversion")
+    parser.add_argument('--statistics', default=None, metavar='PATH',
+                        help="Count and time the entities of each DXF type and each handler, and write the result to "
+                             "this JSON file")
+    parser.add_argument('--statistics-field-data', action='store_true',
+                        help="Also write the statistics to the converted files, as the ConversionStatistics field data")
+    args = parser.parse_args()
+
+    tileBounds = None
+    if args.mineplan:
+        args.origin = mineplan_origin(args.mineplan)
+        tileBounds = mineplan_bounds(args.mineplan, args.origin)
+    if args.tiles and len(args.tiles) not in (2, 3):
+        parser.error('--tiles takes 2 or 3 numbers of divisions')
+    if args.input_dir and not args.output_dir:
+        parser.error('--input-dir needs an --output-dir')
+    # Workers beyond the cores only add the cost of sending their blocks back
+    cores = os.cpu_count() or 1
+    if args.parse_jobs > cores:
+        print('--parse-jobs {0} exceeds the {1} cores, parsing with {1}'.format(args.parse_jobs, cores))
+        args.parse_jobs = cores
+
+    options = DEFAULT_CONVERSION_OPTIONS._replace(
+        glyph_cache_size=args.glyph_cache_size,
+        rotate_text=args.rotate_text,
+        stream_entities=not args.no_stream,
+        weld_tolerance=args.weld_tolerance,
+        origin=args.origin,
+        lod_tolerances=args.lod_tolerances,
+        tiles=args.tiles,
+        tile_bounds=tileBounds,
+        vtp_format=VTPFormat(args.encoding, args.compressor, args.compression_level, args.block_size),
+        cache_dir=args.cache_dir,
+        engine=args.engine,
+        statistics='field-data' if args.statistics_field_data else ('collect' if args.statistics else None),
+        include_layers=args.include_layers,
+        exclude_layers=args.exclude_layers,
+        split_layers=args.split_layers,
+        text_mode=args.text_mode,
+        block_mode=args.block_mode,
+        parse_jobs=args.parse_jobs,
+        cell_colors=args.cell_colors,
+        layer_ids=args.layer_ids,
+        quantize_bits=args.quantize,
+        precompressed=args.precompress,
+        delta=args.delta,
+    )
+
+    if args.text_report:
+        print('{0:<8} {1:>10} {2:>10} {3:>12} {4:>8}'.format('mode', 'points', 'cells', 'bytes', 'seconds'))
+        rows = text_mode_report(args.input_file, args.text_report, options._replace(cache_dir=None, delta=False))
+        for row in rows:
+            print_text_mode_row(row, rows[0])
+        with open(os.path.join(args.text_report, 'report.json'), 'w') as fp:
+            json.dump(rows, fp, indent=2, sort_keys=True)
+        sys.exit(0)
+
+    if args.list_layers:
+        layerIndex = scanDXFLayers(args.input_file)
+        selected = set(selectLayers(layerIndex.keys(), args.include_layers, args.exclude_layers))
+        for name, entry in layerIndex.items():
+            print('{0} {1:>8}  {2}'.format('*' if name in selected else ' ', entry['count'], name))
+        sys.exit(0)
+
+    if args.format_report:
+        print('{0:<8} {1:<6} {2:>12} {3:>8} {4:>8}'.format('encoding', 'comp.', 'bytes', 'write s', 'read s'))
+        rows = vtp_format_report(args.input_file, args.format_report, options, report=print_vtp_format_row)
+        with open(os.path.join(args.format_report, 'report.json'), 'w') as fp:
+            json.dump(rows, fp, indent=2, sort_keys=True)
+        sys.exit(0)
+
+    if args.quantized_report:
+        print('{0:<6} {1:>12} {2:>12} {3:>8} {4:>8} {5:>10}'.format(
+            'format', 'bytes', 'gzip bytes', 'write s', 'read s', 'max error'))
+        rows = quantized_report(args.input_file, args.quantized_report, options, report=print_quantized_row)
+        with open(os.path.join(args.quantized_report, 'report.json'), 'w') as fp:
+            json.dump(rows, fp, indent=2, sort_keys=True)
+        sys.exit(0)
+
+    if args.input_dir:
+        inputFiles = find_dxf_files(args.input_dir)
+        try:
+            batch_output_paths(inputFiles, args.output_dir)
+        except ValueError as err:
+            parser.error(str(err))
+        start = time.time()
+        results = batch_dxf_to_vtp(inputFiles, args.output_dir, options, jobs=args.jobs, report=print_batch_result)
+        failures = [r for r in results if r[2] is not None]
+        print('Converted {0} of {1} files in {2:.2f}s'.format(
+            len(results) - len(failures), len(results), time.time() - start))
+        if args.manifest:
+            write_manifest(args.manifest, [mineplan_piece(r[4]) for r in results if r[2] is None])
+        if args.statistics:
+            converted = [r for r in results if r[2] is None]
+            write_statistics(args.statistics, dict([(r[0], statistics_entry(r[4])) for r in converted]))
+            cached = len([r for r in converted if r[4]['cached']])
+            if cached:
+                print('{0} files were copied from the conversion cache, their statistics are '
+                      'written as {{"cached": true}}'.format(cached))
+        sys.exit(1 if failures else 0)
+
+    stats = dxf_to_vtp(args.input_file, args.output_file, options)
+    if stats['cached']:
+        print('Unchanged input, copied {0} from the conversion cache'.format(stats['output']))
+    else:
+        print('Glyph cache: {0} hits, {1} misses'.format(stats['glyphCacheHits'], stats['glyphCacheMisses']))
+        if stats['skippedText']:
+            print('VTK is not available to draw text glyphs, skipped {0} text entities, '
+                  'convert with --text-mode labels to keep them'.format(stats['skippedText']))
+        if stats['delta'] and stats['delta']['delta']:
+            delta = stats['delta']
+            print('Delta: {0} of {1} entities reused, {2} added, {3} changed, {4} removed, {5:.2f}s saved'.format(
+                delta['reused'], delta['entities'], delta['added'], delta['changed'], delta['removed'],
+                delta['savedSeconds']))
+        if args.weld_tolerance is not None:
+            before, after = stats['weldStatistics']
+            print('Vertex welding: {0} -> {1} points, {2:.1%} fewer'.format(before, after, weld_reduction(stats)))
+        for lod in stats['lods']:
+            print('LOD {0} (tolerance {1}): {2} points, {3} bytes'.format(
+                lod['level'], lod['tolerance'], lod['points'], lod['size']))
+        if stats['layerCounts'] is not None:
+            print('Layers: {0} of {1} converted'.format(
+                len(selectLayers(stats['layerCounts'].keys(), args.include_layers, args.exclude_layers)),
+                len(stats['layerCounts'])))
+        if stats['labels']:
+            print('Labels: {0} written to {1}, {2} bytes'.format(
+                stats['labels']['labels'], stats['labels']['output'], stats['labels']['size']))
+        if stats['instances']:
+            print('Instances: {0} inserts of {1} blocks written to {2}, {3} bytes'.format(
+                stats['instances']['instances'], len(stats['blocks']), stats['instances']['output'],
+                stats['instances']['size'] + sum([block['size'] for block in stats['blocks']])))
+        for layer in stats['layers']:
+            print('Layer {0}: {1} points, {2} bytes'.format(layer['layer'], layer['points'], layer['size']))
+        if stats['tiling']:
+            tiles = stats['tiling']['tiles']
+            print('Tiles: {0} written to {1}, largest {2} bytes'.format(
+                len(tiles), stats['tiling']['output'], max([0] + [t['size'] for t in tiles])))
+    if args.statistics:
+        write_statistics(args.statistics, statistics_entry(stats))
+        if stats['cached']:
+            print('The input was not converted, its statistics are written as {"cached": true}')
+    if args.manifest:
+        write_manifest(args.manifest, [mineplan_piece(stats)])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,1750 @@
+"""
+    Standalone DXF to VTP converter.
+
+    Runs the DXFConverter of engine.py over a DXF file and writes the
+    result, with neither ParaView nor VTK: the VTP file itself, and the
+    files derived from it next to it, i.e. levels of detail, tiles, layers,
+    labels, instances and quantized copies.  Also keeps the conversion
+    cache, the mineplan manifest and precompressed copies of the written
+    files, and converts batches of files on a pool of worker processes.
+    cli.py is the command line of dxf_to_vtp(), the ParaView reader plugin,
+    PythonDXFReader.py, only converts through this module with the
+    paraview engine.
+"""
+import base64, collections, gzip, hashlib, json, os, re
+import shutil, struct, time, timeit, traceback, zlib
+
+import numpy
+
+from engine import (BLOCK_MODES, CONVERTER_VERSION, DEFAULT_GLYPH_CACHE_SIZE, HAVE_VTK, ID_TYPE, TEXT_MODES,
+                    DXFConverter, addArrays, addWeldStatistics, appendBlocks, blockArrays, blockCellCounts,
+                    blockCellData, layerIds, mergeBuilders, pointBounds, polyDataToNumpy, replace_file,
+                    untimedStatistics, warning_message)
+
+# Importing the plugin also activates the --virtual-env of the command line
+import PythonDXFReader
+
+if HAVE_VTK:
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkCommonDataModel import vtkPolyData, vtkCompositeDataSet
+    from vtkmodules.vtkCommonCore import vtkStringArray
+    from vtkmodules.vtkFiltersCore import vtkAppendPolyData
+    from vtkmodules.vtkIOXML import vtkXMLPolyDataWriter
+
+
+#------------------------------------------------------------------------------
+# Conversion cache, keyed by the content of the input DXF
+#------------------------------------------------------------------------------
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fp:
+        for chunk in iter(lambda: fp.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def conversion_cache_key(input_sha, output_options):
+    """
+        Key of a conversion in the cache, from the SHA-256 of the input, the
+        converter version and the options which change the output.
+    """
+    signature = json.dumps({
+        'input': input_sha,
+        'version': CONVERTER_VERSION,
+        'options': output_options,
+    }, sort_keys=True)
+    return hashlib.sha256(signature.encode('utf-8')).hexdigest()
+
+
+def _derived_outputs(stats):
+    """Entries of stats describing the files written next to the converted file"""
+    outputs = list(stats.get('lods', [])) + list(stats.get('layers', []))
+    outputs.extend([entry['quantized'] for entry in [stats] + list(stats.get('lods', []))
+                    + list((stats.get('tiling') or {}).get('tiles', [])) if entry.get('quantized')])
+    if stats.get('labels'):
+        outputs.append(stats['labels'])
+    if stats.get('instances'):
+        outputs.append(stats['instances'])
+        outputs.extend(stats.get('blocks', []))
+    if stats.get('tiling'):
+        outputs.append(stats['tiling'])
+        outputs.extend(stats['tiling']['tiles'])
+    return outputs
+
+
+def _derived_suffix(output_path, path):
+    """The part of the name of path after the name of output_path, see derived_path()"""
+    return os.path.basename(path)[len(os.path.basename(output_path)) - 3:]
+
+
+def _read_conversion_cache(cache_dir, key, output_path):
+    """Restore a cached conversion to output_path, returns its stats or None"""
+    cached_vtp = os.path.join(cache_dir, '{0}.vtp'.format(key))
+    cached_stats = os.path.join(cache_dir, '{0}.json'.format(key))
+    if not (os.path.isfile(cached_vtp) and os.path.isfile(cached_stats)):
+        return None
+
+    with open(cached_stats) as fp:
+        stats = json.load(fp)
+
+    if not os.path.isfile(output_path) or file_sha256(output_path) != stats['sha']:
+        shutil.copyfile(cached_vtp, output_path)
+
+    for derived in _derived_outputs(stats):
+        suffix = _derived_suffix(stats['output'], derived['output'])
+        derived['output'] = derived_path(output_path, suffix)
+        if not os.path.isfile(derived['output']) or file_sha256(derived['output']) != derived['sha']:
+            shutil.copyfile(derived_path(cached_vtp, suffix), derived['output'])
+
+    # Statistics describe the conversion which filled the cache, not this one
+    stats['output'] = output_path
+    stats['statistics'] = None
+    stats['cached'] = True
+    return stats
+
+
+def _write_conversion_cache(cache_dir, key, output_path, stats):
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+
+    # Write under temporary names first, batch workers may share the cache
+    tmp = '.{0}.tmp'.format(os.getpid())
+    cached_vtp = os.path.join(cache_dir, '{0}.vtp'.format(key))
+    cached_stats = os.path.join(cache_dir, '{0}.json'.format(key))
+
+    cached = [(output_path, cached_vtp)]
+    for derived in _derived_outputs(stats):
+        cached.append((derived['output'], derived_path(cached_vtp, _derived_suffix(output_path, derived['output']))))
+
+    for path, cached_path in cached:
+        shutil.copyfile(path, cached_path + tmp)
+    with open(cached_stats + tmp, 'w') as fp:
+        json.dump(stats, fp)
+
+    # The stats go last, a conversion only counts as cached once they exist
+    for path, cached_path in cached:
+        replace_file(cached_path + tmp, cached_path)
+    replace_file(cached_stats + tmp, cached_stats)
+
+
+#------------------------------------------------------------------------------
+# Precompressed copies of the converted files, for web servers to send as is
+#------------------------------------------------------------------------------
+# Content-Encoding of each kind of copy, and the suffix added to the file name
+PRECOMPRESSED_ENCODINGS = collections.OrderedDict([
+    ('gzip', '.gz'),
+    ('br', '.br'),
+])
+
+
+def precompressed_path(path, encoding):
+    """Path of the copy of path compressed for that Content-Encoding, e.g. lev1146.vtp.gz"""
+    return path + PRECOMPRESSED_ENCODINGS[encoding]
+
+
+def precompressed_sha_path(path, encoding):
+    """Path of the file holding the sha of the file the precompressed copy of path was written from"""
+    return precompressed_path(path, encoding) + '.sha256'
+
+
+def precompress(path, encoding, sha=None):
+    """
+        Write the copy of path compressed for that Content-Encoding, unless
+        it was already written from a file with the same sha, sha being that
+        of path when known, returns its path
+    """
+    variant = precompressed_path(path, encoding)
+    stamp = precompressed_sha_path(path, encoding)
+    if sha is None:
+        sha = file_sha256(path)
+    if os.path.isfile(variant) and os.path.isfile(stamp):
+        with open(stamp) as fp:
+            if fp.read().strip() == sha:
+                return variant
+
+    tmp = '{0}.{1}.tmp'.format(variant, os.getpid())
+    with open(path, 'rb') as src:
+        with open(tmp, 'wb') as dst:
+            if encoding == 'gzip':
+                # Without a name or time in the header, a file always gives the same copy
+                with gzip.GzipFile(filename='', mode='wb', compresslevel=9, fileobj=dst, mtime=0) as compressed:
+                    shutil.copyfileobj(src, compressed)
+            else:
+                try:
+                    import brotli
+                except ImportError:
+                    raise RuntimeError('The br encoding needs the brotli module (pip install brotli)')
+                compressor = brotli.Compressor(quality=11)
+                for chunk in iter(lambda: src.read(1 << 20), b''):
+                    dst.write(compressor.process(chunk))
+                dst.write(compressor.finish())
+
+    replace_file(tmp, variant)
+    tmp = '{0}.{1}.tmp'.format(stamp, os.getpid())
+    with open(tmp, 'w') as fp:
+        fp.write(sha)
+    replace_file(tmp, stamp)
+    return variant
+
+
+def precompress_outputs(stats, encodings):
+    """Write the precompressed copies of the converted file of stats, and of the files written next to it"""
+    for entry in [stats] + _derived_outputs(stats):
+        for encoding in encodings:
+            precompress(entry['output'], encoding, entry.get('sha'))
+
+
+#------------------------------------------------------------------------------
+# Mineplan manifest, describing converted files as mineplan pieces
+#------------------------------------------------------------------------------
+def mineplan_piece(stats, label=None, category='plan'):
+    """
+        Describe a converted file the way the mineplan API describes its
+        pieces, along with the size, bounds and entity counts of the file.
+    """
+    name = os.path.splitext(os.path.basename(stats['output']))[0]
+    if label is None:
+        match = re.match(r'^lev(\d+)$', name, re.IGNORECASE)
+        label = 'Level {0}'.format(match.group(1)) if match else name
+
+    return {
+        'category': category,
+        'label': label,
+        'file': os.path.basename(stats['output']),
+        'type': 'lines',
+        'visibility': 1,
+        'extra_json_attributes': { 'origin': stats['origin'] } if stats.get('origin') else None,
+        'sha': stats['sha'],
+        'size': stats['size'],
+        'bounds': stats['bounds'],
+        'entity_counts': stats['entityCounts'],
+        'quantized': mineplan_quantized(stats['quantized']) if stats.get('quantized') else None,
+        'lods': [mineplan_lod(lod) for lod in stats.get('lods', [])],
+        'layers': [mineplan_layer(layer) for layer in stats.get('layers', [])],
+        'tiles': os.path.basename(stats['tiling']['output']) if stats.get('tiling') else None,
+        'labels': os.path.basename(stats['labels']['output']) if stats.get('labels') else None,
+        'instances': os.path.basename(stats['instances']['output']) if stats.get('instances') else None,
+        'blocks': [mineplan_block(block) for block in stats.get('blocks', [])],
+    }
+
+
+def mineplan_block(block):
+    return {
+        'name': block['name'],
+        'file': os.path.basename(block['output']),
+        'sha': block['sha'],
+        'size': block['size'],
+    }
+
+
+def mineplan_lod(lod):
+    return {
+        'level': lod['level'],
+        'tolerance': lod['tolerance'],
+        'file': os.path.basename(lod['output']),
+        'sha': lod['sha'],
+        'size': lod['size'],
+        'points': lod['points'],
+        'quantized': mineplan_quantized(lod['quantized']) if lod.get('quantized') else None,
+    }
+
+
+def mineplan_quantized(quantized):
+    return {
+        'file': os.path.basename(quantized['output']),
+        'sha': quantized['sha'],
+        'size': quantized['size'],
+        'bits': quantized['bits'],
+        'max_error': quantized['maxError'],
+    }
+
+
+def mineplan_layer(layer):
+    return {
+        'layer': layer['layer'],
+        'file': os.path.basename(layer['output']),
+        'sha': layer['sha'],
+        'size': layer['size'],
+        'bounds': layer['bounds'],
+    }
+
+
+def _mineplan_boundaries(mineplan_path):
+    with open(mineplan_path) as fp:
+        mineplan = json.load(fp)
+    if isinstance(mineplan, list):
+        mineplan = mineplan[0]
+    return mineplan['boundaries']
+
+
+def mineplan_origin(mineplan_path):
+    """
+        Local origin of a mineplan, from the boundaries in its JSON: the
+        center of the bounds in x and y, and their top in z.  This is the
+        point the client translates to the origin of the scene.
+    """
+    bounds = _mineplan_boundaries(mineplan_path)
+    return [0.5 * (bounds[0] + bounds[1]), 0.5 * (bounds[2] + bounds[3]), bounds[5]]
+
+
+def mineplan_bounds(mineplan_path, origin=None):
+    """The boundaries of a mineplan, relative to origin if given"""
+    bounds = [float(b) for b in _mineplan_boundaries(mineplan_path)]
+    if origin is not None:
+        bounds = [b - origin[i // 2] for i, b in enumerate(bounds)]
+    return bounds
+
+
+def write_manifest(manifest_path, pieces):
+    with open(manifest_path, 'w') as fp:
+        json.dump({ 'pieces': pieces }, fp, indent=2, sort_keys=True)
+
+
+#------------------------------------------------------------------------------
+# VTP writer, so converting needs neither ParaView nor VTK
+#------------------------------------------------------------------------------
+# How the arrays are stored in the file: appended after the XML as raw
+# binary or as base64 (the vtkXMLWriter default), or base64 inside the XML
+VTP_ENCODINGS = ('raw', 'base64', 'inline')
+
+VTP_COMPRESSORS = collections.OrderedDict([
+    ('none', None),
+    ('zlib', 'vtkZLibDataCompressor'),
+    ('lz4', 'vtkLZ4DataCompressor'),
+    ('lzma', 'vtkLZMADataCompressor'),
+])
+
+# Layout of the arrays in a VTP file, the defaults are those of vtkXMLWriter.
+# Data is compressed in independent blocks of blockSize bytes.
+VTPFormat = collections.namedtuple('VTPFormat', ['encoding', 'compressor', 'level', 'blockSize'])
+DEFAULT_VTP_FORMAT = VTPFormat('base64', 'zlib', 5, 32768)
+
+
+def _vtpType(data):
+    if data.dtype.kind in 'SU':
+        return 'String'
+    kind = { 'f': 'Float', 'i': 'Int', 'u': 'UInt' }[data.dtype.kind]
+    return '{0}{1}'.format(kind, 8 * data.dtype.itemsize)
+
+
+def _vtpCompressBlock(vtpFormat):
+    """Returns the function compressing a block like the VTK compressor of vtpFormat"""
+    level = vtpFormat.level
+    if vtpFormat.compressor == 'zlib':
+        return lambda block: zlib.compress(block, level)
+    if vtpFormat.compressor == 'lz4':
+        try:
+            import lz4.block
+        except ImportError:
+            raise RuntimeError('The lz4 compressor needs the lz4 module (pip install lz4)')
+        # vtkLZ4DataCompressor trades speed for size with an acceleration of 10 - level
+        return lambda block: lz4.block.compress(block, mode='fast', acceleration=max(1, 10 - level), store_size=False)
+    if vtpFormat.compressor == 'lzma':
+        import lzma
+        return lambda block: lzma.compress(block, format=lzma.FORMAT_XZ, check=lzma.CHECK_CRC64, preset=level)
+    raise ValueError('Unknown compressor: {0}'.format(vtpFormat.compressor))
+
+
+def _vtpEncodeArray(data, vtpFormat, compressBlock):
+    """
+        Encode an array like vtkXMLWriter does, as a UInt32 header followed
+        by the data.  Compressed headers list the size of every block, and
+        are base64 encoded separately from the data.  Strings are stored
+        as UTF-8, each followed by a null byte.
+    """
+    if data.dtype.kind in 'SU':
+        values = [v if isinstance(v, bytes) else v.encode('utf-8') for v in data.tolist()]
+        raw = b''.join([v + b'\0' for v in values])
+    else:
+        raw = numpy.ascontiguousarray(data, dtype=data.dtype.newbyteorder('<')).tobytes()
+    blockSize = vtpFormat.blockSize
+    if compressBlock is None:
+        encoded = struct.pack('<I', len(raw)) + raw
+        return encoded if vtpFormat.encoding == 'raw' else base64.b64encode(encoded)
+
+    blocks = [compressBlock(raw[i:i + blockSize]) for i in range(0, len(raw), blockSize)]
+    header = [len(blocks), blockSize, len(raw) % blockSize] + [len(b) for b in blocks]
+    header = struct.pack('<{0}I'.format(len(header)), *header)
+    if vtpFormat.encoding == 'raw':
+        return header + b''.join(blocks)
+    return base64.b64encode(header) + base64.b64encode(b''.join(blocks))
+
+
+def write_vtp(path, points, cells, fieldData=None, vtpFormat=DEFAULT_VTP_FORMAT, pointData=None, cellData=None):
+    """
+        Write points and cells, as returned by appendBlocks(), to a VTP file
+        laid out like those of vtkXMLPolyDataWriter.  fieldData, pointData
+        and cellData map names to arrays of one tuple per row, arrays of
+        strings are written as String arrays.
+    """
+    if vtpFormat.encoding not in VTP_ENCODINGS:
+        raise ValueError('Unknown VTP encoding: {0}'.format(vtpFormat.encoding))
+    compressBlock = _vtpCompressBlock(vtpFormat) if vtpFormat.compressor != 'none' else None
+    appended = []
+
+    def dataArray(data, attributes):
+        encoded = _vtpEncodeArray(data, vtpFormat, compressBlock)
+        if vtpFormat.encoding == 'inline':
+            return '<DataArray type="{0}" {1} format="binary">{2}</DataArray>'.format(
+                _vtpType(data), attributes, encoded.decode('ascii'))
+        offset = sum([len(a) for a in appended])
+        appended.append(encoded)
+        return '<DataArray type="{0}" {1} format="appended" offset="{2}" />'.format(_vtpType(data), attributes, offset)
+
+    compressor = ''
+    if compressBlock:
+        compressor = ' compressor="{0}"'.format(VTP_COMPRESSORS[vtpFormat.compressor])
+    lines = [
+        '<?xml version="1.0"?>',
+        '<VTKFile type="PolyData" version="0.1" byte_order="LittleEndian" header_type="UInt32"{0}>'.format(compressor),
+        '  <PolyData>',
+    ]
+
+    def dataArrays(arrays, indent):
+        for name, values in arrays.items():
+            values = numpy.asarray(values)
+            attributes = 'Name="{0}" NumberOfTuples="{1}"'.format(name, len(values))
+            if values.ndim > 1:
+                attributes = 'Name="{0}" NumberOfComponents="{1}" NumberOfTuples="{2}"'.format(
+                    name, values.shape[1], len(values))
+            lines.append(indent + dataArray(values, attributes))
+
+    if fieldData:
+        lines.append('    <FieldData>')
+        dataArrays(fieldData, '      ')
+        lines.append('    </FieldData>')
+
+    lines.append('    <Piece NumberOfPoints="{0}" NumberOfVerts="{1}" NumberOfLines="{2}" NumberOfStrips="{3}" '
+                 'NumberOfPolys="{4}">'.format(
+        len(points), len(cells['verts'][0]), len(cells['lines'][0]), len(cells['strips'][0]), len(cells['polys'][0])))
+    lines.append('      <PointData>')
+    dataArrays(pointData or {}, '        ')
+    lines.extend(['      </PointData>', '      <CellData>'])
+    dataArrays(cellData or {}, '        ')
+    lines.extend(['      </CellData>', '      <Points>'])
+    lines.append('        ' + dataArray(points, 'Name="Points" NumberOfComponents="3"'))
+    lines.append('      </Points>')
+
+    for name, tag in (('verts', 'Verts'), ('lines', 'Lines'), ('strips', 'Strips'), ('polys', 'Polys')):
+        sizes, connectivity = cells[name]
+        lines.append('      <{0}>'.format(tag))
+        lines.append('        ' + dataArray(numpy.asarray(connectivity, dtype=numpy.int64), 'Name="connectivity"'))
+        lines.append('        ' + dataArray(numpy.cumsum(sizes, dtype=numpy.int64), 'Name="offsets"'))
+        lines.append('      </{0}>'.format(tag))
+
+    lines.extend(['    </Piece>', '  </PolyData>'])
+
+    with open(path, 'wb') as fp:
+        if appended:
+            lines.extend(['  <AppendedData encoding="{0}">'.format(vtpFormat.encoding), '   _'])
+            fp.write('\n'.join(lines).encode('ascii'))
+            for data in appended:
+                fp.write(data)
+            fp.write(b'\n  </AppendedData>\n</VTKFile>\n')
+        else:
+            lines.append('</VTKFile>')
+            fp.write('\n'.join(lines).encode('ascii') + b'\n')
+
+
+#------------------------------------------------------------------------------
+# Quantized geometry, a compact binary alternative to VTP for web viewers
+#------------------------------------------------------------------------------
+# A file starts with QUANTIZED_MAGIC and the length of a JSON header, which
+# describes the little endian typed arrays following it.  The header is
+# padded to a multiple of 8 bytes and so is each array, a browser can view
+# them in place.  Points are integers relative to the bounds of the file,
+# connectivity is the difference between consecutive point ids, mostly 1
+# along polylines, and cell data is stored as runs of equal values in the
+# header, cells being grouped by color and layer.
+QUANTIZED_MAGIC = b'DXFQ'
+QUANTIZED_VERSION = 1
+QUANTIZED_BITS = (16, 32)
+
+
+def quantized_path(output_path, bits):
+    """Path of the quantized copy of a VTP file, e.g. lev1146.q16.bin"""
+    return derived_path(output_path, 'q{0}.bin'.format(bits))
+
+
+def quantizePoints(points, bits=16):
+    """
+        Signed integers of that many bits standing for points, centered on
+        their bounds and scaled so the farthest point from the center along
+        each axis uses the whole range.  Returns them along with the offset
+        and scale of each axis, points are offset + q * scale give or take
+        half the scale.
+    """
+    if bits not in QUANTIZED_BITS:
+        raise ValueError('Points are quantized to 16 or 32 bits, not {0}'.format(bits))
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    bounds = numpy.array(pointBounds(points) if len(points) else [0.0] * 6).reshape(3, 2)
+    limit = 2 ** (bits - 1) - 1
+    offset = bounds.mean(axis=1)
+    scale = (bounds[:, 1] - bounds[:, 0]) / (2.0 * limit)
+    scale[scale == 0] = 1.0
+    quantized = numpy.clip(numpy.rint((points - offset) / scale), -limit, limit)
+    return quantized.astype(numpy.int16 if bits == 16 else numpy.int32), offset, scale
+
+
+def _smallestIntType(values, signed=True):
+    """The smallest integer type holding all of values"""
+    types = (numpy.int8, numpy.int16, numpy.int32) if signed else (numpy.uint8, numpy.uint16, numpy.uint32)
+    for dtype in types:
+        info = numpy.iinfo(dtype)
+        if len(values) == 0 or (values.min() >= info.min and values.max() <= info.max):
+            return dtype
+    return numpy.int64 if signed else numpy.uint64
+
+
+def _runs(values):
+    """Run length encoding of values, as the lists of the value and length of each run"""
+    if len(values) == 0:
+        return [], []
+    starts = numpy.flatnonzero(numpy.concatenate([[True], values[1:] != values[:-1]]))
+    return values[starts].tolist(), numpy.diff(numpy.append(starts, len(values))).tolist()
+
+
+def write_quantized(path, points, cells, fieldData=None, cellData=None, bits=16):
+    """
+        Write points and cells, as returned by appendBlocks(), to a
+        quantized geometry file, with the points quantized to that many
+        bits (see quantizePoints()), cellData as runs and fieldData as
+        lists in the header.  Returns the header.
+    """
+    quantized, offset, scale = quantizePoints(points, bits)
+    arrays = [('positions', quantized)]
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        sizes, connectivity = cells[name]
+        if len(sizes) == 0:
+            continue
+        sizes = numpy.asarray(sizes)
+        deltas = numpy.diff(numpy.concatenate([[0], numpy.asarray(connectivity, dtype=numpy.int64)]))
+        arrays.append(('{0}.sizes'.format(name), sizes.astype(_smallestIntType(sizes, signed=False))))
+        arrays.append(('{0}.connectivity'.format(name), deltas.astype(_smallestIntType(deltas))))
+
+    entries = []
+    body = []
+    offsetInBody = 0
+    for name, values in arrays:
+        data = numpy.ascontiguousarray(values, dtype=values.dtype.newbyteorder('<')).tobytes()
+        entries.append(collections.OrderedDict([
+            ('name', name), ('type', values.dtype.name), ('offset', offsetInBody), ('count', values.size)]))
+        data += b'\0' * (-len(data) % 8)
+        body.append(data)
+        offsetInBody += len(data)
+
+    header = collections.OrderedDict([
+        ('format', 'dxf-quantized'),
+        ('version', QUANTIZED_VERSION),
+        ('bits', bits),
+        ('bounds', pointBounds(numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3))),
+        ('offset', offset.tolist()),
+        ('scale', scale.tolist()),
+        ('maxError', (0.5 * scale).tolist()),
+        ('points', len(quantized)),
+        ('cells', collections.OrderedDict([(name, len(cells[name][0]))
+                                           for name in ('verts', 'lines', 'polys', 'strips')])),
+        ('arrays', entries),
+        ('cellData', collections.OrderedDict()),
+        ('fieldData', collections.OrderedDict()),
+    ])
+    for name, values in (cellData or {}).items():
+        values = numpy.asarray(values)
+        runValues, runLengths = _runs(values)
+        header['cellData'][name] = collections.OrderedDict([
+            ('type', values.dtype.name), ('values', runValues), ('counts', runLengths)])
+    for name, values in (fieldData or {}).items():
+        header['fieldData'][name] = numpy.asarray(values).tolist()
+
+    encoded = json.dumps(header).encode('utf-8')
+    encoded += b' ' * (-len(encoded) % 8)
+    with open(path, 'wb') as fp:
+        fp.write(QUANTIZED_MAGIC + struct.pack('<I', len(encoded)) + encoded)
+        for data in body:
+            fp.write(data)
+
+    return header
+
+
+def read_quantized(path):
+    """
+        Read a file written by write_quantized(), returns its header, the
+        points dequantized in double precision, all four cell arrays, like
+        polyDataToNumpy(), and the cell data by name.
+    """
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    if data[:4] != QUANTIZED_MAGIC:
+        raise ValueError('{0} is not a quantized geometry file'.format(path))
+    headerLength = struct.unpack('<I', data[4:8])[0]
+    header = json.loads(data[8:8 + headerLength].decode('utf-8'), object_pairs_hook=collections.OrderedDict)
+    if header['version'] > QUANTIZED_VERSION:
+        raise ValueError('{0} is a version {1} quantized geometry file'.format(path, header['version']))
+
+    arrays = {}
+    for entry in header['arrays']:
+        arrays[entry['name']] = numpy.frombuffer(data, dtype=numpy.dtype(entry['type']).newbyteorder('<'),
+                                                 count=entry['count'], offset=8 + headerLength + entry['offset'])
+
+    quantized = arrays['positions'].reshape(-1, 3)
+    points = numpy.asarray(header['offset']) + quantized * numpy.asarray(header['scale'])
+    cells = {}
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        if '{0}.sizes'.format(name) in arrays:
+            cells[name] = (arrays['{0}.sizes'.format(name)].astype(ID_TYPE),
+                           numpy.cumsum(arrays['{0}.connectivity'.format(name)], dtype=ID_TYPE))
+        else:
+            cells[name] = (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE))
+    cellData = collections.OrderedDict([
+        (name, numpy.repeat(numpy.array(runs['values'], dtype=runs['type']), runs['counts']))
+        for name, runs in header['cellData'].items()])
+
+    return header, points, cells, cellData
+
+
+def check_quantized(path, points, cells, cellData=None):
+    """
+        Read back the file written by write_quantized() from points, cells
+        and cellData, and check it has the same cells and cell data, and
+        points within the maxError of its header.  Returns the largest
+        error along each axis, raises a ValueError when the check fails.
+    """
+    header, readPoints, readCells, readCellData = read_quantized(path)
+    points = numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3)
+    if readPoints.shape != points.shape:
+        raise ValueError('{0} has {1} points instead of {2}'.format(path, len(readPoints), len(points)))
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        if not (numpy.array_equal(readCells[name][0], cells[name][0]) and
+                numpy.array_equal(readCells[name][1], cells[name][1])):
+            raise ValueError('{0} has other {1} than those written'.format(path, name))
+    for name, values in (cellData or {}).items():
+        if name not in readCellData or not numpy.array_equal(readCellData[name], values):
+            raise ValueError('{0} has another {1} cell data than the one written'.format(path, name))
+
+    errors = numpy.abs(readPoints - points).max(axis=0) if len(points) else numpy.zeros(3)
+    # Dequantizing rounds too, by a few units in the last place of the coordinates
+    largest = numpy.abs(points).max(axis=0) if len(points) else 0.0
+    bounds = numpy.asarray(header['maxError']) + 4 * numpy.spacing(largest)
+    if (errors > bounds).any():
+        raise ValueError('{0} has points off by up to {1}, more than {2}'.format(
+            path, errors.tolist(), header['maxError']))
+    return errors.tolist()
+
+
+def _write_quantized(output_path, points, cells, fieldData=None, cellData=None, bits=16):
+    """Write the quantized copy of the VTP file at output_path next to it, returns its stats"""
+    path = quantized_path(output_path, bits)
+    header = write_quantized(path, points, cells, fieldData, cellData, bits)
+    return {
+        'output': path,
+        'sha': file_sha256(path),
+        'size': os.path.getsize(path),
+        'bits': bits,
+        'maxError': header['maxError'],
+    }
+
+
+#------------------------------------------------------------------------------
+# Levels of detail, simplifying the line work for distant views
+#------------------------------------------------------------------------------
+# Most pairs of segments compared at once when looking for crossings
+CROSSING_CHUNK_SIZE = 1 << 20
+
+# Most grid cells a segment is registered in on average, and per axis,
+# when looking for crossings
+CROSSING_CELLS_PER_SEGMENT = 8
+CROSSING_GRID_SIZE = 1 << 20
+
+
+def _farthestPoints(coords, segStart, segEnd):
+    """
+        For segments of polylines from segStart to segEnd, positions in
+        coords with points between them, the distance of their interior
+        point farthest from the segment, and the position of that point.
+    """
+    # Positions of the interior points of every segment
+    counts = segEnd - segStart - 1
+    segOffsets = numpy.cumsum(counts) - counts
+    idx = numpy.arange(counts.sum(), dtype=ID_TYPE) - numpy.repeat(segOffsets - segStart - 1, counts)
+
+    a = coords[numpy.repeat(segStart, counts)]
+    ab = coords[numpy.repeat(segEnd, counts)] - a
+    ap = coords[idx] - a
+    length = numpy.sqrt((ab * ab).sum(axis=1))
+    distance = numpy.where(length > 0,
+                           numpy.sqrt((numpy.cross(ap, ab) ** 2).sum(axis=1)) / numpy.where(length > 0, length, 1),
+                           numpy.sqrt((ap * ap).sum(axis=1)))
+    del a, ab, ap, length
+
+    farthest = numpy.maximum.reduceat(distance, segOffsets)
+    isFarthest = distance == numpy.repeat(farthest, counts)
+    return farthest, numpy.minimum.reduceat(numpy.where(isFarthest, idx, len(coords)), segOffsets)
+
+
+class SegmentGrid(object):
+    """
+        Finds the segments of polylines crossing others in plan view, where
+        the crossing is not at an end of both, and their elevations are
+        within zTolerance.  Segments go from and to positions in coords,
+        and are registered in the cells of a regular grid they overlap, so
+        only segments sharing a cell are compared.  Registrations are kept
+        from one call to the next, so that after simplifying, only the
+        segments which changed are compared again.
+    """
+    def __init__(self, coords, zTolerance):
+        self.coords = coords
+        self.zTolerance = zTolerance
+        self.origin = None
+        self.size = None
+        self.starts = numpy.zeros(0, dtype=ID_TYPE)
+        self.ends = numpy.zeros(0, dtype=ID_TYPE)
+        self.cells = numpy.zeros(0, dtype=numpy.int64)
+
+    def _bounds(self, segStart, segEnd):
+        p, q = self.coords[segStart], self.coords[segEnd]
+        low, high = numpy.minimum(p, q), numpy.maximum(p, q)
+        low[:, 2] -= self.zTolerance / 2.0
+        high[:, 2] += self.zTolerance / 2.0
+        return low, high
+
+    def _cellSize(self, low, high):
+        """
+            Cells about the size of most segments, larger when the long ones
+            would overlap too many of them.
+        """
+        self.origin = low.min(axis=0)
+        size = numpy.median((high - low).max(axis=1))
+        size = max(size, (high.max(axis=0) - self.origin).max() / CROSSING_GRID_SIZE)
+        self.size = size if size > 0 else 1.0
+        while self._cellCounts(low, high)[2].sum() > CROSSING_CELLS_PER_SEGMENT * len(low):
+            self.size *= 2
+
+    def _cellCounts(self, low, high):
+        first = numpy.floor((low - self.origin) / self.size).astype(numpy.int64)
+        spans = numpy.floor((high - self.origin) / self.size).astype(numpy.int64) - first + 1
+        return first, spans, spans.prod(axis=1)
+
+    def _register(self, segStart, segEnd, low, high):
+        """Add the cells of the grid each segment overlaps"""
+        first, spans, counts = self._cellCounts(low, high)
+        segments = numpy.repeat(numpy.arange(len(low)), counts)
+        cell = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+        spans, first = spans[segments], first[segments]
+        cell = (first[:, 0] + cell % spans[:, 0] +
+                CROSSING_GRID_SIZE * (first[:, 1] + cell // spans[:, 0] % spans[:, 1] +
+                                      CROSSING_GRID_SIZE * (first[:, 2] + cell // (spans[:, 0] * spans[:, 1]))))
+        self.starts = numpy.concatenate([self.starts, segStart[segments]])
+        self.ends = numpy.concatenate([self.ends, segEnd[segments]])
+        self.cells = numpy.concatenate([self.cells, cell])
+
+    def crossing(self, segStart, segEnd, changed):
+        """
+            Which of the segments from segStart to segEnd cross another one,
+            comparing only the pairs with a changed segment.  The segments
+            which did not change must have been given to the last call.
+        """
+        low, high = self._bounds(segStart, segEnd)
+        if self.size is None:
+            self._cellSize(low, high)
+
+        # Drop the segments which are gone, then add the changed ones
+        current = numpy.full(len(self.coords), -1, dtype=numpy.int64)
+        current[segStart] = numpy.arange(len(segStart))
+        segments = current[self.starts]
+        valid = segments >= 0
+        valid[valid] = (segEnd[segments[valid]] == self.ends[valid]) & ~changed[segments[valid]]
+        self.starts, self.ends, self.cells = self.starts[valid], self.ends[valid], self.cells[valid]
+        self._register(segStart[changed], segEnd[changed], low[changed], high[changed])
+        segments = current[self.starts]
+
+        # The cells with a changed segment, sorted so each cell is a run
+        withChanged = numpy.unique(self.cells[changed[segments]])
+        crossing = numpy.zeros(len(segStart), dtype=bool)
+        if not len(withChanged):
+            return crossing
+        found = numpy.minimum(numpy.searchsorted(withChanged, self.cells), len(withChanged) - 1)
+        inChanged = numpy.nonzero(withChanged[found] == self.cells)[0]
+        cells = self.cells[inChanged]
+        order = numpy.argsort(cells, kind='mergesort')
+        segments, cells = segments[inChanged[order]], cells[order]
+        del found, inChanged, order
+        # Each segment with those after it in its cell
+        others = numpy.searchsorted(cells, cells, side='right') - numpy.arange(1, len(cells) + 1)
+
+        p, q = self.coords[segStart, :2], self.coords[segEnd, :2]
+
+        def orientation(a, b, c):
+            return numpy.sign((b[:, 0] - a[:, 0]) * (c[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (c[:, 0] - a[:, 0]))
+
+        chunks = numpy.searchsorted(numpy.cumsum(others), numpy.arange(0, others.sum(), CROSSING_CHUNK_SIZE),
+                                    side='right')
+        for first, last in zip(chunks, list(chunks[1:]) + [len(cells)]):
+            counts = others[first:last]
+            pair = numpy.arange(counts.sum()) - numpy.repeat(numpy.cumsum(counts) - counts, counts)
+            rank = numpy.repeat(numpy.arange(first, last), counts)
+            i, j = segments[rank], segments[rank + 1 + pair]
+            del pair, rank
+            overlap = (changed[i] | changed[j]) & ((low[i] <= high[j]) & (low[j] <= high[i])).all(axis=1)
+            i, j = i[overlap], j[overlap]
+            cross = ((orientation(p[i], q[i], p[j]) * orientation(p[i], q[i], q[j]) < 0) &
+                     (orientation(p[j], q[j], p[i]) * orientation(p[j], q[j], q[i]) < 0))
+            crossing[i[cross]] = True
+            crossing[j[cross]] = True
+        return crossing
+
+
+def simplifyLines(points, sizes, connectivity, tolerance):
+    """
+        Douglas-Peucker simplification of all the polylines at once: each
+        pass splits every pending segment at its farthest point, until no
+        point is farther than tolerance from its segment.  The end points
+        of every polyline are kept, so lines sharing them stay connected.
+        Simplified segments then crossing another segment in plan view,
+        within tolerance in elevation, which may be a drift wall cutting
+        through the next one or through itself, get back their farthest
+        dropped point until no simplified segment crosses any, so the
+        simplified line work only crosses where it did before.
+        Returns the (sizes, connectivity) of the simplified polylines.
+    """
+    if len(sizes) == 0:
+        return sizes, connectivity
+
+    ends = numpy.cumsum(sizes)
+    starts = ends - sizes
+    keep = numpy.zeros(len(connectivity), dtype=bool)
+    keep[starts] = True
+    keep[ends - 1] = True
+
+    coords = points[connectivity].astype(numpy.float64)
+    segStart, segEnd = starts, ends - 1
+
+    while True:
+        pending = segEnd - segStart > 1
+        segStart, segEnd = segStart[pending], segEnd[pending]
+        if len(segStart) == 0:
+            break
+
+        farthest, splitAt = _farthestPoints(coords, segStart, segEnd)
+        split = farthest > tolerance
+        keep[splitAt[split]] = True
+        segStart, segEnd = (numpy.concatenate([segStart[split], splitAt[split]]),
+                            numpy.concatenate([splitAt[split], segEnd[split]]))
+
+    isStart = numpy.zeros(len(connectivity), dtype=bool)
+    isStart[starts] = True
+    added = keep.copy()
+    grid = SegmentGrid(coords, tolerance)
+    while True:
+        kept = numpy.nonzero(keep)[0]
+        segments = ~isStart[kept[1:]]
+        segStart, segEnd = kept[:-1][segments], kept[1:][segments]
+        # Segments which did not change already crossed nothing, or only
+        # each other where they have no dropped point to get back
+        changed = added[segStart] | added[segEnd]
+        split = grid.crossing(segStart, segEnd, changed) & (segEnd - segStart > 1)
+        if not split.any():
+            break
+        added[:] = False
+        added[_farthestPoints(coords, segStart[split], segEnd[split])[1]] = True
+        keep |= added
+
+    return numpy.add.reduceat(keep, starts).astype(ID_TYPE), connectivity[keep]
+
+
+def compactPoints(points, cells):
+    """Drop the points no cell uses, returns the new (points, cells)"""
+    used = numpy.zeros(len(points), dtype=bool)
+    for sizes, connectivity in cells.values():
+        used[connectivity] = True
+
+    newIds = numpy.cumsum(used, dtype=ID_TYPE) - 1
+    cells = dict([(name, (sizes, newIds[connectivity])) for name, (sizes, connectivity) in cells.items()])
+    return points[used], cells
+
+
+def derived_path(output_path, suffix):
+    """Path of a file written next to the VTP file at output_path, e.g. lev1146.lod1.vtp"""
+    return '{0}.{1}'.format(output_path[:-4], suffix)
+
+
+def entity_index_path(output_path):
+    """Path of the entity index of a converted file, e.g. lev1146.entities.npz"""
+    return derived_path(output_path, 'entities.npz')
+
+
+def lod_path(output_path, level):
+    return derived_path(output_path, 'lod{0}.vtp'.format(level))
+
+
+def _write_lods(output_path, points, cells, fieldData, lod_tolerances, vtpFormat=DEFAULT_VTP_FORMAT, cellData=None,
+                quantizeBits=None):
+    """
+        Write a simplified copy of the conversion next to output_path for
+        each tolerance, returns the list of their stats.  Simplifying keeps
+        every cell, so each copy has the same cellData.  With quantizeBits,
+        each copy also gets a quantized copy, see _write_quantized().
+    """
+    lods = []
+    for level, tolerance in enumerate(lod_tolerances, 1):
+        lodCells = dict(cells)
+        lodCells['lines'] = simplifyLines(points, cells['lines'][0], cells['lines'][1], tolerance)
+        lodPoints, lodCells = compactPoints(points, lodCells)
+
+        path = lod_path(output_path, level)
+        write_vtp(path, lodPoints, lodCells, fieldData, vtpFormat, cellData=cellData)
+        lods.append({
+            'level': level,
+            'tolerance': tolerance,
+            'output': path,
+            'sha': file_sha256(path),
+            'size': os.path.getsize(path),
+            'points': len(lodPoints),
+            'cells': sum([len(c[0]) for c in lodCells.values()]),
+            'quantized': None,
+        })
+        if quantizeBits:
+            lods[-1]['quantized'] = _write_quantized(path, lodPoints, lodCells, fieldData, cellData, quantizeBits)
+
+    return lods
+
+
+#------------------------------------------------------------------------------
+# Per-layer output, so viewers can fetch only the layers they show
+#------------------------------------------------------------------------------
+def layerCounts(layerIndex):
+    """The entity count of each layer of a scanDXFLayers() index, None without an index"""
+    if layerIndex is None:
+        return None
+    return dict([(name, entry['count']) for name, entry in layerIndex.items()])
+
+
+def _file_slug(name, names, default):
+    """A name usable in file names for name, unique among names (ignoring case), which it is added to"""
+    slug = re.sub(r'[^A-Za-z0-9_-]+', '_', name).strip('_') or default
+    if slug.lower() in names:
+        slug = '{0}_{1}'.format(slug, len(names))
+    names.add(slug.lower())
+    return slug
+
+
+def layer_path(output_path, name):
+    return derived_path(output_path, 'layer.{0}.vtp'.format(name))
+
+
+def _write_layers(output_path, layerArrays, origin=None, vtpFormat=DEFAULT_VTP_FORMAT):
+    """
+        Write the (points, cells, entity color) of each layer, as returned by
+        groupLayerBlocks(), to a file next to output_path named after the
+        layer (see layer_path()), with the layer name in the Layer field
+        data.  Returns the list of their stats.
+    """
+    layers = []
+    names = set()
+    for layer, (points, cells, color) in layerArrays.items():
+        name = _file_slug(layer, names, 'layer')
+
+        fieldData = collections.OrderedDict([
+            ('EntityColor', numpy.array([color], dtype=numpy.int16)),
+            ('Layer', numpy.array([layer])),
+        ])
+        if origin is not None:
+            fieldData['Origin'] = numpy.array([origin], dtype=numpy.float64)
+
+        path = layer_path(output_path, name)
+        write_vtp(path, points, cells, fieldData, vtpFormat)
+        layers.append({
+            'layer': layer,
+            'output': path,
+            'sha': file_sha256(path),
+            'size': os.path.getsize(path),
+            'bounds': pointBounds(points),
+            'points': len(points),
+            'cells': sum([len(c[0]) for c in cells.values()]),
+        })
+
+    return layers
+
+
+def labels_path(output_path):
+    return derived_path(output_path, 'labels.vtp')
+
+
+def _write_labels(output_path, labelArrays, origin=None, vtpFormat=DEFAULT_VTP_FORMAT):
+    """
+        Write the (points, cells, point data) of LabelBuilder.toArrays() to
+        a file next to output_path (see labels_path()), returns its stats.
+    """
+    points, cells, pointData = labelArrays
+    fieldData = None
+    if origin is not None:
+        fieldData = collections.OrderedDict([('Origin', numpy.array([origin], dtype=numpy.float64))])
+
+    path = labels_path(output_path)
+    write_vtp(path, points, cells, fieldData, vtpFormat, pointData)
+    return {
+        'output': path,
+        'sha': file_sha256(path),
+        'size': os.path.getsize(path),
+        'labels': len(points),
+    }
+
+
+def instances_path(output_path):
+    return derived_path(output_path, 'instances.vtp')
+
+
+def block_path(output_path, name):
+    return derived_path(output_path, 'block.{0}.vtp'.format(name))
+
+
+def _write_instances(output_path, instanceArrays, blockNames, blockGeometries, origin=None,
+                     vtpFormat=DEFAULT_VTP_FORMAT):
+    """
+        Write the (points, cells, point data) of InstanceBuilder.toArrays()
+        to a file next to output_path (see instances_path()), and the
+        (points, cells) of each inserted block, by name, to a file of its
+        own (see block_path()).  Returns the stats of the instances file and
+        the list of the stats of the block files, in BlockId order.
+    """
+    points, cells, pointData = instanceArrays
+    fieldData = collections.OrderedDict([('BlockNames', numpy.array(blockNames, dtype='U'))])
+    if origin is not None:
+        fieldData['Origin'] = numpy.array([origin], dtype=numpy.float64)
+
+    path = instances_path(output_path)
+    write_vtp(path, points, cells, fieldData, vtpFormat, pointData)
+    instances = {
+        'output': path,
+        'sha': file_sha256(path),
+        'size': os.path.getsize(path),
+        'instances': len(points),
+    }
+
+    blocks = []
+    names = set()
+    for name in blockNames:
+        blockPoints, blockCells, blockFieldData = blockArrays(name, blockGeometries[name])
+        path = block_path(output_path, _file_slug(name, names, 'block'))
+        write_vtp(path, blockPoints, blockCells, blockFieldData, vtpFormat)
+        blocks.append({
+            'name': name,
+            'output': path,
+            'sha': file_sha256(path),
+            'size': os.path.getsize(path),
+            'points': len(blockPoints),
+            'cells': sum([len(c[0]) for c in blockCells.values()]),
+        })
+
+    return instances, blocks
+
+
+#------------------------------------------------------------------------------
+# Spatial tiling, so viewers can fetch only the part of a plan in view
+#------------------------------------------------------------------------------
+def tileCells(points, cells, bounds, divisions, cellData=None):
+    """
+        Partition cells over a regular grid of (nx, ny, nz) divisions of
+        bounds, each cell going to the tile holding the average of its
+        points, so no cell is duplicated or clipped.  Cells outside bounds
+        go to the nearest tile.  Yields the (i, j, k) index, points, cells
+        and cellData of every tile holding some cells, dropping unused
+        points.
+    """
+    low = numpy.array(bounds[0::2], dtype=numpy.float64)
+    extent = numpy.array(bounds[1::2], dtype=numpy.float64) - low
+    extent[extent <= 0] = 1
+    divisions = numpy.array(divisions)
+
+    cellTiles = {}
+    for name, (sizes, connectivity) in cells.items():
+        if len(sizes) == 0:
+            cellTiles[name] = numpy.zeros(0, dtype=numpy.int64)
+            continue
+        starts = numpy.cumsum(sizes) - sizes
+        centers = numpy.add.reduceat(points[connectivity].astype(numpy.float64), starts) / sizes[:, None]
+        ijk = numpy.floor((centers - low) / extent * divisions).astype(numpy.int64)
+        ijk = numpy.clip(ijk, 0, divisions - 1)
+        cellTiles[name] = numpy.ravel_multi_index(ijk.T, divisions, order='F')
+
+    # Cell data follows the vtkPolyData numbering of the cells
+    cellTypes = [name for name in ('verts', 'lines', 'polys', 'strips') if name in cells]
+    for tile in numpy.unique(numpy.concatenate(list(cellTiles.values()))):
+        tiledCells = {}
+        for name, (sizes, connectivity) in cells.items():
+            inTile = cellTiles[name] == tile
+            tiledCells[name] = (sizes[inTile], connectivity[numpy.repeat(inTile, sizes)])
+        tiledCellData = None
+        if cellData is not None:
+            inTile = numpy.concatenate([cellTiles[name] == tile for name in cellTypes])
+            tiledCellData = collections.OrderedDict([(name, values[inTile]) for name, values in cellData.items()])
+        tilePoints, tiledCells = compactPoints(points, tiledCells)
+        yield numpy.unravel_index(tile, divisions, order='F'), tilePoints, tiledCells, tiledCellData
+
+
+def tile_path(output_path, index):
+    return derived_path(output_path, 'tile_{0}_{1}_{2}.vtp'.format(*index))
+
+
+def _tile_index_entry(tile):
+    entry = dict(tile, file=os.path.basename(tile['output']))
+    del entry['output']
+    if tile.get('quantized'):
+        entry['quantized'] = _tile_index_entry(tile['quantized'])
+    return entry
+
+
+def _write_tiles(output_path, points, cells, fieldData, divisions, bounds=None, vtpFormat=DEFAULT_VTP_FORMAT,
+                 cellData=None, quantizeBits=None):
+    """
+        Write one file per non-empty tile of a grid of divisions over bounds
+        (the bounds of points by default) next to output_path, and an index
+        of the tiles, returns the stats of the tiling.  The bounds of a tile
+        are those of its points, which overflow its grid cell, the 'cell' of
+        the tile, where its cells straddle the edges of the grid cell.  With
+        quantizeBits, each tile also gets a quantized copy, relative to the
+        bounds of the tile, see _write_quantized().
+    """
+    divisions = list(divisions) + [1] * (3 - len(divisions))
+    if bounds is None:
+        bounds = pointBounds(points)
+    low = numpy.array(bounds[0::2], dtype=numpy.float64)
+    step = (numpy.array(bounds[1::2], dtype=numpy.float64) - low) / divisions
+
+    tiles = []
+    for index, tilePoints, tiledCells, tiledCellData in tileCells(points, cells, bounds, divisions, cellData):
+        index = [int(i) for i in index]
+        path = tile_path(output_path, index)
+        write_vtp(path, tilePoints, tiledCells, fieldData, vtpFormat, cellData=tiledCellData)
+        tileLow = low + step * index
+        tiles.append({
+            'index': index,
+            'bounds': pointBounds(tilePoints),
+            'cell': [float(v) for axis in zip(tileLow, tileLow + step) for v in axis],
+            'output': path,
+            'sha': file_sha256(path),
+            'size': os.path.getsize(path),
+            'points': len(tilePoints),
+            'cells': sum([len(c[0]) for c in tiledCells.values()]),
+            'quantized': None,
+        })
+        if quantizeBits:
+            tiles[-1]['quantized'] = _write_quantized(path, tilePoints, tiledCells, fieldData, tiledCellData,
+                                                      quantizeBits)
+
+    index_path = derived_path(output_path, 'tiles.json')
+    with open(index_path, 'w') as fp:
+        json.dump({
+            'divisions': divisions,
+            'bounds': bounds,
+            'tiles': [_tile_index_entry(tile) for tile in tiles],
+        }, fp, indent=2, sort_keys=True)
+
+    return {
+        'output': index_path,
+        'sha': file_sha256(index_path),
+        'divisions': divisions,
+        'bounds': bounds,
+        'tiles': tiles,
+    }
+
+
+#------------------------------------------------------------------------------
+# Conversion of a DXF file to a single VTP file
+#------------------------------------------------------------------------------
+def _write_derived_outputs(output_path, points, cells, fieldData, lod_tolerances, tiling, vtpFormat, cellData=None,
+                           quantizeBits=None):
+    """Write the quantized copy, levels of detail and tiles of a conversion, returns their stats"""
+    stats = { 'quantized': None, 'lods': [], 'tiling': None }
+    if quantizeBits:
+        stats['quantized'] = _write_quantized(output_path, points, cells, fieldData, cellData, quantizeBits)
+    if lod_tolerances:
+        stats['lods'] = _write_lods(output_path, points, cells, fieldData, lod_tolerances, vtpFormat, cellData,
+                                    quantizeBits)
+    if tiling:
+        divisions, bounds = tiling
+        stats['tiling'] = _write_tiles(output_path, points, cells, fieldData, divisions, bounds, vtpFormat, cellData,
+                                       quantizeBits)
+    return stats
+
+
+ENGINES = ('standalone', 'paraview')
+
+# Whether dxf_to_vtp() collects statistics, and whether it also writes them
+# to the converted file
+STATISTICS_MODES = (None, 'collect', 'field-data')
+
+# Options of a conversion by dxf_to_vtp(), which describes them.  Start from
+# DEFAULT_CONVERSION_OPTIONS, e.g. DEFAULT_CONVERSION_OPTIONS._replace(
+# weld_tolerance=0.01), so options added later keep their default.
+ConversionOptions = collections.namedtuple('ConversionOptions', [
+    'glyph_cache_size', 'rotate_text', 'stream_entities', 'weld_tolerance', 'origin', 'lod_tolerances', 'tiles',
+    'tile_bounds', 'vtp_format', 'cache_dir', 'engine', 'statistics', 'include_layers', 'exclude_layers',
+    'split_layers', 'text_mode', 'block_mode', 'parse_jobs', 'cell_colors', 'layer_ids', 'quantize_bits',
+    'precompressed', 'delta'])
+DEFAULT_CONVERSION_OPTIONS = ConversionOptions(
+    glyph_cache_size=DEFAULT_GLYPH_CACHE_SIZE, rotate_text=False, stream_entities=True, weld_tolerance=None,
+    origin=None, lod_tolerances=(), tiles=None, tile_bounds=None, vtp_format=DEFAULT_VTP_FORMAT, cache_dir=None,
+    engine='standalone', statistics=None, include_layers=None, exclude_layers=None, split_layers=False,
+    text_mode='glyphs', block_mode='ignore', parse_jobs=1, cell_colors=False, layer_ids=False, quantize_bits=None,
+    precompressed=(), delta=False)
+
+
+def groupLayerBlocks(blocks, layers, colors, dtype=numpy.float64):
+    """
+        Merge the blocks of each layer, given the layer and entity color of
+        every block.  Returns an ordered dict of layer to the (points,
+        cells) of its blocks and the entity color of its first block.
+    """
+    grouped = collections.OrderedDict()
+    for block, layer, color in zip(blocks, layers, colors):
+        grouped.setdefault(layer, ([], color))[0].append(block)
+    return collections.OrderedDict([
+        (layer, appendBlocks(layerBlocks, dtype) + (color,)) for layer, (layerBlocks, color) in grouped.items()])
+
+
+def _convert_arrays(input_file, options, entity_index=None):
+    """
+        Run the standalone engine over input_file with the ConversionOptions
+        options, returns the merged points, cells and field data, along with
+        the DXFConverter, its weld statistics, with split_layers, the
+        groupLayerBlocks() of the conversion and, with cell_colors or
+        layer_ids, the blockCellData() of the merged cells.  Those write the merged arrays in a single
+        pass, see mergeBuilders(), unless split_layers needs the blocks.
+        In the labels text mode, the labels are left in the LabelBuilder of
+        the converter, in the instances block mode, the inserts are left in
+        its InstanceBuilder.  With an entity_index path, the conversion is a
+        delta of the previous one, see DXFConverter.
+    """
+    origin = options.origin
+    split_layers = options.split_layers
+    merged = options.cell_colors or options.layer_ids
+    converter = DXFConverter(options.glyph_cache_size, options.rotate_text, options.stream_entities,
+                             options.weld_tolerance, origin, bool(options.statistics), options.include_layers,
+                             options.exclude_layers, split_layers or options.layer_ids, options.text_mode,
+                             options.block_mode, options.parse_jobs, entity_index)
+    entityColorsToBuilder = converter.convert(input_file)
+    dtype = numpy.float64 if origin is None else numpy.float32
+
+    # Like vtkAppendPolyData, the merged file keeps the field data of the
+    # first block, unless the entity colors are written as cell data
+    builders = list(entityColorsToBuilder.values())
+    colors = [builder.entityColor for builder in builders]
+    blockLayers = [builder.layer for builder in builders]
+    entityColorsToBuilder = None
+    weldStatistics = (0, 0)
+    layers = None
+    start = timeit.default_timer()
+    if merged and not split_layers:
+        points, cells, cellCounts = mergeBuilders(builders, dtype)
+        for builder in builders:
+            weldStatistics = addWeldStatistics(weldStatistics, builder.weldStatistics)
+        del builders
+        if converter.statistics is not None:
+            converter.statistics.addStage('build', timeit.default_timer() - start)
+    else:
+        blocks = []
+        for builder in builders:
+            blocks.append(builder.toArrays())
+            weldStatistics = addWeldStatistics(weldStatistics, builder.weldStatistics)
+        if converter.statistics is not None:
+            converter.statistics.addStage('build', timeit.default_timer() - start)
+            start = timeit.default_timer()
+        points, cells = appendBlocks(blocks, dtype)
+        cellCounts = blockCellCounts(blocks)
+        if split_layers:
+            layers = groupLayerBlocks(blocks, blockLayers, colors, dtype)
+        del blocks, builders
+        if converter.statistics is not None:
+            converter.statistics.addStage('append', timeit.default_timer() - start)
+
+    fieldData = None
+    cellData = None
+    if colors:
+        fieldData = collections.OrderedDict()
+        if not merged:
+            fieldData['EntityColor'] = numpy.array(colors[:1], dtype=numpy.int16)
+        if origin is not None:
+            fieldData['Origin'] = numpy.array([origin], dtype=numpy.float64)
+    if merged:
+        ids, layerNames = layerIds(blockLayers)
+        if options.layer_ids and fieldData is not None:
+            fieldData['LayerNames'] = numpy.array(layerNames, dtype='U')
+        cellData = blockCellData(cellCounts, colors, ids if options.layer_ids else None)
+
+    return points, cells, fieldData, converter, weldStatistics, layers, cellData
+
+
+def _convert_standalone(input_file, output_path, options):
+    origin = options.origin
+    vtpFormat = options.vtp_format
+    points, cells, fieldData, converter, weldStatistics, layerArrays, cellData = _convert_arrays(
+        input_file, options, entity_index_path(output_path) if options.delta else None)
+    if options.statistics == 'field-data' and fieldData is not None:
+        embedded = untimedStatistics(converter.statistics.toDict())
+        fieldData['ConversionStatistics'] = numpy.array([json.dumps(embedded, sort_keys=True)])
+
+    start = timeit.default_timer()
+    write_vtp(output_path, points, cells, fieldData, vtpFormat, cellData=cellData)
+    if converter.statistics is not None:
+        converter.statistics.addStage('write', timeit.default_timer() - start)
+
+    stats = {
+        'bounds': pointBounds(points),
+        'points': len(points),
+        'cells': sum([len(c[0]) for c in cells.values()]),
+        'entityCounts': dict(converter.entityCounts),
+        'skippedText': converter.skippedText,
+        'glyphCacheHits': converter.glyphCache.hits,
+        'glyphCacheMisses': converter.glyphCache.misses,
+        'weldStatistics': weldStatistics,
+        'statistics': converter.statistics.toDict() if converter.statistics is not None else None,
+        'layerCounts': layerCounts(converter.layerIndex),
+        'layers': _write_layers(output_path, layerArrays, origin, vtpFormat) if layerArrays is not None else [],
+        'labels': None,
+        'instances': None,
+        'blocks': [],
+        'delta': converter.deltaStatistics,
+    }
+    if options.text_mode == 'labels':
+        stats['labels'] = _write_labels(output_path, converter.labels.toArrays(), origin, vtpFormat)
+    if options.block_mode == 'instances':
+        stats['instances'], stats['blocks'] = _write_instances(
+            output_path, converter.instances.toArrays(), converter.instances.blockNames, converter.blockGeometries,
+            origin, vtpFormat)
+    stats.update(_write_derived_outputs(output_path, points, cells, fieldData, options.lod_tolerances,
+                                        _tiling(options), vtpFormat, cellData, options.quantize_bits))
+
+    return stats
+
+
+def _tiling(options):
+    """The (tiles, tile_bounds) of the options, or None without tiles, see _write_derived_outputs()"""
+    return (options.tiles, options.tile_bounds) if options.tiles else None
+
+
+def _polyDataArrays(polyData, dtype=numpy.float32):
+    """
+        The points, in dtype, all four cell arrays and point data, by name,
+        of a block of the reader output, see polyDataToNumpy()
+    """
+    points, cells = polyDataToNumpy(polyData)
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        cells.setdefault(name, (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE)))
+    pointData = collections.OrderedDict()
+    for i in range(polyData.GetPointData().GetNumberOfArrays()):
+        array = polyData.GetPointData().GetAbstractArray(i)
+        if isinstance(array, vtkStringArray):
+            pointData[array.GetName()] = numpy.array([array.GetValue(j) for j in range(array.GetNumberOfValues())],
+                                                     dtype='U')
+        else:
+            pointData[array.GetName()] = numpy_support.vtk_to_numpy(array)
+    return points.astype(dtype), cells, pointData
+
+
+def _convert_paraview(input_file, output_path, options):
+    origin = options.origin
+    vtpFormat = options.vtp_format
+    split_layers = options.split_layers
+    layer_ids = options.layer_ids
+    block_mode = options.block_mode
+    merged = options.cell_colors or layer_ids
+    simple = PythonDXFReader.load_plugin()
+
+    source = simple.OpenDataFile(input_file)
+    source.GlyphCacheSize = options.glyph_cache_size
+    source.RotateText = 1 if options.rotate_text else 0
+    source.StreamEntities = 1 if options.stream_entities else 0
+    source.WeldTolerance = -1 if options.weld_tolerance is None else options.weld_tolerance
+    source.Origin = [0, 0, 0] if origin is None else list(origin)
+    source.CollectStatistics = 1 if options.statistics else 0
+    source.IncludeLayers = ';'.join(options.include_layers or [])
+    source.ExcludeLayers = ';'.join(options.exclude_layers or [])
+    source.SplitLayers = 1 if split_layers or layer_ids else 0
+    source.MergeBlocks = 1 if merged and not split_layers else 0
+    source.TextMode = TEXT_MODES.index(options.text_mode)
+    source.BlockMode = BLOCK_MODES.index(block_mode)
+    source.ParseJobs = options.parse_jobs
+
+    # Use client-side functionality here because the use of the
+    # merge blocks filter followed by the extract surface filter
+    # results in a loss of precision from double to float, which
+    # causes the texts to be unreadable
+    reader = source.SMProxy.GetClientSideObject()
+    reader.Update()
+    if reader.GetLastError():
+        simple.Delete(source)
+        warning_message(reader.GetLastError())
+        raise RuntimeError(reader.GetLastError().strip().splitlines()[-1])
+    vtkMBDataset = reader.GetOutputDataObject(0)
+    numBlocks = vtkMBDataset.GetNumberOfBlocks()
+    blockNames = reader.GetBlockNames() if block_mode == 'instances' else []
+    instances = None
+    if block_mode == 'instances':
+        # The instances and the blocks they insert come last, written on their own
+        numBlocks -= 1 + len(blockNames)
+        instances = vtkMBDataset.GetBlock(numBlocks)
+    labels = None
+    if options.text_mode == 'labels':
+        # The labels come right after the color blocks, written on their own
+        numBlocks -= 1
+        labels = vtkMBDataset.GetBlock(numBlocks)
+
+    hits, misses = reader.GetGlyphCacheStatistics()
+
+    if merged and not split_layers:
+        # The reader merged the blocks already, copy the block as the output
+        # is about to lose some field data and the reader may keep the block
+        outputPolyData = vtkPolyData()
+        outputPolyData.ShallowCopy(vtkMBDataset.GetBlock(0))
+    else:
+        # Points relative to an origin are small enough for single precision
+        appender = vtkAppendPolyData()
+        appender.SetOutputPointsPrecision(1 if origin is None else 0)
+
+        for i in range(numBlocks):
+            nextBlock = vtkMBDataset.GetBlock(i)
+            appender.AddInputData(nextBlock)
+
+        appender.Update()
+        outputPolyData = appender.GetOutput()
+
+    if merged and split_layers:
+        # The layer files need the blocks, the cell data is derived from them
+        cellCounts = []
+        colors = []
+        blockLayers = []
+        for i in range(numBlocks):
+            block = vtkMBDataset.GetBlock(i)
+            cellCounts.append({ 'verts': block.GetNumberOfVerts(), 'lines': block.GetNumberOfLines(),
+                                'polys': block.GetNumberOfPolys(), 'strips': block.GetNumberOfStrips() })
+            colors.append(block.GetFieldData().GetArray('EntityColor').GetValue(0))
+            blockLayers.append(vtkMBDataset.GetMetaData(i).Get(vtkCompositeDataSet.NAME()))
+        ids, layerNames = layerIds(blockLayers)
+        outputPolyData.GetFieldData().RemoveArray('EntityColor')
+        if layer_ids:
+            addArrays(outputPolyData.GetFieldData(),
+                      collections.OrderedDict([('LayerNames', numpy.array(layerNames, dtype='U'))]))
+        addArrays(outputPolyData.GetCellData(), blockCellData(cellCounts, colors, ids if layer_ids else None))
+    if options.statistics != 'field-data':
+        outputPolyData.GetFieldData().RemoveArray('ConversionStatistics')
+
+    writer = vtkXMLPolyDataWriter()
+    writer.SetFileName(output_path)
+    if vtpFormat.encoding == 'inline':
+        writer.SetDataModeToBinary()
+    else:
+        writer.SetDataModeToAppended()
+        writer.SetEncodeAppendedData(vtpFormat.encoding == 'base64')
+    setCompressor = {
+        'none': writer.SetCompressorTypeToNone,
+        'zlib': writer.SetCompressorTypeToZLib,
+        'lz4': writer.SetCompressorTypeToLZ4,
+        'lzma': writer.SetCompressorTypeToLZMA,
+    }
+    setCompressor[vtpFormat.compressor]()
+    writer.SetCompressionLevel(vtpFormat.level)
+    writer.SetBlockSize(vtpFormat.blockSize)
+    writer.SetInputData(outputPolyData)
+    start = timeit.default_timer()
+    writer.Write()
+    writeSeconds = timeit.default_timer() - start
+
+    stats = {
+        'bounds': list(outputPolyData.GetBounds()),
+        'points': outputPolyData.GetNumberOfPoints(),
+        'cells': outputPolyData.GetNumberOfCells(),
+        'entityCounts': reader.GetEntityCounts(),
+        'skippedText': 0,
+        'glyphCacheHits': hits,
+        'glyphCacheMisses': misses,
+        'weldStatistics': reader.GetWeldStatistics(),
+        'statistics': reader.GetStatistics(),
+        'layerCounts': layerCounts(reader.GetLayerIndex()),
+        'layers': [],
+        'labels': None,
+        'instances': None,
+        'blocks': [],
+        'delta': None,
+        'quantized': None,
+        'lods': [],
+        'tiling': None,
+    }
+    if stats['statistics'] is not None:
+        stats['statistics']['stages']['write'] = writeSeconds
+
+    pointsType = numpy.float64 if origin is None else numpy.float32
+    if labels is not None:
+        labelPoints, labelCells, pointData = _polyDataArrays(labels, pointsType)
+        stats['labels'] = _write_labels(output_path, (labelPoints, labelCells, pointData), origin, vtpFormat)
+
+    if instances is not None:
+        instancePoints, instanceCells, pointData = _polyDataArrays(instances, pointsType)
+        blockGeometries = {}
+        for i, name in enumerate(blockNames):
+            blockPoints, blockCells, _ = _polyDataArrays(vtkMBDataset.GetBlock(vtkMBDataset.GetNumberOfBlocks()
+                                                                                - len(blockNames) + i))
+            blockGeometries[name] = (blockPoints, blockCells)
+        stats['instances'], stats['blocks'] = _write_instances(
+            output_path, (instancePoints, instanceCells, pointData), blockNames, blockGeometries, origin, vtpFormat)
+
+    if split_layers:
+        blocks = []
+        blockLayers = []
+        colors = []
+        for i in range(numBlocks):
+            blockPoints, blockCells = polyDataToNumpy(vtkMBDataset.GetBlock(i))
+            for name in ('verts', 'lines', 'polys', 'strips'):
+                blockCells.setdefault(name, (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE)))
+            blocks.append((blockPoints, blockCells))
+            blockLayers.append(vtkMBDataset.GetMetaData(i).Get(vtkCompositeDataSet.NAME()))
+            colors.append(vtkMBDataset.GetBlock(i).GetFieldData().GetArray('EntityColor').GetValue(0))
+        layerArrays = groupLayerBlocks(blocks, blockLayers, colors, numpy.float64 if origin is None else numpy.float32)
+        stats['layers'] = _write_layers(output_path, layerArrays, origin, vtpFormat)
+
+    if options.lod_tolerances or options.tiles or options.quantize_bits:
+        # Derive the other outputs from the merged output, in the precision it was written in
+        points, cells = polyDataToNumpy(outputPolyData)
+        if origin is not None:
+            points = points.astype(numpy.float32)
+        for name in ('verts', 'lines', 'polys', 'strips'):
+            cells.setdefault(name, (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE)))
+
+        fieldData = collections.OrderedDict()
+        for i in range(outputPolyData.GetFieldData().GetNumberOfArrays()):
+            array = outputPolyData.GetFieldData().GetAbstractArray(i)
+            if isinstance(array, vtkStringArray):
+                fieldData[array.GetName()] = numpy.array([array.GetValue(j) for j in range(array.GetNumberOfValues())],
+                                                         dtype='U')
+            else:
+                fieldData[array.GetName()] = numpy_support.vtk_to_numpy(array)
+        cellData = None
+        if merged:
+            cellData = collections.OrderedDict()
+            for i in range(outputPolyData.GetCellData().GetNumberOfArrays()):
+                array = outputPolyData.GetCellData().GetArray(i)
+                cellData[array.GetName()] = numpy_support.vtk_to_numpy(array)
+
+        stats.update(_write_derived_outputs(output_path, points, cells, fieldData, options.lod_tolerances,
+                                            _tiling(options), vtpFormat, cellData, options.quantize_bits))
+
+    simple.Delete(source)
+
+    return stats
+
+
+def dxf_to_vtp(input_file, output_path, options=DEFAULT_CONVERSION_OPTIONS):
+    """
+        Convert input_file to a VTP file at output_path with the
+        ConversionOptions options, and return a dict of statistics about the
+        conversion.  The file is encoded and compressed as the vtp_format of
+        the options says.  The standalone engine runs in any Python with
+        numpy, the paraview engine goes through the reader plugin and needs
+        pvpython.  With a weld_tolerance,
+        coincident points of the line work are merged, see weldPoints().
+        With an (x, y, z) origin, points are written relative to it in single
+        precision, and the origin is kept in the Origin field data and the
+        stats.  Each of lod_tolerances adds a level of detail, a copy of the
+        file with its polylines simplified to that tolerance, written next
+        to it (see lod_path()) and described in the 'lods' of the stats.
+        With (nx, ny[, nz]) tiles, the cells are also split over a grid of
+        that many tiles over tile_bounds (in the coordinates of the written
+        points, the bounds of the conversion by default), written next to
+        the file with an index (see _write_tiles()) described in the
+        'tiling' of the stats.
+        With statistics set to 'collect', the entities of each DXF type and
+        each handler are counted and timed (see ConversionStatistics) into
+        the 'statistics' of the stats, 'field-data' also writes them to the
+        file as the ConversionStatistics field data.
+        include_layers and exclude_layers select the layers converted, see
+        selectLayers(), the entity count of every layer is then in the
+        'layerCounts' of the stats.  With split_layers, the entities of
+        each layer are also written to a file of their own next to the
+        file (see _write_layers()), described in the 'layers' of the stats.
+        In the 'labels' text_mode, text is written as labeled points to a
+        file of its own next to the file (see _write_labels()), described
+        in the 'labels' of the stats, instead of vector text glyphs.
+        INSERT entities are dropped in the default 'ignore' block_mode, and
+        replaced by a copy of their block in the 'expand' mode.  In the
+        'instances' mode, each insert is written as a point, with its block
+        id, rotation, scale and array as point data, to a file next to the
+        file, and each inserted block to a file of its own (see
+        _write_instances()), described in the 'instances' and 'blocks' of
+        the stats.
+        With parse_jobs above 1, large files are parsed by that many worker
+        processes, each converting a part of the ENTITIES section, which
+        gives the same file as parsing it in a single process, see
+        DXFConverter.
+        With cell_colors, the file holds the entity color of every cell as
+        the EntityColor cell data, instead of the color of its first block
+        as field data, and is filled in a single pass, without merging
+        blocks built one by one (see mergeBuilders()).  layer_ids also adds
+        the LayerId cell data, indexing the LayerNames field data.  Levels
+        of detail and tiles carry the same cell data.
+        With quantize_bits, 16 or 32, the file, its levels of detail and
+        tiles also get a quantized copy (see write_quantized()), smaller
+        and quicker to load in a browser, described in the 'quantized' of
+        their stats.
+        Each of the precompressed Content-Encodings, 'gzip' or 'br', adds
+        a compressed copy of every written file next to it, e.g.
+        lev1146.vtp.gz, for web servers to send as is, see precompress().
+        With delta, the standalone engine keeps an index of the entities of
+        the file next to it (see entity_index_path()), and converts a
+        revision of the file as a delta of the previous conversion, only
+        decoding the entities added or changed since, which gives the same
+        file.  The 'delta' of the stats counts the entities reused,
+        converted, added, changed and removed, and estimates the time saved.
+        With a cache_dir, inputs already converted with the same options are
+        copied from the cache instead.
+    """
+    if options.engine not in ENGINES:
+        raise ValueError('Unknown conversion engine: {0}'.format(options.engine))
+    if options.text_mode not in TEXT_MODES:
+        raise ValueError('Unknown text mode: {0}'.format(options.text_mode))
+    if options.block_mode not in BLOCK_MODES:
+        raise ValueError('Unknown block mode: {0}'.format(options.block_mode))
+    if options.statistics not in STATISTICS_MODES:
+        raise ValueError('Unknown statistics mode: {0}'.format(options.statistics))
+    if options.quantize_bits and options.quantize_bits not in QUANTIZED_BITS:
+        raise ValueError('Points are quantized to 16 or 32 bits, not {0}'.format(options.quantize_bits))
+    for encoding in options.precompressed:
+        if encoding not in PRECOMPRESSED_ENCODINGS:
+            raise ValueError('Unknown precompressed encoding: {0}'.format(encoding))
+    if options.delta and options.engine != 'standalone':
+        raise ValueError('Delta conversions need the standalone engine')
+    origin = [float(v) for v in options.origin] if options.origin is not None else None
+    options = options._replace(origin=origin, vtp_format=VTPFormat(*options.vtp_format))
+
+    if output_path[-4:] != '.vtp':
+        output_path = '{0}.vtp'.format(output_path)
+
+    output_dir = os.path.dirname(output_path)
+    if output_dir and not os.path.isdir(output_dir):
+        os.makedirs(output_dir)
+
+    if options.cache_dir:
+        # Only the options which change the written file belong in the key
+        cache_key = conversion_cache_key(file_sha256(input_file), {
+            'rotate_text': options.rotate_text,
+            'weld_tolerance': options.weld_tolerance,
+            'origin': origin,
+            'lod_tolerances': list(options.lod_tolerances),
+            'tiles': list(options.tiles) if options.tiles else None,
+            'tile_bounds': list(options.tile_bounds) if options.tile_bounds else None,
+            'vtp_format': list(options.vtp_format),
+            'engine': options.engine,
+            'statistics_field_data': options.statistics == 'field-data',
+            'include_layers': options.include_layers,
+            'exclude_layers': options.exclude_layers,
+            'split_layers': options.split_layers,
+            'text_mode': options.text_mode,
+            'block_mode': options.block_mode,
+            'cell_colors': options.cell_colors,
+            'layer_ids': options.layer_ids,
+            'quantize_bits': options.quantize_bits,
+        })
+        stats = _read_conversion_cache(options.cache_dir, cache_key, output_path)
+        if stats:
+            precompress_outputs(stats, options.precompressed)
+            return stats
+
+    convert = _convert_paraview if options.engine == 'paraview' else _convert_standalone
+    stats = convert(input_file, output_path, options)
+    stats['output'] = output_path
+    stats['origin'] = origin
+    stats['sha'] = file_sha256(output_path)
+    stats['size'] = os.path.getsize(output_path)
+
+    if options.cache_dir:
+        _write_conversion_cache(options.cache_dir, cache_key, output_path, stats)
+    stats['cached'] = False
+    precompress_outputs(stats, options.precompressed)
+
+    return stats
+
+
+#------------------------------------------------------------------------------
+# Batch conversion of many DXF files on a pool of worker processes
+#------------------------------------------------------------------------------
+def find_dxf_files(path):
+    """List the DXF files of a directory, or matching a glob pattern"""
+    import glob
+
+    if os.path.isdir(path):
+        names = [n for n in os.listdir(path) if n.lower().endswith('.dxf')]
+        return sorted([os.path.join(path, n) for n in names])
+    return sorted(glob.glob(path))
+
+
+def _init_batch_worker():
+    # Pay the ParaView startup and plugin loading once per worker process
+    PythonDXFReader.load_plugin()
+
+
+def _batch_convert(task):
+    input_file, output_path, options = task
+    start = time.time()
+    try:
+        stats = dxf_to_vtp(input_file, output_path, options)
+        return (input_file, output_path, None, time.time() - start, stats)
+    except Exception as err:
+        warning_message(traceback.format_exc())
+        return (input_file, output_path, '{0}: {1}'.format(type(err).__name__, err), time.time() - start, None)
+
+
+def batch_output_paths(input_files, output_dir):
+    """
+        The VTP file of each of input_files in output_dir, of the same name.
+        When names repeat, e.g. for a glob pattern over several directories,
+        the directories of the files below their common one are added to the
+        names, e.g. output_dir/in1-x.vtp, keeping all the files in
+        output_dir for the manifest.  Raises ValueError when names still
+        repeat, e.g. for a file listed twice.
+    """
+    names = [os.path.splitext(os.path.basename(input_file))[0] for input_file in input_files]
+    if len(set(names)) < len(names):
+        directories = [os.path.dirname(os.path.abspath(input_file)) + os.sep for input_file in input_files]
+        common = os.path.dirname(os.path.commonprefix(directories))
+        names = [os.path.splitext(os.path.relpath(os.path.abspath(input_file), common))[0].replace(os.sep, '-')
+                 for input_file in input_files]
+
+    paths = [os.path.join(output_dir, '{0}.vtp'.format(name)) for name in names]
+    duplicates = sorted(set([path for path in paths if paths.count(path) > 1]))
+    if duplicates:
+        raise ValueError('Several input files convert to {0}'.format(', '.join(duplicates)))
+    return paths
+
+
+def batch_dxf_to_vtp(input_files, output_dir, options=DEFAULT_CONVERSION_OPTIONS, jobs=1, report=None):
+    """
+        Convert each of input_files to a VTP file of the same name in
+        output_dir (see batch_output_paths()) with the ConversionOptions
+        options, using up to jobs worker processes.  A file failing to
+        convert does not stop the others.  report(result) is called as each
+        file completes, with a (input_file, output_path, error, seconds,
+        stats) tuple where error is None on success, and the list of all
+        results is returned in input order.
+    """
+    tasks = [(input_file, output_path, options)
+             for input_file, output_path in zip(input_files, batch_output_paths(input_files, output_dir))]
+
+    results = {}
+    if jobs <= 1 or len(tasks) <= 1:
+        completed = (_batch_convert(task) for task in tasks)
+        pool = None
+    else:
+        import multiprocessing
+        initializer = _init_batch_worker if options.engine == 'paraview' else None
+        pool = multiprocessing.Pool(min(jobs, len(tasks)), initializer=initializer)
+        completed = pool.imap_unordered(_batch_convert, tasks)
+
+    try:
+        for result in completed:
+            results[result[0]] = result
+            if report:
+                report(result)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    return [results[task[0]] for task in tasks]
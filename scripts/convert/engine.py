@@ -0,0 +1,3537 @@
+"""
+    DXF conversion engine, shared by the ParaView reader plugin,
+    PythonDXFReader.py, and the standalone converter, converter.py.
+
+    Parses DXF files, with a streaming parser or dxfgrabber, runs the
+    entity handlers filling PolyDataBuilders, one per color block, and
+    gathers labels, block instances and statistics.  DXFConverter drives a
+    conversion, in parallel worker processes if asked, or as a delta of an
+    EntityIndex of an earlier one.  ReaderEngine is the conversion behind
+    the reader, keeping recent outputs in memory and in sidecars.  Only
+    numpy is required, VTK is used when available.
+"""
+import array, collections, fnmatch, hashlib, io, itertools, json, math, os
+import struct, timeit, zipfile, zlib
+
+import numpy
+
+# The conversion engine only needs numpy.  VTK is used when available, to
+# create text glyphs and the data objects of the reader.
+try:
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkCommonDataModel import vtkPolyData, vtkCellArray, vtkCompositeDataSet, vtkMultiBlockDataSet
+    from vtkmodules.vtkCommonCore import vtkPoints, vtkShortArray, vtkDoubleArray, vtkStringArray, VTK_ID_TYPE
+    from vtkmodules.vtkRenderingFreeType import vtkVectorText
+    HAVE_VTK = True
+except ImportError:
+    HAVE_VTK = False
+
+
+# Set to True to print warnings about issues encountered
+PRINT_WARNING_MESSAGES = False
+
+# Number of distinct label strings whose vector text glyph is kept around
+DEFAULT_GLYPH_CACHE_SIZE = 1024
+
+# Bump whenever a change to the converter changes the files it writes, so
+# the conversion cache does not serve files from an older converter
+CONVERTER_VERSION = 3
+
+
+# numpy dtype matching vtkIdType, for building cell arrays in bulk
+ID_TYPE = numpy_support.get_vtk_to_numpy_typemap()[VTK_ID_TYPE] if HAVE_VTK else numpy.int64
+
+# Points and cells gathered as Python objects are moved into numpy arrays
+# every this many items, which bounds their memory overhead
+FLUSH_SIZE = 65536
+
+# Text is turned into vector text glyphs, or into points labeled with the
+# text, for viewers drawing text themselves
+TEXT_MODES = ('glyphs', 'labels')
+
+# INSERT entities are ignored, written as instances of blocks converted once,
+# or expanded into copies of their block
+BLOCK_MODES = ('ignore', 'instances', 'expand')
+
+# What reading a truncated or otherwise damaged .npz file may raise
+NPZ_READ_ERRORS = (IOError, OSError, EOFError, ValueError, KeyError, IndexError, TypeError, zipfile.BadZipfile,
+                   zlib.error)
+
+# Bytes of a DXF file read at a time by the layer pre-scan
+SCAN_CHUNK_SIZE = 1 << 24
+
+# The handle of an entity is looked for in that many of its first bytes
+ENTITY_KEY_SCAN_SIZE = 512
+
+# Number of outputs kept by each reader, so re-executing the pipeline, or
+# going back to previous options, does not convert the file again
+DEFAULT_OUTPUT_CACHE_SIZE = 3
+
+# Smallest part of the ENTITIES section parsed by a worker process when
+# parsing in parallel, smaller parts cost more to hand over than to parse
+PARALLEL_PART_SIZE = 1 << 22
+
+
+def warning_message(msg):
+    if PRINT_WARNING_MESSAGES:
+        print(msg)
+
+
+class ConversionStatistics(object):
+    """
+        Counters and cumulative timings of a conversion, per DXF entity type
+        and per entity handler, along with the time spent in each stage and
+        counts of the events which otherwise only show as warnings.  Filled
+        in by handleEntity() and the converter when statistics are collected.
+    """
+    def __init__(self):
+        self.entityTypes = {}
+        self.handlers = {}
+        self.stages = collections.OrderedDict()
+        self.events = collections.Counter()
+
+    def addEntity(self, entityType, handlerName, seconds, dropped=False):
+        counters = self.entityTypes.get(entityType)
+        if counters is None:
+            counters = { 'count': 0, 'handled': 0, 'unhandled': 0, 'dropped': 0, 'seconds': 0.0 }
+            self.entityTypes[entityType] = counters
+        counters['count'] += 1
+        counters['seconds'] += seconds
+        if handlerName is None:
+            counters['unhandled'] += 1
+            return
+        counters['handled'] += 1
+        if dropped:
+            counters['dropped'] += 1
+
+        handler = self.handlers.get(handlerName)
+        if handler is None:
+            handler = self.handlers[handlerName] = { 'calls': 0, 'seconds': 0.0 }
+        handler['calls'] += 1
+        handler['seconds'] += seconds
+
+    def addStage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def addEvent(self, name, count=1):
+        self.events[name] += count
+
+    def handlerSeconds(self):
+        return sum([h['seconds'] for h in self.handlers.values()])
+
+    def merge(self, other):
+        """Add the counters and timings of other, e.g. of a worker process, to these"""
+        for table, otherTable in ((self.entityTypes, other.entityTypes), (self.handlers, other.handlers)):
+            for name, counters in otherTable.items():
+                if name in table:
+                    for key, value in counters.items():
+                        table[name][key] += value
+                else:
+                    table[name] = dict(counters)
+        for name, seconds in other.stages.items():
+            self.addStage(name, seconds)
+        self.events.update(other.events)
+
+    def toDict(self):
+        return {
+            'entityTypes': self.entityTypes,
+            'handlers': self.handlers,
+            'stages': dict(self.stages),
+            'events': dict(self.events),
+        }
+
+
+def untimedStatistics(statistics):
+    """
+        The toDict() of a ConversionStatistics without its timings, as
+        written to converted files, so converting a file again with the
+        same options writes the same bytes
+    """
+    def untimed(table):
+        return dict([(name, dict([(key, value) for key, value in counters.items() if key != 'seconds']))
+                     for name, counters in table.items()])
+
+    return {
+        'entityTypes': untimed(statistics['entityTypes']),
+        'handlers': untimed(statistics['handlers']),
+        'events': dict(statistics['events']),
+    }
+
+
+#------------------------------------------------------------------------------
+# Handler infrastructure for different types of DXF entities.  So far, we have
+# examples of the following types of entities:
+#
+#    POLYLINE, LWPOLYLINE, POINT, TEXT, INSERT, SEQEND, LINE, MTEXT, 3DFACE,
+#    POLYFACE, POLYMESH
+#
+# Handlers return a TextLabel for text to draw, a BlockReference for blocks
+# to place, False when they drop the entity for lack of information, and
+# None otherwise.
+#------------------------------------------------------------------------------
+entityHandlers = {}
+
+
+def registerHandler(entityType, handler):
+    entityHandlers[entityType] = handler
+
+
+def handleEntity(entity, builder=None, statistics=None):
+    entityType = entity.dxftype
+    # warning_message('{0} -> {1}'.format(entity.color, entity.dxftype))
+
+    if entityType in entityHandlers and entityHandlers[entityType]:
+        handler = entityHandlers[entityType]
+        if statistics is None:
+            return handler(entity, builder)
+
+        start = timeit.default_timer()
+        result = handler(entity, builder)
+        statistics.addEntity(entityType, handler.__name__, timeit.default_timer() - start, result is False)
+        return result
+    else:
+        warning_message('No handler for entity type {0}'.format(entityType))
+        if statistics is not None:
+            statistics.addEntity(entityType, None, 0.0)
+
+
+def handlePolyLine(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Polyline
+
+        The attributes 'bulge', 'points', 'tangents', 'vertices', and 'width'
+        seem to be parallel arrays.
+
+        entity.append_data              <bound method ... >
+        entity.bulge                    [0.0, ..., 0.0]
+        entity.cast                     <bound method ... >
+        entity.color                    30
+        entity.control_points           []
+        entity.default_end_width        0.0
+        entity.default_start_width      0.0
+        entity.dxftype                  u'POLYLINE'
+        entity.elevation                (0.0, 0.0, 0.0)
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.flags                    8
+        entity.handle                   u'363'
+        entity.invisible                0
+        entity.is_closed                False
+        entity.is_mclosed               False
+        entity.is_nclosed               False
+        entity.layer                    u'PLOTS_APEX LEVEL_01 DESIGN_00 PLOT WALLS'
+        entity.layout_tab_name
+        entity.line_weight              0
+        entity.linetype
+        entity.ltscale                  1.0
+        entity.m_smooth_density         0.0
+        entity.mcount                   0
+        entity.mode                     u'polyline3d'
+        entity.n_smooth_density         0.0
+        entity.ncount                   0
+        entity.owner                    u'347'
+        entity.paperspace
+        entity.points                   [(651435.2482160575, 4767534.152790012, -73.31750819381297), ...,
+                                         (651409.9219160576, 4767556.141590012, -72.52254283757036)]
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.smooth_type              0
+        entity.spline_type
+        entity.tangents                 [None, ..., None]
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+        entity.vertices                 [<dxfgrabber.dxfentities.Vertex object at 0x7fb37f903610>, ...,
+                                         <dxfgrabber.dxfentities.Vertex object at 0x7fb37f8fc810>]
+        entity.width                    [(0.0, 0.0), ..., (0.0, 0.0)]
+        entity.vertices[0]
+
+            <dxfgrabber.dxfentities.Vertex object at 0x7fb37f903610>
+
+            entity.vertices[0].bulge              0.0
+            entity.vertices[0].color              30
+            entity.vertices[0].dxftype            u'VERTEX'
+            entity.vertices[0].end_width          0.0
+            entity.vertices[0].extrusion
+            entity.vertices[0].flags              32
+            entity.vertices[0].handle             u'364'
+            entity.vertices[0].invisible          0
+            entity.vertices[0].layer              u'PLOTS_APEX LEVEL_01 DESIGN_00 PLOT WALLS'
+            entity.vertices[0].layout_tab_name
+            entity.vertices[0].line_weight        0
+            entity.vertices[0].linetype           u'BYLAYER'
+            entity.vertices[0].location           (651435.2482160575, 4767534.152790012, -73.31750819381297)
+            entity.vertices[0].ltscale            1.0
+            entity.vertices[0].owner              u''
+            entity.vertices[0].paperspace
+            entity.set_default_extrusion          <bound method ... >
+            entity.setup_attributes               <bound method ... >
+            entity.vertices[0].shadow_mode
+            entity.vertices[0].start_width        0.0
+            entity.vertices[0].tangent
+            entity.vertices[0].thickness          0.0
+            entity.vertices[0].transparency
+            entity.vertices[0].true_color
+            entity.vertices[0].vtx
+    """
+    firstId = builder.insertPoints(entity.points)
+    builder.insertLine(firstId, len(entity.points))
+
+
+def handleLWPolyLine(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.LWPolyline
+
+        The attributes 'bulge', 'points', and 'width' seem to be parallel arrays
+
+        entity.bulge                    [0.0, 0.0, ..., 0.0]
+        entity.color                    18
+        entity.const_width              0.0
+        entity.dxftype                  u'LWPOLYLINE'
+        entity.elevation                -71.0
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.flags                    0
+        entity.handle                   u'725'
+        entity.invisible                0
+        entity.is_closed                False
+        entity.layer                    u'PLOTS_APEX LEVEL_04 GEOLOGY_FAULTS'
+        entity.layout_tab_name
+        entity.line_weight              0
+        entity.linetype                 u'DASHED2'
+        entity.ltscale                  50.0
+        entity.owner                    u'347'
+        entity.paperspace
+        entity.points                   [(652316.1982694921, 4768796.039987729),
+                                         (652310.2965201059, 4768791.062912218), ..., (650144.0, 4767428.757242111)]
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+        entity.width                    [(0.0, 0.0), (0.0, 0.0), ..., (0.0, 0.0)]
+    """
+    elevation = entity.elevation
+
+    firstId = builder.insertPoints([(pt[0], pt[1], elevation) for pt in entity.points])
+    builder.insertLine(firstId, len(entity.points), closed=entity.is_closed)
+
+
+# What the text handlers hand back to the reader, which turns it into geometry
+# or a labeled point.  rotation is in degrees, alignment is the MTEXT
+# attachment point, from 1 (top left) to 9 (bottom right).
+TextLabel = collections.namedtuple('TextLabel', ['text', 'position', 'rotation', 'height', 'alignment'])
+
+
+# What the INSERT handler hands back to the reader: a block placed at position,
+# scaled, rotated by rotation degrees around z, and repeated over a grid of
+# rows by columns spaced in the rotated block coordinates
+BlockReference = collections.namedtuple('BlockReference', ['name', 'position', 'rotation', 'scale', 'rows', 'columns',
+                                                           'rowSpacing', 'columnSpacing'])
+
+
+def textAlignment(halign, valign):
+    """MTEXT attachment point of the horizontal and vertical alignments of a TEXT entity"""
+    if halign == 4:
+        # "Middle" centers the text both ways
+        return 5
+    column = { 1: 1, 2: 2 }.get(halign, 0)
+    row = { 3: 0, 2: 1 }.get(valign, 2)
+    return 3 * row + column + 1
+
+
+def _createVectorText(text):
+    source = vtkVectorText()
+    source.SetText(text)
+    source.Update()
+    return polyDataToNumpy(source.GetOutput())
+
+
+def handleMText(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.MText
+
+        entity.attachment_point                   1
+        entity.big_font                 u'Arial'
+        entity.color                    256
+        entity.dxftype                  u'MTEXT'
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.font                     u'Arial'
+        entity.handle                   u'B9'
+        entity.height                   5.0
+        entity.horizontal_width         36.97228539775091
+        entity.insert                   (651331.9766731897, 4767529.584343491, -91.44930179)
+        entity.invisible                0
+        entity.layer                    u'PLOTS_APEX LEVEL_02 GENERAL ANNOTATIONS'
+        entity.layout_tab_name
+        entity.line_spacing             1.0
+        entity.line_weight              0
+        entity.lines                    <bound method ... >
+        entity.lines()                  [u'From UCL']
+        entity.linetype
+        entity.ltscale                  1.0
+        entity.owner                    u'347'
+        entity.paperspace
+        entity.plain_text               <bound method ... >
+        entity.plain_text()             u'From UCL'
+        entity.raw_text                 u'From UCL'
+        entity.rect_width               36.97228539775091
+        entity.resolve_text_style       <bound method ... >
+        entity.resolve_text_style()     *** TypeError: resolve_text_style() takes exactly 2 arguments (1 given)
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.style                    u'STANDARD'
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+        entity.vertical_height
+        entity.xdirection               (0.9959898178265837, -0.08946665739686809, 0.0)
+    """
+    if entity.raw_text and entity.insert:
+        rotation = 0.0
+        if entity.xdirection:
+            rotation = math.degrees(math.atan2(entity.xdirection[1], entity.xdirection[0]))
+        return TextLabel(entity.raw_text, entity.insert, rotation, entity.height, entity.attachment_point)
+    else:
+        msg = ''.join([
+            'MTEXT entity missing information, needs both ',
+            '"raw_text" (got {0}) and "insert" (got {1})',
+        ]).format(entity.raw_text, entity.insert)
+        warning_message(msg)
+        return False
+
+
+def handleText(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Text
+
+        entity.align_point              (651542.2137707327, 4767701.815610482, -69.86459901)
+        entity.big_font                 u''
+        entity.color                    7
+        entity.dxftype                  u'TEXT'
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.font                     u'Arial'
+        entity.halign                   4
+        entity.handle                   u'E0'
+        entity.height                   1.5
+        entity.insert                   (5.7591235000872985, -1.4695264222100377, 2.397784886529493)
+        entity.invisible                0
+        entity.is_backwards             False
+        entity.is_upside_down           False
+        entity.layer                    u'PLOTS_APEX LEVEL_08 DRAINAGE_ANNOTATIONS'
+        entity.layout_tab_name
+        entity.line_weight              0
+        entity.linetype
+        entity.ltscale                  1.0
+        entity.oblique                  0.0
+        entity.owner                    u'347'
+        entity.paperspace
+        entity.plain_text               <bound method ... >
+        entity.plain_text()             u'-2.0'
+        entity.resolve_text_style       <bound method ... >
+        entity.resolve_text_style()     *** TypeError: resolve_text_style() takes exactly 2 arguments (1 given)
+        entity.rotation                 -15.00734424682809
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.style                    u'STANDARD'
+        entity.text                     u'-2.0'
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+        entity.valign                   2
+        entity.width                    1.0
+    """
+    if entity.text and (entity.align_point or entity.insert):
+        position = entity.align_point or entity.insert
+        return TextLabel(entity.text, position, entity.rotation, entity.height,
+                         textAlignment(entity.halign, entity.valign))
+    else:
+        msg = ''.join([
+            'TEXT entity missing information, needs both ',
+            '"text" (got {0}) and one of "align_point" (got {1}) or ',
+            '"insert" (got {2}).',
+        ]).format(entity.text, entity.align_point, entity.insert)
+        warning_message(msg)
+        return False
+
+
+def handleLine(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Line
+
+        entity.extrusion
+        entity.handle                   u'5DD'
+        entity.invisible                0
+        entity.layer                    u'PLOTS_APEX LEVEL_08 DRAINAGE_ANNOTATIONS'
+        entity.layout_tab_name
+        entity.line_weight              0
+        entity.linetype
+        entity.ltscale                  1.0
+        entity.owner                    u'347'
+        entity.paperspace
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.start                    (651673.5777664077, 4767630.029236615, -67.38643794130182)
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+        entity.color                    7
+        entity.dxftype                  u'LINE'
+        entity.end                      (651685.8624363637, 4767647.573426308, -67.81708068316786)
+    """
+    startIdx = builder.insertPoints([entity.start, entity.end])
+    builder.insertLine(startIdx, 2)
+
+
+def handle3DFace(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Face
+
+        Triangles repeat their third corner as the fourth.
+
+        entity.color                    256
+        entity.dxftype                  u'3DFACE'
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.handle                   u'2A41'
+        entity.invisible_edge           0
+        entity.layer                    u'OREBODY_SHELL'
+        entity.points                   [(651392.51, 4767530.16, -84.02), ..., (651393.87, 4767529.34, -84.66)]
+    """
+    points = entity.points
+    if len(points) == 4 and tuple(points[3]) == tuple(points[2]):
+        points = points[:3]
+    if len(points) < 3:
+        warning_message('3DFACE entity {0} has {1} corners'.format(entity.handle, len(points)))
+        return False
+
+    firstId = builder.insertPoints(points)
+    builder.insertPolygon(firstId, len(points))
+
+
+def meshArrays(entity):
+    """
+        The vertex table of a POLYFACE or POLYMESH entity as an (n, 3)
+        array, and the (m, 4) array of the vertex indices of the face
+        records of a POLYFACE, as _decodeMeshVertex() stores them.  Reads
+        the arrays of the streaming parser, or the vertices of a
+        dxfgrabber entity.
+    """
+    if hasattr(entity, 'meshPoints'):
+        points = numpy.zeros((0, 3), dtype=numpy.float64)
+        if len(entity.meshPoints):
+            points = numpy.frombuffer(entity.meshPoints, dtype=numpy.float64).reshape(-1, 3)
+        faces = numpy.zeros((0, 4), dtype=numpy.intc)
+        if len(entity.meshFaces):
+            faces = numpy.frombuffer(entity.meshFaces, dtype=numpy.intc).reshape(-1, 4)
+        return points, faces
+
+    locations = []
+    records = []
+    for vertex in entity.vertices:
+        if vertex.flags & 128 and not vertex.flags & 64:
+            if vertex.vtx:
+                records.append(vertex.vtx)
+        elif not vertex.flags & 16:
+            locations.append(tuple(vertex.location)[:3])
+    return (numpy.array(locations, dtype=numpy.float64).reshape(-1, 3),
+            numpy.array(records, dtype=numpy.intc).reshape(-1, 4))
+
+
+def handlePolyFace(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.PolyFace, a POLYLINE with flag 64 whose
+        VERTEX entities are a table of vertices, followed by face records
+        listing the vertices of each face.  The vertex table is added once
+        and the faces refer to it, all in a single call each.
+
+        entity.color                    256
+        entity.dxftype                  u'POLYFACE'
+        entity.flags                    64
+        entity.handle                   u'3B7'
+        entity.layer                    u'STOPE_SHELLS'
+        entity.mcount                   1202        (number of vertices)
+        entity.ncount                   2400        (number of faces)
+        entity.vertices                 [<dxfgrabber.dxfentities.Vertex object at 0x7f04e2d8a6d0>, ...]
+        entity.vertices[0].flags        192         (vertex)
+        entity.vertices[0].location     (651402.96, 4767534.87, -91.45)
+        entity.vertices[1202].flags     128         (face record)
+        entity.vertices[1202].vtx       (1, 2, -3, 0)
+    """
+    points, faces = meshArrays(entity)
+
+    # Face records list 3 or 4 vertices, and 0 past the last one.  Negative
+    # indices only hide the edge they start, which filled faces do not draw.
+    indices = numpy.abs(faces)
+    corners = indices != 0
+    sizes = corners.sum(axis=1)
+    valid = (sizes >= 3) & (indices.max(axis=1) <= len(points))
+    if not valid.all():
+        warning_message('POLYFACE entity {0} has {1} invalid faces'.format(entity.handle, len(faces) - valid.sum()))
+        corners &= valid[:, None]
+    if not valid.any():
+        return False
+
+    firstId = builder.insertPointArray(points)
+    builder.insertPolys(sizes[valid].astype(ID_TYPE), indices[corners].astype(ID_TYPE) + (firstId - 1))
+
+
+def handlePolyMesh(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.PolyMesh, a POLYLINE with flag 16 whose
+        VERTEX entities are an mcount by ncount grid of vertices, row
+        after row, possibly closed in either direction.  The grid is added
+        once and its quads refer to it, all in a single call each.
+
+        entity.color                    256
+        entity.dxftype                  u'POLYMESH'
+        entity.flags                    16
+        entity.handle                   u'4C2'
+        entity.is_mclosed               False
+        entity.is_nclosed               True
+        entity.layer                    u'RAISE_BORE'
+        entity.mcount                   12
+        entity.ncount                   24
+        entity.vertices                 [<dxfgrabber.dxfentities.Vertex object at 0x7f04e2d8a6d0>, ...]
+    """
+    points, _ = meshArrays(entity)
+    m, n = entity.mcount, entity.ncount
+    rows = m - 1 + int(bool(entity.is_mclosed) and m > 2)
+    columns = n - 1 + int(bool(entity.is_nclosed) and n > 2)
+    if m * n != len(points) or rows < 1 or columns < 1:
+        msg = 'POLYMESH entity {0} has {1} vertices for a {2} by {3} mesh'.format(entity.handle, len(points), m, n)
+        warning_message(msg)
+        return False
+
+    row, column = numpy.mgrid[0:rows, 0:columns]
+    row, column = row.ravel(), column.ravel()
+    nextRow, nextColumn = (row + 1) % m, (column + 1) % n
+    firstId = builder.insertPointArray(points)
+    connectivity = numpy.column_stack([row * n + column, row * n + nextColumn,
+                                       nextRow * n + nextColumn, nextRow * n + column]).ravel()
+    builder.insertPolys(numpy.full(len(row), 4, dtype=ID_TYPE), connectivity.astype(ID_TYPE) + firstId)
+
+
+def handlePoint(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Point
+
+        entity.color                    9
+        entity.dxftype                  u'POINT'
+        entity.extrusion                (0.0, 0.0, 1.0)
+        entity.handle
+        entity.invisible                0
+        entity.layer                    u'59'
+        entity.layout_tab_name
+        entity.line_weight              0
+        entity.linetype
+        entity.ltscale                  1.0
+        entity.owner
+        entity.paperspace
+        entity.point                    (650363.328, 4766466.109, 55.534)
+        entity.set_default_extrusion    <bound method ... >
+        entity.setup_attributes         <bound method ... >
+        entity.shadow_mode
+        entity.thickness                0.0
+        entity.transparency
+        entity.true_color
+    """
+    idx = builder.insertPoints([entity.point])
+    builder.insertVertex(idx)
+
+
+def handleSeqend(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.DXFEntity
+
+        -2 APP: name of entity that began the sequence. This entity marks the
+        end of vertex (vertex type name) for a polyline, or the end of
+        attribute entities (attrib type name) for an insert entity that has
+        attributes (indicated by 66 group present and nonzero in insert
+        entity).This code is not saved in a DXF file
+
+        entity.color              256
+        entity.dxftype            u'SEQEND'
+        entity.extrusion
+        entity.handle             u'5CE'
+        entity.invisible          0
+        entity.layer              u'PLOTS_APEX LEVEL_02 GENERAL ANNOTATIONS'
+        entity.layout_tab_name
+        entity.line_weight        0
+        entity.linetype
+        entity.ltscale            1.0
+        entity.owner              u'C6'
+        entity.paperspace
+        entity.shadow_mode
+        entity.thickness          0.0
+        entity.transparency
+        entity.true_color
+    """
+    pass
+
+
+def handleInsert(entity, builder=None):
+    """
+        dxfgrabber.dxfentities.Insert
+
+        entity.attribs            []
+        entity.attribsfollow      False
+        entity.col_count          1
+        entity.col_spacing        0.0
+        entity.color              7
+        entity.dxftype            u'INSERT'
+        entity.extrusion          (0.0, 0.0, 1.0)
+        entity.find_attrib        <bound method ... >
+        entity.handle             u'C6'
+        entity.insert             (651402.9634957444, 4767534.874156112, -91.44930179)
+        entity.invisible          0
+        entity.layer              u'PLOTS_APEX LEVEL_02 GENERAL ANNOTATIONS'
+        entity.layout_tab_name
+        entity.line_weight        0
+        entity.linetype
+        entity.ltscale            1.0
+        entity.name               u'OT_TLZ'
+        entity.owner              u'347'
+        entity.paperspace
+        entity.rotation           -4.9999999999999885
+        entity.row_count          1
+        entity.row_spacing        0.0
+        entity.scale              (1.0, 1.0, 1.0)
+        entity.shadow_mode
+        entity.thickness          0.0
+        entity.transparency
+        entity.true_color
+    """
+    position = tuple(entity.insert) + (0.0,) * (3 - len(entity.insert))
+    return BlockReference(entity.name, position, entity.rotation or 0.0, tuple(entity.scale),
+                          max(1, entity.row_count), max(1, entity.col_count),
+                          entity.row_spacing or 0.0, entity.col_spacing or 0.0)
+
+
+# register some default handlers
+registerHandler('POLYLINE', handlePolyLine)
+registerHandler('LWPOLYLINE', handleLWPolyLine)
+registerHandler('LINE', handleLine)
+registerHandler('3DFACE', handle3DFace)
+registerHandler('POLYFACE', handlePolyFace)
+registerHandler('POLYMESH', handlePolyMesh)
+# registerHandler('POINT', handlePoint)
+
+registerHandler('MTEXT', handleMText)
+registerHandler('TEXT', handleText)
+registerHandler('SEQEND', handleSeqend)
+registerHandler('INSERT', handleInsert)
+
+
+#------------------------------------------------------------------------------
+# Streaming DXF parser.  Walks the ENTITIES section group code by group code
+# and yields one lightweight entity at a time, with the same attribute names
+# as the dxfgrabber entities the handlers were written against.  Only the
+# current entity is held in memory, the rest of the document never is.
+#------------------------------------------------------------------------------
+class DXFStreamError(Exception):
+    pass
+
+
+class StreamedEntity(object):
+    """Lightweight stand-in for a dxfgrabber entity"""
+    def __init__(self, dxftype):
+        self.dxftype = dxftype
+        self.handle = None
+        self.owner = None
+        self.layer = '0'
+        self.linetype = None
+        self.color = 256
+        self.paperspace = None
+
+
+def _detectEncoding(filename):
+    """Text encoding of an ascii DXF file, from its HEADER section"""
+    version = 'AC1009'
+    codepage = 'ANSI_1252'
+    with io.open(filename, encoding='latin-1') as fp:
+        if fp.read(22).startswith('AutoCAD Binary DXF'):
+            raise DXFStreamError('{0} is a binary DXF file'.format(filename))
+        fp.seek(0)
+
+        tags = _iterTags(fp)
+        for code, value in tags:
+            if code == 0 and value == 'SECTION':
+                # Files without a HEADER section use the defaults
+                code, value = next(tags)
+                if code == 2 and value != 'HEADER':
+                    break
+            elif code == 9 and value == '$ACADVER':
+                version = next(tags)[1]
+            elif code == 9 and value == '$DWGCODEPAGE':
+                codepage = next(tags)[1]
+            elif code == 0 and value == 'ENDSEC':
+                break
+
+    if version >= 'AC1021':
+        return 'utf-8'
+    return 'cp{0}'.format(codepage.split('_')[-1]) if codepage[-3:].isdigit() else 'cp1252'
+
+
+def _iterTags(fp):
+    lines = iter(fp)
+    for line in lines:
+        try:
+            code = int(line)
+            value = next(lines).rstrip('\r\n')
+        except (ValueError, StopIteration):
+            raise DXFStreamError('Invalid group code "{0}"'.format(line.strip()))
+        yield code, value
+
+
+def _iterEntityTags(tags):
+    """
+        Group the tags of an ENTITIES section by entity, yields the entity type
+        and its tags, without application data, extended data or comments.
+    """
+    dxftype = None
+    entityTags = []
+    inAppData = False
+
+    for code, value in tags:
+        if code == 0:
+            if dxftype is not None:
+                yield dxftype, entityTags
+            if value == 'ENDSEC':
+                return
+            dxftype = value
+            entityTags = []
+            inAppData = False
+        elif code == 102:
+            inAppData = value.startswith('{')
+        elif code < 999 and not inAppData:
+            entityTags.append((code, value))
+
+    if dxftype is not None:
+        yield dxftype, entityTags
+
+
+def _decodeCommon(entity, code, value):
+    if code == 5:
+        entity.handle = value
+    elif code == 8:
+        entity.layer = value
+    elif code == 62:
+        entity.color = int(value)
+    elif code == 6:
+        entity.linetype = value
+    elif code == 330:
+        entity.owner = value
+    elif code == 67:
+        entity.paperspace = int(value)
+
+
+def _decodePoint3d(point):
+    """Complete a [x, y, z] list filled from 10/20/30 style group codes"""
+    return (point[0], point[1], point[2] if point[2] is not None else 0.0)
+
+
+def _decodeEntity(dxftype, tags):
+    entity = StreamedEntity(dxftype)
+    decoder = _entityDecoders.get(dxftype)
+    try:
+        if decoder:
+            decoder(entity, tags)
+        else:
+            for code, value in tags:
+                _decodeCommon(entity, code, value)
+    except ValueError as err:
+        raise DXFStreamError('Invalid {0} entity: {1}'.format(dxftype, err))
+    return entity
+
+
+def _decodeLine(entity, tags):
+    start = [0.0, 0.0, None]
+    end = [0.0, 0.0, None]
+    for code, value in tags:
+        if code in (10, 20, 30):
+            start[code // 10 - 1] = float(value)
+        elif code in (11, 21, 31):
+            end[code // 10 - 1] = float(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.start = _decodePoint3d(start)
+    entity.end = _decodePoint3d(end)
+
+
+def _decodePoint(entity, tags):
+    point = [0.0, 0.0, None]
+    for code, value in tags:
+        if code in (10, 20, 30):
+            point[code // 10 - 1] = float(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.point = _decodePoint3d(point)
+
+
+def _decodeLWPolyLine(entity, tags):
+    xs = []
+    ys = []
+    entity.elevation = 0.0
+    entity.flags = 0
+    for code, value in tags:
+        if code == 10:
+            xs.append(float(value))
+        elif code == 20:
+            ys.append(float(value))
+        elif code == 38:
+            entity.elevation = float(value)
+        elif code == 70:
+            entity.flags = int(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.points = list(zip(xs, ys))
+    entity.is_closed = bool(entity.flags & 1)
+
+
+def _decode3DFace(entity, tags):
+    corners = [[0.0, 0.0, None] for _ in range(4)]
+    entity.invisible_edge = 0
+    for code, value in tags:
+        if 10 <= code <= 33 and code % 10 <= 3:
+            corners[code % 10][code // 10 - 1] = float(value)
+        elif code == 70:
+            entity.invisible_edge = int(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.points = [_decodePoint3d(corner) for corner in corners]
+
+
+def _decodePolyLine(entity, tags):
+    elevation = [0.0, 0.0, None]
+    entity.flags = 0
+    entity.mcount = 0
+    entity.ncount = 0
+    for code, value in tags:
+        if code in (10, 20, 30):
+            elevation[code // 10 - 1] = float(value)
+        elif code == 70:
+            entity.flags = int(value)
+        elif code == 71:
+            entity.mcount = int(value)
+        elif code == 72:
+            entity.ncount = int(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.elevation = _decodePoint3d(elevation)
+    entity.is_closed = bool(entity.flags & 1)
+    entity.vertices = []
+    entity.points = []
+    if entity.flags & 80:
+        # Meshes can have millions of vertices, which are kept as flat
+        # arrays of coordinates and face vertex indices instead of objects
+        entity.meshPoints = array.array('d')
+        entity.meshFaces = array.array('i')
+
+
+def _decodeMeshVertex(polyline, tags):
+    """
+        Add a VERTEX of a polyface or polygon mesh POLYLINE to its meshPoints,
+        or for a polyface face record, its four vertex indices to meshFaces.
+        Indices count from 1, are negative before an invisible edge and 0
+        past the last vertex of a face.
+    """
+    location = [0.0, 0.0, polyline.elevation[2]]
+    indices = [0, 0, 0, 0]
+    flags = 0
+    try:
+        for code, value in tags:
+            if code in (10, 20, 30):
+                location[code // 10 - 1] = float(value)
+            elif 71 <= code <= 74:
+                indices[code - 71] = int(value)
+            elif code == 70:
+                flags = int(value)
+    except ValueError as err:
+        raise DXFStreamError('Invalid VERTEX entity: {0}'.format(err))
+
+    if flags & 128 and not flags & 64:
+        polyline.meshFaces.extend(indices)
+    elif not flags & 16:
+        # Skip the control points of smoothed meshes
+        polyline.meshPoints.extend(location)
+
+
+def _decodeVertex(entity, tags):
+    location = [0.0, 0.0, None]
+    entity.flags = 0
+    for code, value in tags:
+        if code in (10, 20, 30):
+            location[code // 10 - 1] = float(value)
+        elif code == 70:
+            entity.flags = int(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.location = location
+
+
+def _finishPolyLine(polyline):
+    """
+        Resolve the vertices collected for a POLYLINE, like dxfgrabber polyface
+        and polygon meshes are reported as POLYFACE and POLYMESH entities.
+    """
+    if polyline.flags & 64:
+        polyline.dxftype = 'POLYFACE'
+        polyline.is_mclosed = False
+        polyline.is_nclosed = False
+    elif polyline.flags & 16:
+        polyline.is_mclosed = bool(polyline.flags & 1)
+        polyline.is_nclosed = bool(polyline.flags & 32)
+        polyline.dxftype = 'POLYMESH'
+    else:
+        z = polyline.elevation[2]
+        for vertex in polyline.vertices:
+            # Skip spline frame control points
+            if not vertex.flags & 16:
+                location = vertex.location
+                polyline.points.append((location[0], location[1], location[2] if location[2] is not None else z))
+    return polyline
+
+
+def _decodeText(entity, tags):
+    insert = [0.0, 0.0, None]
+    align = None
+    entity.text = ''
+    entity.height = 1.0
+    entity.rotation = 0.0
+    entity.halign = 0
+    entity.valign = 0
+    entity.style = 'STANDARD'
+    for code, value in tags:
+        if code in (10, 20, 30):
+            insert[code // 10 - 1] = float(value)
+        elif code in (11, 21, 31):
+            align = align or [0.0, 0.0, None]
+            align[code // 10 - 1] = float(value)
+        elif code == 1:
+            entity.text = value
+        elif code == 40:
+            entity.height = float(value)
+        elif code == 50:
+            entity.rotation = float(value)
+        elif code == 72:
+            entity.halign = int(value)
+        elif code == 73:
+            entity.valign = int(value)
+        elif code == 7:
+            entity.style = value
+        else:
+            _decodeCommon(entity, code, value)
+    entity.insert = _decodePoint3d(insert)
+    entity.align_point = _decodePoint3d(align) if align else None
+
+
+def _decodeMText(entity, tags):
+    insert = [0.0, 0.0, None]
+    xdirection = None
+    rotation = 0.0
+    text = ''
+    lines = []
+    entity.height = 0.0
+    entity.attachment_point = 1
+    entity.rect_width = None
+    entity.style = 'STANDARD'
+    for code, value in tags:
+        if code in (10, 20, 30):
+            insert[code // 10 - 1] = float(value)
+        elif code in (11, 21, 31):
+            xdirection = xdirection or [1.0, 0.0, 0.0]
+            xdirection[code // 10 - 1] = float(value)
+        elif code == 1:
+            text = value
+        elif code == 3:
+            lines.append(value)
+        elif code == 40:
+            entity.height = float(value)
+        elif code == 41:
+            entity.rect_width = float(value)
+        elif code == 50:
+            rotation = float(value)
+        elif code == 71:
+            entity.attachment_point = int(value)
+        elif code == 7:
+            entity.style = value
+        else:
+            _decodeCommon(entity, code, value)
+
+    lines.append(text)
+    entity.raw_text = ''.join(lines)
+    entity.insert = _decodePoint3d(insert)
+    if xdirection is None:
+        angle = math.radians(rotation)
+        xdirection = [math.cos(angle), math.sin(angle), 0.0]
+    length = math.sqrt(sum([c * c for c in xdirection]))
+    entity.xdirection = tuple([c / length for c in xdirection])
+
+
+def _decodeInsert(entity, tags):
+    insert = [0.0, 0.0, None]
+    scale = [1.0, 1.0, 1.0]
+    entity.name = ''
+    entity.rotation = 0.0
+    entity.row_count = 1
+    entity.row_spacing = 0.0
+    entity.col_count = 1
+    entity.col_spacing = 0.0
+    entity.attribsfollow = False
+    entity.attribs = []
+    for code, value in tags:
+        if code in (10, 20, 30):
+            insert[code // 10 - 1] = float(value)
+        elif code == 2:
+            entity.name = value
+        elif code in (41, 42, 43):
+            scale[code - 41] = float(value)
+        elif code == 44:
+            entity.col_spacing = float(value)
+        elif code == 45:
+            entity.row_spacing = float(value)
+        elif code == 50:
+            entity.rotation = float(value)
+        elif code == 66:
+            entity.attribsfollow = bool(int(value))
+        elif code == 70:
+            entity.col_count = int(value)
+        elif code == 71:
+            entity.row_count = int(value)
+        else:
+            _decodeCommon(entity, code, value)
+    entity.insert = _decodePoint3d(insert)
+    entity.scale = tuple(scale)
+
+
+_entityDecoders = {
+    'LINE': _decodeLine,
+    'POINT': _decodePoint,
+    'LWPOLYLINE': _decodeLWPolyLine,
+    'POLYLINE': _decodePolyLine,
+    'VERTEX': _decodeVertex,
+    '3DFACE': _decode3DFace,
+    'TEXT': _decodeText,
+    'MTEXT': _decodeMText,
+    'INSERT': _decodeInsert,
+}
+
+
+def _foldEntities(groups, statistics=None):
+    """
+        Decode the entities of the (type, tags) groups of _iterEntityTags(),
+        folding VERTEX and ATTRIB sequences into their POLYLINE or INSERT.
+    """
+    owner = None
+    for dxftype, entityTags in groups:
+        if owner is not None:
+            if dxftype == 'SEQEND':
+                if owner.dxftype == 'POLYLINE':
+                    _finishPolyLine(owner)
+                yield owner
+                owner = None
+                continue
+            elif dxftype == 'VERTEX' and owner.dxftype == 'POLYLINE':
+                if owner.flags & 80:
+                    _decodeMeshVertex(owner, entityTags)
+                else:
+                    owner.vertices.append(_decodeEntity(dxftype, entityTags))
+                continue
+            elif dxftype == 'ATTRIB':
+                continue
+            else:
+                warning_message('Missing SEQEND after {0} {1}'.format(owner.dxftype, owner.handle))
+                if statistics is not None:
+                    statistics.addEvent('missingSeqend')
+                if owner.dxftype == 'POLYLINE':
+                    _finishPolyLine(owner)
+                yield owner
+                owner = None
+
+        entity = _decodeEntity(dxftype, entityTags)
+        if dxftype == 'POLYLINE' or (dxftype == 'INSERT' and entity.attribsfollow):
+            owner = entity
+        else:
+            yield entity
+
+    if owner is not None:
+        if owner.dxftype == 'POLYLINE':
+            _finishPolyLine(owner)
+        yield owner
+
+
+def _iterRangeLines(filename, encoding, ranges):
+    """Yields the decoded lines within the sorted [start, end) byte ranges of a file"""
+    with open(filename, 'rb') as fp:
+        for start, end in ranges:
+            fp.seek(start)
+            remaining = end - start
+            pending = b''
+            while remaining > 0:
+                chunk = fp.read(min(remaining, SCAN_CHUNK_SIZE))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                # Decode whole lines only, a newline is never part of a
+                # multi-byte character in the encodings of DXF files
+                data = pending + chunk
+                cut = data.rfind(b'\n') + 1
+                pending = data[cut:]
+                for line in data[:cut].decode(encoding, 'replace').split('\n')[:-1]:
+                    yield line
+            if pending:
+                yield pending.decode(encoding, 'replace')
+
+
+def iterDXFEntities(filename, statistics=None, ranges=None):
+    """
+        Yields the entities of the ENTITIES section of an ascii DXF file one at
+        a time.  VERTEX and ATTRIB sequences are folded into their POLYLINE or
+        INSERT, as dxfgrabber does.  Raises DXFStreamError on files this
+        parser cannot walk, callers may then fall back to dxfgrabber.
+        Missing SEQENDs are counted in the statistics, if given.  With
+        sorted byte ranges of whole entities, as listed by scanDXFLayers(),
+        only the entities within them are read.
+    """
+    for entity in _foldEntities(_iterDXFEntityTags(filename, ranges), statistics):
+        yield entity
+
+
+def _iterDXFEntityTags(filename, ranges=None):
+    """The (type, tags) of the entities of the ENTITIES section, or within ranges, see iterDXFEntities()"""
+    encoding = _detectEncoding(filename)
+
+    if ranges is not None:
+        for group in _iterEntityTags(_iterTags(_iterRangeLines(filename, encoding, ranges))):
+            yield group
+        return
+
+    with io.open(filename, encoding=encoding, errors='replace') as fp:
+        tags = _iterTags(fp)
+        for code, value in tags:
+            if code == 0 and value == 'SECTION':
+                code, value = next(tags)
+                if code == 2 and value == 'ENTITIES':
+                    break
+        else:
+            return
+
+        for group in _iterEntityTags(tags):
+            yield group
+
+
+def _iterEntityGroups(groups):
+    """
+        Gather the (type, tags) of _iterEntityTags() by entity, with the
+        VERTEX, ATTRIB and SEQEND following a POLYLINE or INSERT.  Yields
+        lists of (type, tags), which _foldEntities() decodes.
+    """
+    group = None
+    for dxftype, tags in groups:
+        if group is not None and dxftype in ('VERTEX', 'ATTRIB', 'SEQEND'):
+            group.append((dxftype, tags))
+            continue
+        if group is not None:
+            yield group
+        group = [(dxftype, tags)]
+
+    if group is not None:
+        yield group
+
+
+def entityKey(data):
+    """
+        The handle of an entity, from the raw bytes of its tags, as an
+        integer, -1 without a valid one, and a 64 bit hash of those bytes,
+        which changes with anything in the entity
+    """
+    handle = -1
+    lines = data[:ENTITY_KEY_SCAN_SIZE].split(b'\n')
+    for i in range(2, len(lines) - 1, 2):
+        code = lines[i].strip()
+        if code == b'5':
+            try:
+                handle = int(lines[i + 1].strip(), 16)
+            except ValueError:
+                pass
+            if not 0 <= handle < 1 << 63:
+                handle = -1
+            break
+        elif code == b'0':
+            break
+    return handle, struct.unpack('<q', hashlib.sha1(data).digest()[:8])[0]
+
+
+def iterEntityKeys(filename, starts, ends):
+    """Yields the entityKey() of the bytes of a file between each of starts and ends, in order"""
+    with open(filename, 'rb') as fp:
+        data = b''
+        offset = 0
+        for start, end in zip(starts, ends):
+            if start < offset or end > offset + len(data):
+                fp.seek(start)
+                data = fp.read(max(end - start, SCAN_CHUNK_SIZE))
+                offset = start
+            yield entityKey(data[start - offset:end - offset])
+
+
+# A block definition of the BLOCKS section, its entities are in block
+# coordinates, placed by INSERT entities relative to the base point
+DXFBlock = collections.namedtuple('DXFBlock', ['name', 'basePoint', 'entities'])
+
+
+def readDXFBlocks(filename):
+    """
+        Reads the block definitions of the BLOCKS section of an ascii DXF
+        file, returns a dict of block name to DXFBlock.  Raises
+        DXFStreamError like iterDXFEntities().
+    """
+    encoding = _detectEncoding(filename)
+    blocks = {}
+
+    with io.open(filename, encoding=encoding, errors='replace') as fp:
+        tags = _iterTags(fp)
+        for code, value in tags:
+            if code == 0 and value == 'SECTION':
+                code, value = next(tags)
+                if code == 2 and value == 'BLOCKS':
+                    break
+                elif code == 2 and value == 'ENTITIES':
+                    return blocks
+        else:
+            return blocks
+
+        block = None
+        for dxftype, entityTags in _iterEntityTags(tags):
+            if dxftype == 'BLOCK':
+                basePoint = [0.0, 0.0, 0.0]
+                name = ''
+                for code, value in entityTags:
+                    if code in (10, 20, 30):
+                        basePoint[code // 10 - 1] = float(value)
+                    elif code == 2:
+                        name = value
+                block = (name, tuple(basePoint), [])
+            elif dxftype == 'ENDBLK':
+                if block is not None:
+                    name, basePoint, groups = block
+                    blocks[name] = DXFBlock(name, basePoint, list(_foldEntities(groups)))
+                block = None
+            elif block is not None:
+                block[2].append((dxftype, entityTags))
+
+    return blocks
+
+
+def _scanCodes(buf, codeStarts, codeEnds, code):
+    """Mask of the code lines, given as [start, end) offsets in buf, holding the single digit code"""
+    last = codeEnds - 1
+    last -= buf[last] == 13
+    return (buf[last] == ord(str(code))) & ((last == codeStarts) | (buf[last - 1] == 32))
+
+
+def _iterScanChunks(fp):
+    """
+        Yields the tags of a DXF file in large chunks, as (data, offset,
+        buf, codeStarts, codeEnds, valueStarts, valueEnds, zeros, entities,
+        cut): the bytes of the chunk and their offset in the file, the
+        same bytes as a padded numpy array, the [start, end) offsets in
+        data of the code and value line of each tag, the indexes of its 0
+        tags, of those which do not start a VERTEX, SEQEND or ATTRIB, and
+        the number of tags of the chunk.  A chunk always ends before a 0
+        tag, but at the end of the file, so entities are never split.
+    """
+    subEntities = numpy.array([[ord(c) for c in prefix] for prefix in ('VERT', 'SEQE', 'ATTR')], dtype=numpy.uint8)
+    offset = 0
+    pending = b''
+    while True:
+        chunk = fp.read(SCAN_CHUNK_SIZE)
+        data = pending + chunk
+        if not data:
+            return
+        buf = numpy.frombuffer(data + b'\0\0\0\0', dtype=numpy.uint8)
+        ends = numpy.flatnonzero(buf == 10)
+        ends = ends[:len(ends) - len(ends) % 2]
+        starts = numpy.concatenate([[0], ends[:-1] + 1]).astype(ends.dtype)
+        codeStarts, codeEnds = starts[0::2], ends[0::2]
+        valueStarts, valueEnds = starts[1::2], ends[1::2]
+        zeros = numpy.flatnonzero(_scanCodes(buf, codeStarts, codeEnds, 0))
+        if chunk:
+            # The last 0 tag goes with the next chunk, along with the tags
+            # of its entity
+            if len(zeros) < 2:
+                pending = data
+                continue
+            cut = zeros[-1]
+            zeros = zeros[:-1]
+        else:
+            cut = len(codeStarts)
+        prefixes = buf[valueStarts[zeros][:, None] + numpy.arange(4)]
+        isSub = (prefixes[:, None, :] == subEntities[None, :, :]).all(axis=2).any(axis=1)
+
+        yield data, offset, buf, codeStarts, codeEnds, valueStarts, valueEnds, zeros, zeros[~isSub], cut
+
+        if not chunk:
+            return
+        pending = data[codeStarts[cut]:]
+        offset += int(codeStarts[cut])
+
+
+def _iterScanEntities(fp):
+    """
+        Yields (value, name, layer, position) for the 0 tags of a DXF file
+        which do not start a VERTEX, SEQEND or ATTRIB, where name is the
+        value of the tag following it if its code is 2, layer the value of
+        the first 8 tag before the next 0 tag and position the byte offset
+        of the tag.  Values are stripped bytes.  Lines and codes are found
+        with numpy in large chunks, only these tags go through Python.
+    """
+    for data, offset, buf, codeStarts, codeEnds, valueStarts, valueEnds, zeros, entities, cut in _iterScanChunks(fp):
+        eights = numpy.flatnonzero(_scanCodes(buf, codeStarts[:cut], codeEnds[:cut], 8))
+        nextZero = numpy.append(zeros, cut)[numpy.searchsorted(zeros, entities, 'right')]
+        firstEight = numpy.append(eights, cut)[numpy.searchsorted(eights, entities)]
+        hasLayer = firstEight < nextZero
+        hasName = numpy.zeros(len(entities), dtype=bool)
+        following = entities + 1 < cut
+        hasName[following] = _scanCodes(buf, codeStarts[entities[following] + 1], codeEnds[entities[following] + 1], 2)
+        for i, k in enumerate(entities):
+            value = data[valueStarts[k]:valueEnds[k]].strip()
+            name = data[valueStarts[k + 1]:valueEnds[k + 1]].strip() if hasName[i] else None
+            e = firstEight[i]
+            layer = data[valueStarts[e]:valueEnds[e]].strip() if hasLayer[i] else None
+            yield value, name, layer, offset + int(codeStarts[k])
+
+
+def scanDXFEntityOffsets(filename):
+    """
+        The byte offsets of the entities of the ENTITIES section of an ascii
+        DXF file, VERTEX, SEQEND and ATTRIB entities being part of their
+        POLYLINE or INSERT, followed by the offset of the end of the
+        section, as an array.  Only the SECTION and ENDSEC tags go through
+        Python, the entities are found with numpy.
+    """
+    sections = numpy.array([[ord(c) for c in prefix] for prefix in ('SECT', 'ENDS')], dtype=numpy.uint8)
+    offsets = []
+    inEntities = False
+
+    with open(filename, 'rb') as fp:
+        for data, offset, buf, codeStarts, _, valueStarts, valueEnds, _, entities, cut in _iterScanChunks(fp):
+            prefixes = buf[valueStarts[entities][:, None] + numpy.arange(4)]
+            markers = numpy.flatnonzero((prefixes[:, None, :] == sections[None, :, :]).all(axis=2).any(axis=1))
+            positions = offset + codeStarts[entities].astype(numpy.int64)
+            first = 0
+            for m in markers:
+                k = entities[m]
+                value = data[valueStarts[k]:valueEnds[k]].strip()
+                if value == b'SECTION':
+                    if inEntities:
+                        offsets.append(positions[first:m])
+                    inEntities = k + 1 < cut and data[valueStarts[k + 1]:valueEnds[k + 1]].strip() == b'ENTITIES'
+                    first = m + 1
+                elif value == b'ENDSEC' and inEntities:
+                    offsets.append(positions[first:m + 1])
+                    return numpy.concatenate(offsets)
+            if inEntities:
+                offsets.append(positions[first:])
+
+    offsets.append(numpy.array([os.path.getsize(filename)], dtype=numpy.int64))
+    return numpy.concatenate(offsets)
+
+
+def splitRanges(ranges, offsets, parts):
+    """
+        Split sorted [start, end) byte ranges into up to parts lists of
+        ranges of about the same total size, cutting them only at the given
+        sorted offsets, e.g. the entity offsets of scanDXFEntityOffsets().
+        Parts are in file order, and smaller than PARALLEL_PART_SIZE only
+        when there is a single one.
+    """
+    total = sum([end - start for start, end in ranges])
+    parts = max(1, min(parts, total // PARALLEL_PART_SIZE))
+    if parts == 1:
+        return [list(ranges)] if ranges else []
+
+    targets = [total * (i + 1) // parts for i in range(parts - 1)]
+    split = [[]]
+    covered = 0
+    for start, end in ranges:
+        while targets and covered + end - start > targets[0]:
+            # Cut at the first offset past the target, if within this range
+            i = numpy.searchsorted(offsets, start + targets.pop(0) - covered)
+            cut = int(offsets[i]) if i < len(offsets) else end
+            if start < cut < end:
+                split[-1].append([start, cut])
+                covered += cut - start
+                start = cut
+            if split[-1]:
+                split.append([])
+        split[-1].append([start, end])
+        covered += end - start
+
+    return [part for part in split if part]
+
+
+def scanDXFLayers(filename):
+    """
+        Index the ENTITIES section of an ascii DXF file by layer, without
+        decoding the entities.  Returns an ordered dict mapping each layer
+        name to its number of entities and the [start, end) byte ranges of
+        its runs of consecutive entities.  VERTEX, SEQEND and ATTRIB
+        entities are part of the range of their POLYLINE or INSERT.
+    """
+    encoding = _detectEncoding(filename)
+    layers = collections.OrderedDict()
+
+    def addEntity(layer, start, end):
+        name = (layer or b'0').decode(encoding, 'replace')
+        entry = layers.get(name)
+        if entry is None:
+            entry = layers[name] = { 'count': 0, 'ranges': [] }
+        entry['count'] += 1
+        if entry['ranges'] and entry['ranges'][-1][1] == start:
+            entry['ranges'][-1][1] = end
+        else:
+            entry['ranges'].append([start, end])
+
+    with open(filename, 'rb') as fp:
+        inEntities = False
+        start = layer = None
+        for value, name, entityLayer, position in _iterScanEntities(fp):
+            if value == b'SECTION':
+                inEntities = name == b'ENTITIES'
+            elif inEntities:
+                if start is not None:
+                    addEntity(layer, start, position)
+                start = layer = None
+                if value == b'ENDSEC':
+                    break
+                start, layer = position, entityLayer
+
+        if start is not None:
+            addEntity(layer, start, os.path.getsize(filename))
+
+    return layers
+
+
+def selectLayers(layerNames, include=None, exclude=None):
+    """
+        The layer names matching any of the include patterns (all of them
+        without patterns) and none of the exclude patterns.  Patterns are
+        shell-style wildcards, matched ignoring case like DXF layer names.
+    """
+    include = [p.upper() for p in include or []]
+    exclude = [p.upper() for p in exclude or []]
+    selected = []
+    for name in layerNames:
+        upper = name.upper()
+        if include and not any([fnmatch.fnmatchcase(upper, p) for p in include]):
+            continue
+        if any([fnmatch.fnmatchcase(upper, p) for p in exclude]):
+            continue
+        selected.append(name)
+    return selected
+
+
+def splitLayerPatterns(patterns):
+    """List of the ';' separated layer name patterns of a string, None if there are none"""
+    patterns = [p.strip() for p in (patterns or '').split(';') if p.strip()]
+    return patterns or None
+
+
+def layerRanges(layerIndex, names):
+    """The sorted byte ranges of the entities of some layers of scanDXFLayers(), adjacent ranges merged"""
+    ranges = []
+    for start, end in sorted([r for name in names for r in layerIndex[name]['ranges']]):
+        if ranges and ranges[-1][1] == start:
+            ranges[-1][1] = end
+        else:
+            ranges.append([start, end])
+    return ranges
+
+
+#------------------------------------------------------------------------------
+# Some helper methods
+#------------------------------------------------------------------------------
+def createPolyData(entityColor, origin=None):
+    polyData = vtkPolyData()
+    polyData.SetPoints(vtkPoints())
+    polyData.SetVerts(vtkCellArray())
+    polyData.SetLines(vtkCellArray())
+    polyData.SetPolys(vtkCellArray())
+    polyData.SetStrips(vtkCellArray())
+
+    if entityColor is not None:
+        shortValue = vtkShortArray()
+        shortValue.SetNumberOfComponents(1)
+        shortValue.SetName("EntityColor")
+        shortValue.InsertNextValue(entityColor)
+        polyData.GetFieldData().AddArray(shortValue)
+
+    if origin is not None:
+        originValue = vtkDoubleArray()
+        originValue.SetNumberOfComponents(3)
+        originValue.SetName("Origin")
+        originValue.InsertNextTuple3(*origin)
+        polyData.GetFieldData().AddArray(originValue)
+
+    return polyData
+
+
+def addArrays(fieldData, arrays):
+    """Add numpy arrays, by name, to a vtkFieldData, as vtkStringArrays for arrays of strings"""
+    for name, values in arrays.items():
+        if values.dtype.kind in 'SU':
+            array = vtkStringArray()
+            for value in values.tolist():
+                array.InsertNextValue(value)
+        else:
+            array = numpy_support.numpy_to_vtk(values, deep=1)
+        array.SetName(name)
+        fieldData.AddArray(array)
+
+
+def arraysToPolyData(points, cells, fieldData=None, pointData=None, cellData=None):
+    """Create a vtkPolyData from points and cells, as returned by appendBlocks(), and arrays by name"""
+    polyData = createPolyData(None)
+    if len(points):
+        polyData.GetPoints().SetData(numpy_support.numpy_to_vtk(points, deep=1))
+    polyData.SetVerts(createCellArray(*cells['verts']))
+    polyData.SetLines(createCellArray(*cells['lines']))
+    polyData.SetPolys(createCellArray(*cells['polys']))
+    polyData.SetStrips(createCellArray(*cells['strips']))
+    addArrays(polyData.GetFieldData(), fieldData or {})
+    addArrays(polyData.GetPointData(), pointData or {})
+    addArrays(polyData.GetCellData(), cellData or {})
+    return polyData
+
+
+def createCellArray(sizes, connectivity):
+    """
+        Build a vtkCellArray in one call from the number of points in each
+        cell and the flat connectivity.  Uses the offsets/connectivity layout
+        when available (VTK >= 9), and falls back to the legacy layout where
+        each cell is prefixed by its size.
+    """
+    cells = vtkCellArray()
+    numCells = len(sizes)
+    if numCells == 0:
+        return cells
+
+    offsets = numpy.zeros(numCells + 1, dtype=ID_TYPE)
+    numpy.cumsum(sizes, out=offsets[1:])
+    connectivity = numpy.asarray(connectivity, dtype=ID_TYPE)
+
+    if hasattr(cells, 'SetData'):
+        cells.SetData(numpy_support.numpy_to_vtkIdTypeArray(offsets, deep=1),
+                      numpy_support.numpy_to_vtkIdTypeArray(connectivity, deep=1))
+    else:
+        legacy = numpy.empty(numCells + len(connectivity), dtype=ID_TYPE)
+        sizeIdx = offsets[:-1] + numpy.arange(numCells, dtype=ID_TYPE)
+        isPointId = numpy.ones(len(legacy), dtype=bool)
+        isPointId[sizeIdx] = False
+        legacy[sizeIdx] = sizes
+        legacy[isPointId] = connectivity
+        cells.SetCells(numCells, numpy_support.numpy_to_vtkIdTypeArray(legacy, deep=1))
+
+    return cells
+
+
+def cellArrayToNumpy(cells):
+    """
+        Inverse of createCellArray(), returns (sizes, connectivity) arrays.
+    """
+    if cells.GetNumberOfCells() == 0:
+        return numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE)
+
+    if hasattr(cells, 'GetOffsetsArray'):
+        offsets = numpy_support.vtk_to_numpy(cells.GetOffsetsArray()).astype(ID_TYPE)
+        connectivity = numpy_support.vtk_to_numpy(cells.GetConnectivityArray()).astype(ID_TYPE)
+        return numpy.diff(offsets), connectivity
+
+    legacy = numpy_support.vtk_to_numpy(cells.GetData())
+    sizes = []
+    connectivity = []
+    idx = 0
+    while idx < len(legacy):
+        size = legacy[idx]
+        sizes.append(size)
+        connectivity.append(legacy[idx + 1:idx + 1 + size])
+        idx += size + 1
+    return numpy.array(sizes, dtype=ID_TYPE), numpy.concatenate(connectivity).astype(ID_TYPE)
+
+
+def polyDataToNumpy(polyData):
+    """
+        Returns the points of polyData as an (n, 3) double array, along with
+        a dict mapping 'verts', 'lines', 'polys' and 'strips' to the
+        (sizes, connectivity) of the non-empty cell arrays.
+    """
+    points = numpy.zeros((0, 3), dtype=numpy.float64)
+    if polyData.GetNumberOfPoints() > 0:
+        points = numpy_support.vtk_to_numpy(polyData.GetPoints().GetData()).astype(numpy.float64)
+
+    cells = {}
+    for name, cellArray in (('verts', polyData.GetVerts()), ('lines', polyData.GetLines()),
+                            ('polys', polyData.GetPolys()), ('strips', polyData.GetStrips())):
+        if cellArray and cellArray.GetNumberOfCells() > 0:
+            cells[name] = cellArrayToNumpy(cellArray)
+
+    return points, cells
+
+
+def placeGlyph(points, position, rotation=None):
+    """
+        Move glyph points from the origin to position, optionally rotating
+        them first by rotation degrees around the z axis.
+    """
+    if rotation:
+        angle = math.radians(rotation)
+        cos, sin = math.cos(angle), math.sin(angle)
+        rotated = points.copy()
+        rotated[:, 0] = cos * points[:, 0] - sin * points[:, 1]
+        rotated[:, 1] = sin * points[:, 0] + cos * points[:, 1]
+        points = rotated
+    return points + numpy.asarray(position, dtype=numpy.float64)
+
+
+def blockArrays(name, geometry):
+    """
+        The points, in single precision, cells and field data, with the
+        BlockName, of the blockGeometry() of a block
+    """
+    points, cells = geometry
+    return points.astype(numpy.float32), cells, collections.OrderedDict([('BlockName', numpy.array([name], dtype='U'))])
+
+
+def placeBlock(points, cells, reference):
+    """
+        Place the points and cells of a block, relative to its base point,
+        as a BlockReference says: scaled, rotated, repeated over its grid
+        of rows and columns and moved to its position.  Returns the points
+        and cells of all the copies.
+    """
+    angle = math.radians(reference.rotation or 0.0)
+    cos, sin = math.cos(angle), math.sin(angle)
+    rotation = numpy.array([[cos, sin, 0.0], [-sin, cos, 0.0], [0.0, 0.0, 1.0]])
+
+    rows, columns = numpy.mgrid[0:reference.rows, 0:reference.columns]
+    offsets = numpy.zeros((rows.size, 3))
+    offsets[:, 0] = columns.ravel() * reference.columnSpacing
+    offsets[:, 1] = rows.ravel() * reference.rowSpacing
+
+    local = (points * numpy.asarray(reference.scale, dtype=numpy.float64))[None, :, :] + offsets[:, None, :]
+    placed = local.reshape(-1, 3).dot(rotation) + numpy.asarray(reference.position, dtype=numpy.float64)
+
+    copies = len(offsets)
+    shifts = numpy.arange(copies, dtype=ID_TYPE) * len(points)
+    placedCells = {}
+    for name, (sizes, connectivity) in cells.items():
+        placedCells[name] = (numpy.tile(sizes, copies),
+                             (connectivity[None, :] + shifts[:, None]).ravel().astype(ID_TYPE, copy=False))
+    return placed, placedCells
+
+
+class CellBuffer(object):
+    """
+        Accumulates the cells of one type (verts, lines, ...) for a
+        PolyDataBuilder.  Handlers mostly add runs of consecutive point ids,
+        which are only expanded into connectivity when the block is built.
+    """
+    def __init__(self):
+        self._starts = []
+        self._sizes = []
+        self._closed = []
+        self._chunks = []
+        self.numberOfCells = 0
+
+    def insertRun(self, startId, numPoints, closed=False):
+        self._starts.append(startId)
+        self._sizes.append(numPoints)
+        self._closed.append(closed)
+        self.numberOfCells += 1
+        if len(self._starts) >= FLUSH_SIZE:
+            self._flushRuns()
+
+    def insertCells(self, sizes, connectivity):
+        self._flushRuns()
+        self._chunks.append((sizes, connectivity))
+        self.numberOfCells += len(sizes)
+
+    def _flushRuns(self):
+        if not self._starts:
+            return
+
+        starts = numpy.array(self._starts, dtype=ID_TYPE)
+        closed = numpy.array(self._closed, dtype=bool)
+        sizes = numpy.array(self._sizes, dtype=ID_TYPE) + closed
+
+        # Each cell walks from its first point id, closed cells then repeat it
+        ends = numpy.cumsum(sizes)
+        local = numpy.arange(ends[-1], dtype=ID_TYPE) - numpy.repeat(ends - sizes, sizes)
+        connectivity = local + numpy.repeat(starts, sizes)
+        connectivity[ends[closed] - 1] = starts[closed]
+
+        self._chunks.append((sizes, connectivity))
+        self._starts = []
+        self._sizes = []
+        self._closed = []
+
+    def toArrays(self):
+        """Returns the (sizes, connectivity) of all the cells, and clears the buffer"""
+        self._flushRuns()
+        if not self._chunks:
+            return numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE)
+
+        sizes = numpy.concatenate([c[0] for c in self._chunks])
+        connectivity = numpy.concatenate([c[1] for c in self._chunks])
+        self._chunks = []
+        return sizes, connectivity
+
+    def remapPoints(self, newIds):
+        """Replace every point id by newIds[id], after the points were welded"""
+        self._flushRuns()
+        self._chunks = [(sizes, newIds[connectivity]) for sizes, connectivity in self._chunks]
+
+    def countArrays(self):
+        """Returns the number of cells and the size of the connectivity toArrays() would return"""
+        self._flushRuns()
+        return sum([len(c[0]) for c in self._chunks]), sum([len(c[1]) for c in self._chunks])
+
+    def fillArrays(self, sizes, connectivity, idOffset=0):
+        """
+            Write the cells to the start of the preallocated sizes and
+            connectivity arrays, with point ids shifted by idOffset, instead
+            of returning them like toArrays().  Returns the number of cells
+            and point ids written, and clears the buffer.
+        """
+        self._flushRuns()
+        written = _fillCells(sizes, connectivity, self._chunks, idOffset)
+        self._chunks = []
+        return written
+
+    def build(self):
+        return createCellArray(*self.toArrays())
+
+
+def _fillCells(sizes, connectivity, chunks, idOffset):
+    """Copy (sizes, connectivity) chunks one after the other to the start of sizes and connectivity"""
+    numberOfCells = 0
+    numberOfIds = 0
+    for chunkSizes, chunkConnectivity in chunks:
+        sizes[numberOfCells:numberOfCells + len(chunkSizes)] = chunkSizes
+        ids = connectivity[numberOfIds:numberOfIds + len(chunkConnectivity)]
+        ids[:] = chunkConnectivity
+        ids += idOffset
+        numberOfCells += len(chunkSizes)
+        numberOfIds += len(chunkConnectivity)
+    return numberOfCells, numberOfIds
+
+
+# Multipliers hashing the integer grid cell of a point into a single key.
+# The hash is linear, so the cell next to a cell is found by adding the
+# hash of the offset to the hash of the cell
+GRID_CELL_HASH = numpy.array([73856093, 19349663, 83492791], dtype=numpy.uint64)
+# The hashes of the offsets to half of the neighbours of a cell, the other
+# half being found from the other side
+GRID_NEIGHBOUR_STEPS = [numpy.array(offset, dtype=numpy.int64).astype(numpy.uint64).dot(GRID_CELL_HASH)
+                        for offset in itertools.product((-1, 0, 1), repeat=3) if offset > (0, 0, 0)]
+
+
+def _neighbourCells(gridKeys):
+    """
+        The (cell, neighbour) index pairs of the cells of the sorted keys
+        gridKeys, each cell a neighbour of itself.  Cells sharing a hash
+        only add pairs the distance tests of weldPoints() then drop.
+    """
+    cells, neighbours = [numpy.arange(len(gridKeys))], [numpy.arange(len(gridKeys))]
+    for step in GRID_NEIGHBOUR_STEPS:
+        neighbourKeys = gridKeys + step
+        found = numpy.minimum(numpy.searchsorted(gridKeys, neighbourKeys), len(gridKeys) - 1)
+        hit = numpy.nonzero(gridKeys[found] == neighbourKeys)[0]
+        cells.extend([hit, found[hit]])
+        neighbours.extend([found[hit], hit])
+    return numpy.concatenate(cells), numpy.concatenate(neighbours)
+
+
+def _isClose(points, a, b, tolerance):
+    return ((points[a] - points[b]) ** 2).sum(axis=1) <= tolerance * tolerance
+
+
+def weldPoints(points, tolerance):
+    """
+        Merge the points closer than tolerance, or only exact duplicates
+        with a tolerance of 0.  Each point merges into a point kept within
+        tolerance of it, so no point moves by more than tolerance, and the
+        points kept are all farther than tolerance apart.  Returns
+        the remaining points, in input order, and the new id of every
+        input point.
+    """
+    # Adding 0.0 turns -0.0 into 0.0, which would otherwise not match
+    keys = numpy.ascontiguousarray(points, dtype=numpy.float64) + 0.0
+
+    # Exact duplicates first, compare the three coordinates of a point as
+    # a single opaque key
+    keys = keys.view(numpy.dtype((numpy.void, 3 * keys.dtype.itemsize))).ravel()
+    _, first, inverse = numpy.unique(keys, return_index=True, return_inverse=True)
+    del keys
+
+    order = numpy.argsort(first)
+    newIds = numpy.empty(len(order), dtype=ID_TYPE)
+    newIds[order] = numpy.arange(len(order), dtype=ID_TYPE)
+    newIds = newIds[inverse.ravel()]
+    points = points[first[order]]
+    if tolerance <= 0 or len(points) < 2:
+        return points, newIds
+
+    # Points are put in a grid of tolerance sized cells, so those close
+    # enough are in the same or neighbouring cells.  Each round, the first
+    # point left in each cell represents it.  A representative is kept
+    # unless an earlier one of a neighbouring cell is within tolerance,
+    # then every point left merges into the first representative kept
+    # within tolerance of it, so each point is compared with at most 27
+    # representatives.  The first point left is always kept, and points
+    # far from every representative kept wait for the next round, which
+    # only a few points ever need.
+    cellKeys = numpy.floor(points / tolerance).astype(numpy.int64).astype(numpy.uint64).dot(GRID_CELL_HASH)
+    merged = numpy.arange(len(points))
+    left = numpy.arange(len(points))
+    while len(left):
+        gridKeys, firstLeft, leftCells = numpy.unique(cellKeys[left], return_index=True, return_inverse=True)
+        leftCells = leftCells.ravel()
+        representatives = left[firstLeft]
+        cells, neighbours = _neighbourCells(gridKeys)
+
+        earlier = representatives[neighbours] < representatives[cells]
+        earlier[earlier] = _isClose(points, representatives[cells[earlier]],
+                                    representatives[neighbours[earlier]], tolerance)
+        kept = numpy.ones(len(gridKeys), dtype=bool)
+        kept[cells[earlier]] = False
+
+        # The representatives kept around each cell, first ones first, and
+        # those around the cell of each point left
+        pairs = kept[neighbours]
+        cells, candidates = cells[pairs], representatives[neighbours[pairs]]
+        pairs = numpy.lexsort((candidates, cells))
+        cells, candidates = cells[pairs], candidates[pairs]
+        counts = numpy.bincount(cells, minlength=len(gridKeys))
+        starts = numpy.cumsum(counts) - counts
+        sizes = counts[leftCells]
+        pair = numpy.arange(sizes.sum()) - numpy.repeat(numpy.cumsum(sizes) - sizes, sizes)
+        candidates = candidates[numpy.repeat(starts[leftCells], sizes) + pair]
+        queries = numpy.repeat(left, sizes)
+        del pair, sizes
+
+        close = _isClose(points, queries, candidates, tolerance)
+        queries, candidates = queries[close], candidates[close]
+        first = numpy.ones(len(queries), dtype=bool)
+        first[1:] = queries[1:] != queries[:-1]
+        merged[queries[first]] = candidates[first]
+        settled = numpy.zeros(len(points), dtype=bool)
+        settled[queries] = True
+        left = left[~settled[left]]
+
+    kept = merged == numpy.arange(len(points))
+    keptIds = numpy.cumsum(kept, dtype=ID_TYPE) - 1
+    return points[kept], keptIds[merged][newIds]
+
+
+class PolyDataBuilder(object):
+    """
+        Gathers the points and cells of one color block into flat arrays,
+        so the whole block crosses the Python/VTK boundary in a single call
+        per array instead of once per vertex.  Text glyphs are kept aside
+        and merged after the line work when the block is built.
+    """
+    def __init__(self, entityColor, weldTolerance=None, origin=None, layer=None, doublePrecision=False):
+        self.entityColor = entityColor
+        self.layer = layer
+        self.doublePrecision = doublePrecision
+        self.weldTolerance = weldTolerance
+        self.origin = origin
+        self.weldStatistics = (0, 0)
+        self._points = []
+        self._pointChunks = []
+        self._numberOfPoints = 0
+        self._glyphPoints = []
+        self._glyphCells = { 'verts': [], 'lines': [], 'polys': [], 'strips': [] }
+        self._numberOfGlyphPoints = 0
+        self._numberOfGlyphCells = { 'verts': 0, 'lines': 0, 'polys': 0, 'strips': 0 }
+        self.verts = CellBuffer()
+        self.lines = CellBuffer()
+        self.polys = CellBuffer()
+        self.strips = CellBuffer()
+
+    def getNumberOfPoints(self):
+        return self._numberOfPoints + self._numberOfGlyphPoints
+
+    def getNumberOfCells(self):
+        numberOfGlyphCells = sum([len(c[0]) for cells in self._glyphCells.values() for c in cells])
+        return numberOfGlyphCells + sum([c.numberOfCells for c in (self.verts, self.lines, self.polys, self.strips)])
+
+    def getCounts(self):
+        """
+            The number of points and of verts, lines, polys and strips of
+            the line work, then the same for the text glyphs, which locate
+            what each entity added in the arrays of toPartial()
+        """
+        return ((self._numberOfPoints, self.verts.numberOfCells, self.lines.numberOfCells, self.polys.numberOfCells,
+                 self.strips.numberOfCells, self._numberOfGlyphPoints) +
+                tuple([self._numberOfGlyphCells[name] for name in ('verts', 'lines', 'polys', 'strips')]))
+
+    def insertPoints(self, points):
+        """Append a sequence of (x, y, z) points, returns the id of the first"""
+        firstId = self._numberOfPoints
+        self._points.extend(points)
+        self._numberOfPoints = self._numberOfPoints + len(points)
+        if len(self._points) >= FLUSH_SIZE:
+            self._flushPoints()
+        return firstId
+
+    def insertLine(self, firstId, numPoints, closed=False):
+        self.lines.insertRun(firstId, numPoints, closed)
+
+    def insertVertex(self, pointId):
+        self.verts.insertRun(pointId, 1)
+
+    def insertPointArray(self, points):
+        """Append an (n, 3) array of points at once, returns the id of the first"""
+        self._flushPoints()
+        firstId = self._numberOfPoints
+        if len(points):
+            self._pointChunks.append(numpy.asarray(points, dtype=numpy.float64).reshape(-1, 3))
+            self._numberOfPoints += len(points)
+        return firstId
+
+    def insertPolygon(self, firstId, numPoints):
+        self.polys.insertRun(firstId, numPoints)
+
+    def insertPolys(self, sizes, connectivity):
+        """Append polygons at once, from their number of points and the point ids of their corners"""
+        self.polys.insertCells(sizes, connectivity)
+
+    def insertLines(self, sizes, connectivity):
+        """Append polylines at once, from their number of points and the point ids along them"""
+        self.lines.insertCells(sizes, connectivity)
+
+    def insertCellArrays(self, points, cells):
+        """
+            Append an (n, 3) array of points and cells using them (as
+            returned by polyDataToNumpy()), e.g. a placed block, as line
+            work, welded and simplified along with the rest of the block.
+        """
+        firstId = self.insertPointArray(points)
+        for name, insert in (('verts', self.verts.insertCells), ('lines', self.insertLines),
+                             ('polys', self.insertPolys), ('strips', self.strips.insertCells)):
+            if name in cells and len(cells[name][0]):
+                insert(cells[name][0], cells[name][1] + firstId)
+
+    def addGlyph(self, points, cells):
+        """
+            Keep the points and cells (as returned by polyDataToNumpy()) of a
+            text glyph, to be merged into the block by build().
+        """
+        numberOfPoints = len(points)
+        if numberOfPoints == 0:
+            return
+
+        for name, (sizes, connectivity) in cells.items():
+            self._glyphCells[name].append((sizes, connectivity + self._numberOfGlyphPoints))
+            self._numberOfGlyphCells[name] += len(sizes)
+
+        self._glyphPoints.append(points)
+        self._numberOfGlyphPoints += numberOfPoints
+
+    def toPartial(self):
+        """
+            Returns the points, cells and text glyphs of the block as they
+            were added, before welding and moving them to the origin, for
+            another builder to mergePartial().  The builder is emptied.
+        """
+        self._flushPoints()
+        points = numpy.concatenate(self._pointChunks) if self._pointChunks else numpy.zeros((0, 3))
+        self._pointChunks = []
+
+        cells = {}
+        glyphCells = {}
+        for name, buf in (('verts', self.verts), ('lines', self.lines),
+                          ('polys', self.polys), ('strips', self.strips)):
+            cells[name] = buf.toArrays()
+            empty = [numpy.zeros(0, dtype=ID_TYPE)]
+            glyphCells[name] = (numpy.concatenate(empty + [c[0] for c in self._glyphCells[name]]),
+                                numpy.concatenate(empty + [c[1] for c in self._glyphCells[name]]))
+            self._glyphCells[name] = []
+        glyphPoints = numpy.concatenate(self._glyphPoints) if self._glyphPoints else numpy.zeros((0, 3))
+        self._glyphPoints = []
+
+        return points, cells, glyphPoints, glyphCells
+
+    def mergePartial(self, partial):
+        """
+            Append the toPartial() of another builder, as if its entities
+            had been added to this one after those already there.
+        """
+        points, cells, glyphPoints, glyphCells = partial
+        firstId = self._numberOfPoints
+        self._flushPoints()
+        if len(points):
+            self._pointChunks.append(points)
+            self._numberOfPoints += len(points)
+        for name, buf in (('verts', self.verts), ('lines', self.lines),
+                          ('polys', self.polys), ('strips', self.strips)):
+            sizes, connectivity = cells[name]
+            if len(sizes):
+                buf.insertCells(sizes, connectivity + firstId)
+        self.addGlyph(glyphPoints, glyphCells)
+
+    def _flushPoints(self):
+        if self._points:
+            coords = numpy.fromiter(itertools.chain.from_iterable(self._points), numpy.float64, 3 * len(self._points))
+            self._pointChunks.append(coords.reshape(-1, 3))
+            self._points = []
+
+    def _weld(self):
+        """Merge the coincident points of the line work in place, see toArrays()"""
+        self._flushPoints()
+        if self.weldTolerance is None or not self._pointChunks:
+            return
+
+        points = numpy.concatenate(self._pointChunks)
+        self._pointChunks = []
+        numberOfPoints = len(points)
+        points, newIds = weldPoints(points, self.weldTolerance)
+        for buf in (self.verts, self.lines, self.polys, self.strips):
+            buf.remapPoints(newIds)
+        del newIds
+        self._pointChunks = [points]
+        self._numberOfPoints = len(points)
+        self.weldStatistics = (numberOfPoints, len(points))
+
+    def _outputPoints(self, points, hasGlyphs):
+        """Points as toArrays() returns them, relative to the origin and in the precision of the block"""
+        if self.origin is not None:
+            return (points - numpy.asarray(self.origin, dtype=numpy.float64)).astype(numpy.float32)
+        elif not hasGlyphs and not self.doublePrecision:
+            return points.astype(numpy.float32)
+        return points
+
+    def toArrays(self):
+        """
+            Returns the points of the block as an (n, 3) array, along with a
+            dict mapping 'verts', 'lines', 'polys' and 'strips' to the (sizes,
+            connectivity) of their cells.  With a weldTolerance, coincident
+            points of the line work are merged first, and weldStatistics
+            holds the number of points before and after.  With an origin,
+            points are made relative to it and stored in single precision.
+            Otherwise blocks carrying text are kept in double precision, as
+            the glyphs, which are small compared to mine coordinates, become
+            unreadable in single precision, and so are blocks built with
+            doublePrecision.  The builder is emptied.
+        """
+        # Intermediate arrays are released as soon as they are merged, to
+        # keep the peak memory close to the size of the block itself
+        self._weld()
+        if self._pointChunks:
+            points = numpy.concatenate(self._pointChunks)
+        else:
+            points = numpy.zeros((0, 3), dtype=numpy.float64)
+        self._pointChunks = []
+
+        cells = {}
+        for name, buf in (('verts', self.verts), ('lines', self.lines),
+                          ('polys', self.polys), ('strips', self.strips)):
+            cells[name] = buf.toArrays()
+
+        for name, (sizes, connectivity) in cells.items():
+            glyphCells = self._glyphCells[name]
+            if glyphCells:
+                glyphSizes = [c[0] for c in glyphCells]
+                glyphConnectivity = [c[1] + len(points) for c in glyphCells]
+                self._glyphCells[name] = []
+                cells[name] = (numpy.concatenate([sizes] + glyphSizes).astype(ID_TYPE, copy=False),
+                               numpy.concatenate([connectivity] + glyphConnectivity).astype(ID_TYPE, copy=False))
+
+        hasGlyphs = len(self._glyphPoints) > 0
+        if hasGlyphs:
+            points = numpy.concatenate([points] + self._glyphPoints)
+            self._glyphPoints = []
+
+        return self._outputPoints(points, hasGlyphs), cells
+
+    def countArrays(self):
+        """
+            Returns the number of points toArrays() would return, and a dict
+            mapping each cell type to the number of cells and the size of
+            the connectivity it would return.  The line work is welded
+            first, as welding changes the number of points.
+        """
+        self._weld()
+        counts = {}
+        for name, buf in (('verts', self.verts), ('lines', self.lines),
+                          ('polys', self.polys), ('strips', self.strips)):
+            numberOfCells, numberOfIds = buf.countArrays()
+            for sizes, connectivity in self._glyphCells[name]:
+                numberOfCells += len(sizes)
+                numberOfIds += len(connectivity)
+            counts[name] = (numberOfCells, numberOfIds)
+        return self.getNumberOfPoints(), counts
+
+    def fillArrays(self, points, cells, idOffset=0):
+        """
+            Write the block to preallocated arrays sized by countArrays(),
+            instead of returning it like toArrays(): points to the (n, 3)
+            points array, and the cells of each type to the (sizes,
+            connectivity) arrays cells maps it to, with point ids shifted
+            by idOffset.  The builder is emptied.
+        """
+        self._flushPoints()
+        hasGlyphs = len(self._glyphPoints) > 0
+        row = 0
+        for chunk in self._pointChunks + self._glyphPoints:
+            points[row:row + len(chunk)] = self._outputPoints(chunk, hasGlyphs)
+            row += len(chunk)
+        self._pointChunks = []
+        self._glyphPoints = []
+
+        for name, buf in (('verts', self.verts), ('lines', self.lines),
+                          ('polys', self.polys), ('strips', self.strips)):
+            sizes, connectivity = cells[name]
+            numberOfCells, numberOfIds = buf.fillArrays(sizes, connectivity, idOffset)
+            _fillCells(sizes[numberOfCells:], connectivity[numberOfIds:], self._glyphCells[name],
+                       idOffset + self._numberOfPoints)
+            self._glyphCells[name] = []
+
+    def build(self):
+        """Create the vtkPolyData for this block, emptying the builder"""
+        polyData = createPolyData(self.entityColor, self.origin)
+
+        points, cells = self.toArrays()
+        if len(points):
+            polyData.GetPoints().SetData(numpy_support.numpy_to_vtk(points, deep=1))
+        del points
+
+        polyData.SetVerts(createCellArray(*cells['verts']))
+        polyData.SetLines(createCellArray(*cells['lines']))
+        polyData.SetPolys(createCellArray(*cells['polys']))
+        polyData.SetStrips(createCellArray(*cells['strips']))
+
+        return polyData
+
+
+class LabelBuilder(object):
+    """
+        Gathers text as labeled anchor points, for viewers drawing text
+        themselves: one vertex per label, with its Text, Height, Rotation,
+        Alignment (see TextLabel) and EntityColor as point data.
+    """
+    def __init__(self, origin=None):
+        self.origin = origin
+        self._positions = []
+        self._texts = []
+        self._heights = []
+        self._rotations = []
+        self._alignments = []
+        self._colors = []
+
+    def __len__(self):
+        return len(self._texts)
+
+    def extend(self, other):
+        """Append the labels of another builder"""
+        self._positions.extend(other._positions)
+        self._texts.extend(other._texts)
+        self._heights.extend(other._heights)
+        self._rotations.extend(other._rotations)
+        self._alignments.extend(other._alignments)
+        self._colors.extend(other._colors)
+
+    def addLabel(self, label, entityColor):
+        self._positions.append(label.position)
+        self._texts.append(label.text)
+        self._heights.append(label.height)
+        self._rotations.append(label.rotation or 0.0)
+        self._alignments.append(label.alignment)
+        self._colors.append(entityColor)
+
+    def toArrays(self):
+        """
+            Returns the points of the labels, in double precision or relative
+            to the origin in single precision, their cells as returned by
+            PolyDataBuilder.toArrays() and an ordered dict of their point
+            data.  The builder is emptied.
+        """
+        count = len(self._texts)
+        points = numpy.array(self._positions, dtype=numpy.float64).reshape(-1, 3)
+        if self.origin is not None:
+            points = (points - numpy.asarray(self.origin, dtype=numpy.float64)).astype(numpy.float32)
+
+        empty = (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE))
+        cells = { 'verts': (numpy.ones(count, dtype=ID_TYPE), numpy.arange(count, dtype=ID_TYPE)),
+                  'lines': empty, 'polys': empty, 'strips': empty }
+
+        pointData = collections.OrderedDict([
+            ('Text', numpy.array(self._texts, dtype='U')),
+            ('Height', numpy.array(self._heights, dtype=numpy.float32)),
+            ('Rotation', numpy.array(self._rotations, dtype=numpy.float32)),
+            ('Alignment', numpy.array(self._alignments, dtype=numpy.uint8)),
+            ('EntityColor', numpy.array(self._colors, dtype=numpy.int16)),
+        ])
+        self.__init__(self.origin)
+
+        return points, cells, pointData
+
+    def build(self):
+        """Create the vtkPolyData of the labels, emptying the builder"""
+        polyData = createPolyData(None, self.origin)
+
+        points, cells, pointData = self.toArrays()
+        if len(points):
+            polyData.GetPoints().SetData(numpy_support.numpy_to_vtk(points, deep=1))
+        polyData.SetVerts(createCellArray(*cells['verts']))
+        addArrays(polyData.GetPointData(), pointData)
+
+        return polyData
+
+
+class InstanceBuilder(object):
+    """
+        Gathers INSERT entities as instances of blocks converted once: one
+        vertex per insert, with its BlockId, Rotation (degrees), Scale,
+        Rows, Columns, RowSpacing, ColumnSpacing and EntityColor as point
+        data.  BlockId indexes blockNames, in the order blocks were first
+        inserted.
+    """
+    def __init__(self, origin=None):
+        self.origin = origin
+        self.blockNames = []
+        self._blockIds = {}
+        self._positions = []
+        self._attributes = []
+
+    def __len__(self):
+        return len(self._positions)
+
+    def addInstance(self, reference, entityColor):
+        blockId = self._blockIds.get(reference.name)
+        if blockId is None:
+            blockId = self._blockIds[reference.name] = len(self.blockNames)
+            self.blockNames.append(reference.name)
+        self._positions.append(reference.position)
+        self._attributes.append((blockId, reference.rotation) + tuple(reference.scale) + (
+            reference.rows, reference.columns, reference.rowSpacing, reference.columnSpacing, entityColor))
+
+    def extend(self, other):
+        """Append the instances of another builder, renumbering their BlockId"""
+        blockIds = []
+        for name in other.blockNames:
+            if name not in self._blockIds:
+                self._blockIds[name] = len(self.blockNames)
+                self.blockNames.append(name)
+            blockIds.append(self._blockIds[name])
+        self._positions.extend(other._positions)
+        self._attributes.extend([(blockIds[attributes[0]],) + attributes[1:] for attributes in other._attributes])
+
+    def toArrays(self):
+        """
+            Returns the points, cells and point data of the instances, like
+            LabelBuilder.toArrays().  The builder is emptied, but for its
+            blockNames.
+        """
+        count = len(self._positions)
+        points = numpy.array(self._positions, dtype=numpy.float64).reshape(-1, 3)
+        if self.origin is not None:
+            points = (points - numpy.asarray(self.origin, dtype=numpy.float64)).astype(numpy.float32)
+
+        empty = (numpy.zeros(0, dtype=ID_TYPE), numpy.zeros(0, dtype=ID_TYPE))
+        cells = { 'verts': (numpy.ones(count, dtype=ID_TYPE), numpy.arange(count, dtype=ID_TYPE)),
+                  'lines': empty, 'polys': empty, 'strips': empty }
+
+        attributes = numpy.array(self._attributes, dtype=numpy.float64).reshape(-1, 10)
+        pointData = collections.OrderedDict([
+            ('BlockId', attributes[:, 0].astype(numpy.int32)),
+            ('Rotation', attributes[:, 1].astype(numpy.float32)),
+            ('Scale', attributes[:, 2:5].astype(numpy.float32)),
+            ('Rows', attributes[:, 5].astype(numpy.int32)),
+            ('Columns', attributes[:, 6].astype(numpy.int32)),
+            ('RowSpacing', attributes[:, 7].astype(numpy.float32)),
+            ('ColumnSpacing', attributes[:, 8].astype(numpy.float32)),
+            ('EntityColor', attributes[:, 9].astype(numpy.int16)),
+        ])
+        self._positions = []
+        self._attributes = []
+
+        return points, cells, pointData
+
+    def build(self):
+        """Create the vtkPolyData of the instances, with the BlockNames field data, emptying the builder"""
+        polyData = createPolyData(None, self.origin)
+
+        points, cells, pointData = self.toArrays()
+        if len(points):
+            polyData.GetPoints().SetData(numpy_support.numpy_to_vtk(points, deep=1))
+        polyData.SetVerts(createCellArray(*cells['verts']))
+        addArrays(polyData.GetPointData(), pointData)
+        addArrays(polyData.GetFieldData(), { 'BlockNames': numpy.array(self.blockNames, dtype='U') })
+
+        return polyData
+
+
+def addWeldStatistics(total, blockStatistics):
+    return (total[0] + blockStatistics[0], total[1] + blockStatistics[1])
+
+
+def pointBounds(points):
+    """Bounds of an (n, 3) array of points, as (xmin, xmax, ymin, ymax, zmin, zmax)"""
+    if len(points) == 0:
+        return [1.0, -1.0, 1.0, -1.0, 1.0, -1.0]
+    return [float(v) for axis in zip(points.min(axis=0), points.max(axis=0)) for v in axis]
+
+
+def appendBlocks(blocks, dtype=numpy.float64):
+    """
+        Merge the (points, cells) of several blocks, as returned by
+        PolyDataBuilder.toArrays(), into points of the given dtype and cells
+        ordered the way vtkAppendPolyData orders them.
+    """
+    points = [b[0] for b in blocks]
+    pointOffsets = numpy.cumsum([0] + [len(p) for p in points])
+    merged = {}
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        sizes = [b[1][name][0] for b in blocks]
+        connectivity = [b[1][name][1] + offset for b, offset in zip(blocks, pointOffsets)]
+        merged[name] = (numpy.concatenate(sizes or [numpy.zeros(0, dtype=ID_TYPE)]).astype(ID_TYPE),
+                        numpy.concatenate(connectivity or [numpy.zeros(0, dtype=ID_TYPE)]).astype(ID_TYPE))
+
+    points = numpy.concatenate(points or [numpy.zeros((0, 3))]).astype(dtype)
+    return points, merged
+
+
+def mergeBuilders(builders, dtype=numpy.float64):
+    """
+        The points and cells appendBlocks() would return for the toArrays()
+        of builders, without building each block first: a counting pass
+        sizes the merged arrays, then every builder writes its part of them
+        straight from the chunks it gathered, see PolyDataBuilder.fillArrays().
+        Also returns the number of cells of each type of every builder, for
+        blockCellData().  The builders are emptied.
+    """
+    counts = [builder.countArrays() for builder in builders]
+    points = numpy.empty((sum([c[0] for c in counts]), 3), dtype=dtype)
+    cells = {}
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        cells[name] = (numpy.empty(sum([c[1][name][0] for c in counts]), dtype=ID_TYPE),
+                       numpy.empty(sum([c[1][name][1] for c in counts]), dtype=ID_TYPE))
+
+    pointOffset = 0
+    offsets = dict([(name, (0, 0)) for name in cells])
+    for builder, (numberOfPoints, cellCounts) in zip(builders, counts):
+        blockCells = {}
+        for name, (numberOfCells, numberOfIds) in cellCounts.items():
+            cellOffset, idOffset = offsets[name]
+            blockCells[name] = (cells[name][0][cellOffset:cellOffset + numberOfCells],
+                                cells[name][1][idOffset:idOffset + numberOfIds])
+            offsets[name] = (cellOffset + numberOfCells, idOffset + numberOfIds)
+        builder.fillArrays(points[pointOffset:pointOffset + numberOfPoints], blockCells, pointOffset)
+        pointOffset += numberOfPoints
+
+    return points, cells, [dict([(name, c[0]) for name, c in cellCounts.items()]) for _, cellCounts in counts]
+
+
+def blockCellCounts(blocks):
+    """Number of cells of each type of every (points, cells) block, for blockCellData()"""
+    return [dict([(name, len(c[0])) for name, c in cells.items()]) for _, cells in blocks]
+
+
+def layerIds(layers):
+    """Id of every layer, numbering the distinct layers in order of appearance, and the names of the ids"""
+    names = list(collections.OrderedDict.fromkeys(layers))
+    ids = dict([(name, i) for i, name in enumerate(names)])
+    return [ids[layer] for layer in layers], names
+
+
+def blockCellData(cellCounts, colors, layers=None):
+    """
+        Per-cell data of blocks merged by appendBlocks() or mergeBuilders(),
+        given the number of cells of each type of every block: the
+        EntityColor of the block of every cell and, with the layer id of
+        every block, its LayerId.  Cells are numbered the way vtkPolyData
+        numbers them, verts first, then lines, polys and strips.
+    """
+    order = [(name, i) for name in ('verts', 'lines', 'polys', 'strips') for i in range(len(cellCounts))]
+    repeats = [cellCounts[i][name] for name, i in order]
+    cellData = collections.OrderedDict()
+    cellData['EntityColor'] = numpy.repeat(numpy.array([colors[i] for _, i in order], dtype=numpy.int16), repeats)
+    if layers is not None:
+        cellData['LayerId'] = numpy.repeat(numpy.array([layers[i] for _, i in order], dtype=numpy.int32), repeats)
+    return cellData
+
+
+class GlyphCache(object):
+    """
+        Least recently used cache of untransformed vtkVectorText glyphs,
+        keyed by their text.  Mine plans repeat the same few labels (levels,
+        elevations, drive names) thousands of times.
+    """
+    def __init__(self, size=DEFAULT_GLYPH_CACHE_SIZE):
+        self._glyphs = collections.OrderedDict()
+        self.setSize(size)
+        self.resetStatistics()
+
+    def setSize(self, size):
+        self.size = max(0, int(size))
+        while len(self._glyphs) > self.size:
+            self._glyphs.popitem(last=False)
+
+    def resetStatistics(self):
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, text):
+        if text in self._glyphs:
+            self.hits += 1
+            glyph = self._glyphs.pop(text)
+        else:
+            self.misses += 1
+            glyph = _createVectorText(text)
+
+        if self.size > 0:
+            self._glyphs[text] = glyph
+            if len(self._glyphs) > self.size:
+                self._glyphs.popitem(last=False)
+
+        return glyph
+
+
+#------------------------------------------------------------------------------
+# Conversion engine, running the entity handlers without ParaView
+#------------------------------------------------------------------------------
+class DXFConverter(object):
+    """
+        Runs the entity handlers over the entities of a DXF file, gathering
+        their output in one PolyDataBuilder per entity color, or per layer
+        and entity color with splitLayers.  textMode says whether text
+        becomes vector text glyphs in those blocks, or labeled points in a
+        LabelBuilder of its own.  Only text glyphs need VTK, without it they
+        are skipped, and counted in skippedText.  blockMode says whether
+        INSERT entities are ignored, gathered as instances of their block in
+        an InstanceBuilder, or expanded into copies of their block, see
+        BLOCK_MODES.  Blocks are converted once, on their first insert.
+        With collectStatistics, each conversion fills in a
+        ConversionStatistics.
+
+        includeLayers and excludeLayers are lists of layer name patterns,
+        see selectLayers().  When streaming, the file is indexed by layer
+        with scanDXFLayers() first and only the entities of the selected
+        layers are parsed.
+
+        With parseJobs above 1, the ENTITIES section is split at entity
+        boundaries into that many parts, converted by as many worker
+        processes, and their blocks merged in file order, so the result is
+        the same as converting the file in a single process.
+
+        entityIndex is the path of an EntityIndex.  When streaming, each
+        conversion saves one there, and the next converts the file as a
+        delta of it: entities whose handle and bytes did not change are not
+        parsed again, their output is copied from the index, in a single
+        process.  The result is the same as a full conversion,
+        deltaStatistics tells how much work the index saved.
+    """
+    def __init__(self, glyphCacheSize=DEFAULT_GLYPH_CACHE_SIZE, rotateText=False, streamEntities=True,
+                 weldTolerance=None, origin=None, collectStatistics=False, includeLayers=None,
+                 excludeLayers=None, splitLayers=False, textMode='glyphs', blockMode='ignore', parseJobs=1,
+                 entityIndex=None):
+        self.glyphCache = GlyphCache(glyphCacheSize)
+        self.rotateText = rotateText
+        self.streamEntities = streamEntities
+        self.weldTolerance = weldTolerance
+        self.origin = origin
+        self.collectStatistics = collectStatistics
+        self.includeLayers = includeLayers
+        self.excludeLayers = excludeLayers
+        self.splitLayers = splitLayers
+        self.textMode = textMode
+        self.labels = LabelBuilder(origin)
+        self.blockMode = blockMode
+        self.instances = InstanceBuilder(origin)
+        self.parseJobs = parseJobs
+        self.entityIndex = entityIndex
+        self.deltaStatistics = None
+        self.blockGeometries = {}
+        self._blocks = None
+        self._expanding = set()
+        self.statistics = None
+        self.entityCounts = {}
+        self.skippedText = 0
+        self.layerIndex = None
+        self._filename = None
+        self._dxf = None
+
+    def _read_data_file(self, filename):
+        from dxfgrabber import readfile
+        if not self._dxf or self._filename != filename:
+            self._dxf = readfile(filename)
+            self._filename = filename
+
+    def _blockKey(self, layer, entityColor):
+        return (layer, entityColor) if self.splitLayers else entityColor
+
+    def _blockBuilder(self, entityColorsToBuilder, layer, entityColor):
+        """The PolyDataBuilder of the entities of that layer and color, added to entityColorsToBuilder if needed"""
+        key = self._blockKey(layer, entityColor)
+        if key not in entityColorsToBuilder:
+            layer = layer if self.splitLayers else None
+            entityColorsToBuilder[key] = PolyDataBuilder(entityColor, self.weldTolerance, self.origin, layer)
+        return entityColorsToBuilder[key]
+
+    def _buildBlocks(self, entities, entityColorsToBuilder=None):
+        if entityColorsToBuilder is None:
+            entityColorsToBuilder = collections.OrderedDict()
+        self.labels = LabelBuilder(self.origin)
+        self.instances = InstanceBuilder(self.origin)
+        self.entityCounts = collections.Counter()
+        self.skippedText = 0
+        statistics = self.statistics
+        glyphSeconds = 0.0
+        start = timeit.default_timer()
+
+        for entity in entities:
+            self.entityCounts[entity.dxftype] += 1
+            builder = self._blockBuilder(entityColorsToBuilder, entity.layer, entity.color)
+
+            label = handleEntity(entity, builder, statistics)
+
+            if isinstance(label, BlockReference):
+                self._addBlockReference(label, entity.color, builder)
+            elif label and self.textMode == 'labels':
+                self.labels.addLabel(label, entity.color)
+            elif label and not HAVE_VTK:
+                self.skippedText += 1
+            elif label:
+                if statistics is not None:
+                    glyphStart = timeit.default_timer()
+                self._addGlyph(label, builder)
+                if statistics is not None:
+                    glyphSeconds += timeit.default_timer() - glyphStart
+
+        if statistics is not None:
+            # Parsing is interleaved with the handlers when streaming, it
+            # gets whatever time the handlers and glyphs did not take
+            seconds = timeit.default_timer() - start
+            statistics.addStage('parse', seconds - statistics.handlerSeconds() - glyphSeconds)
+            statistics.addStage('handlers', statistics.handlerSeconds())
+            statistics.addStage('glyphs', glyphSeconds)
+            statistics.addEvent('textWithoutVtk', self.skippedText)
+            statistics.addEvent('glyphCacheHits', self.glyphCache.hits)
+            statistics.addEvent('glyphCacheMisses', self.glyphCache.misses)
+
+        return entityColorsToBuilder
+
+    def _addGlyph(self, label, builder):
+        points, cells = self.glyphCache.get(label.text)
+        rotation = label.rotation if self.rotateText else None
+        builder.addGlyph(placeGlyph(points, label.position, rotation), cells)
+
+    def _addBlockReference(self, reference, entityColor, builder):
+        if self.blockMode == 'ignore':
+            return
+        geometry = self.blockGeometry(reference.name)
+        if geometry is None:
+            if self.statistics is not None:
+                self.statistics.addEvent('unknownBlockInserts')
+            return
+
+        if self.statistics is not None:
+            self.statistics.addEvent('inserts')
+        if self.blockMode == 'instances':
+            self.instances.addInstance(reference, entityColor)
+        elif len(geometry[0]):
+            builder.insertCellArrays(*placeBlock(geometry[0], geometry[1], reference))
+
+    def _readBlocks(self):
+        if self._dxf is not None and self._filename == self._blocksFilename:
+            return dict([(block.name, DXFBlock(block.name, tuple(block.basepoint) + (0.0,) * (3 - len(block.basepoint)),
+                                               list(block)))
+                         for block in self._dxf.blocks])
+        return readDXFBlocks(self._blocksFilename)
+
+    def blockGeometry(self, name):
+        """
+            The (points, cells) of a block, relative to its base point and in
+            double precision, converted on first use.  Blocks inserted in
+            the block are expanded into it, text is drawn with glyphs.  None
+            for unknown or recursive blocks.
+        """
+        if name in self.blockGeometries:
+            return self.blockGeometries[name]
+        if self._blocks is None:
+            start = timeit.default_timer()
+            self._blocks = self._readBlocks()
+            if self.statistics is not None:
+                self.statistics.addStage('blocks', timeit.default_timer() - start)
+
+        block = self._blocks.get(name)
+        if block is None:
+            warning_message('Cannot insert unknown block {0}'.format(name))
+            self.blockGeometries[name] = None
+            return None
+        if name in self._expanding:
+            warning_message('Cannot insert block {0}'.format(name))
+            return None
+
+        self._expanding.add(name)
+        builder = PolyDataBuilder(0, doublePrecision=True)
+        for entity in block.entities:
+            result = handleEntity(entity, builder)
+            if isinstance(result, BlockReference):
+                geometry = self.blockGeometry(result.name)
+                if geometry is not None and len(geometry[0]):
+                    builder.insertCellArrays(*placeBlock(geometry[0], geometry[1], result))
+            elif result and HAVE_VTK:
+                self._addGlyph(result, builder)
+        self._expanding.discard(name)
+
+        points, cells = builder.toArrays()
+        geometry = (points - numpy.asarray(block.basePoint, dtype=numpy.float64), cells)
+        self.blockGeometries[name] = geometry
+        if self.statistics is not None:
+            self.statistics.addEvent('blocks')
+        return geometry
+
+    def filterLayers(self):
+        return bool(self.includeLayers or self.excludeLayers)
+
+    def _selectedRanges(self, filename):
+        """Index filename by layer, returns the byte ranges of the selected layers"""
+        start = timeit.default_timer()
+        self.layerIndex = scanDXFLayers(filename)
+        selected = selectLayers(self.layerIndex.keys(), self.includeLayers, self.excludeLayers)
+        if self.statistics is not None:
+            self.statistics.addStage('scan', timeit.default_timer() - start)
+            skipped = set(self.layerIndex.keys()) - set(selected)
+            self.statistics.addEvent('skippedLayerEntities', sum([self.layerIndex[name]['count'] for name in skipped]))
+        return layerRanges(self.layerIndex, selected)
+
+    def _filteredEntities(self, entities):
+        selected = {}
+        for entity in entities:
+            if entity.layer not in selected:
+                selected[entity.layer] = bool(selectLayers([entity.layer], self.includeLayers, self.excludeLayers))
+            if selected[entity.layer]:
+                yield entity
+            elif self.statistics is not None:
+                self.statistics.addEvent('skippedLayerEntities')
+
+    def _startConversion(self, filename):
+        self.glyphCache.resetStatistics()
+        self.blockGeometries = {}
+        self._blocks = None
+        self._blocksFilename = filename
+        self.statistics = ConversionStatistics() if self.collectStatistics else None
+        self.layerIndex = None
+        self.deltaStatistics = None
+
+    def _convertParallel(self, filename, ranges=None):
+        """Convert the entities within ranges, the whole ENTITIES section by default, in parseJobs processes"""
+        import multiprocessing
+
+        start = timeit.default_timer()
+        offsets = scanDXFEntityOffsets(filename)
+        if ranges is None:
+            ranges = [[int(offsets[0]), int(offsets[-1])]] if len(offsets) > 1 else []
+        parts = splitRanges(ranges, offsets, self.parseJobs)
+        if self.statistics is not None:
+            self.statistics.addStage('split', timeit.default_timer() - start)
+        if len(parts) < 2 or multiprocessing.current_process().daemon:
+            # Worker processes of a batch conversion cannot have workers of their own
+            return self._buildBlocks(iterDXFEntities(filename, self.statistics, ranges))
+
+        options = {
+            'glyphCacheSize': self.glyphCache.size,
+            'rotateText': self.rotateText,
+            'collectStatistics': self.collectStatistics,
+            'splitLayers': self.splitLayers,
+            'textMode': self.textMode,
+            'blockMode': self.blockMode,
+        }
+        start = timeit.default_timer()
+        pool = multiprocessing.Pool(len(parts))
+        try:
+            results = pool.map(_convertEntityRanges, [(filename, part, options) for part in parts])
+        finally:
+            pool.close()
+            pool.join()
+        if self.statistics is not None:
+            self.statistics.addStage('workers', timeit.default_timer() - start)
+
+        # The stages of the workers add up their own time
+        start = timeit.default_timer()
+        entityColorsToBuilder = collections.OrderedDict()
+        self.labels = LabelBuilder(self.origin)
+        self.instances = InstanceBuilder(self.origin)
+        self.entityCounts = collections.Counter()
+        self.skippedText = 0
+        for partials, labels, instances, blockGeometries, entityCounts, skippedText, statistics, glyphCache in results:
+            for key, entityColor, layer, partial in partials:
+                if key not in entityColorsToBuilder:
+                    entityColorsToBuilder[key] = PolyDataBuilder(entityColor, self.weldTolerance, self.origin, layer)
+                entityColorsToBuilder[key].mergePartial(partial)
+            self.labels.extend(labels)
+            self.instances.extend(instances)
+            self.blockGeometries.update(blockGeometries)
+            self.entityCounts.update(entityCounts)
+            self.skippedText += skippedText
+            self.glyphCache.hits += glyphCache[0]
+            self.glyphCache.misses += glyphCache[1]
+            if self.statistics is not None:
+                self.statistics.merge(statistics)
+        if self.statistics is not None:
+            self.statistics.addStage('merge', timeit.default_timer() - start)
+            self.statistics.addEvent('parseJobs', len(parts))
+
+        return entityColorsToBuilder
+
+    def _entityIndexKey(self):
+        return [CONVERTER_VERSION, self.rotateText, self.textMode, self.blockMode, HAVE_VTK]
+
+    def _reusable(self, entity):
+        """Whether all the output of an entity goes to its block, so it can be copied from an EntityIndex"""
+        return entity.dxftype != 'INSERT' and not (self.textMode == 'labels' and entity.dxftype in ('TEXT', 'MTEXT'))
+
+    def _convertIndexed(self, filename, ranges=None):
+        """
+            Convert the entities within ranges like _buildBlocks(), as a
+            delta of the EntityIndex saved by the previous conversion, and
+            save the index of this one in its place
+        """
+        start = timeit.default_timer()
+        key = self._entityIndexKey() + [_detectEncoding(filename)]
+        previous = EntityIndex.load(self.entityIndex, key)
+        index = EntityIndex()
+        counts = collections.Counter()
+        entityColorsToBuilder = collections.OrderedDict()
+
+        offsets = scanDXFEntityOffsets(filename)
+        starts, ends = offsets[:-1], offsets[1:]
+        if ranges is not None:
+            # Ranges hold whole entities
+            bounds = numpy.array(ranges, dtype=numpy.int64).reshape(-1, 2)
+            i = numpy.searchsorted(bounds[:, 0], starts, 'right') - 1
+            selected = (i >= 0) & (starts < bounds[numpy.maximum(i, 0), 1])
+            starts, ends = starts[selected], ends[selected]
+        entities = self._indexedEntities(filename, starts.tolist(), ends.tolist(), entityColorsToBuilder, previous,
+                                         index, counts)
+        self._buildBlocks(entities, entityColorsToBuilder)
+        seconds = timeit.default_timer() - start
+
+        # Save the blocks the index locates output in, then rebuild them from what was saved
+        start = timeit.default_timer()
+        partials = []
+        for blockKey in index.blockKeys:
+            builder = entityColorsToBuilder[blockKey]
+            partials.append(builder.toPartial())
+            entityColorsToBuilder[blockKey] = PolyDataBuilder(builder.entityColor, self.weldTolerance, self.origin,
+                                                              builder.layer)
+            entityColorsToBuilder[blockKey].mergePartial(partials[-1])
+        if previous is None or not previous.fullEntities:
+            index.fullSeconds, index.fullEntities = seconds, len(index)
+        else:
+            index.fullSeconds, index.fullEntities = previous.fullSeconds, previous.fullEntities
+        index.save(self.entityIndex, key, partials)
+        if self.statistics is not None:
+            self.statistics.addStage('index', timeit.default_timer() - start)
+            self.statistics.addEvent('reusedEntities', counts['reused'])
+
+        # A full conversion is estimated from the first one, by entity
+        fullSeconds = index.fullSeconds * counts['entities'] / max(index.fullEntities, 1)
+        self.deltaStatistics = {
+            'delta': previous is not None,
+            'entities': counts['entities'],
+            'reused': counts['reused'],
+            'converted': counts['entities'] - counts['reused'],
+            'added': counts['added'],
+            'changed': counts['changed'],
+            'removed': previous.numberOfHandles() - counts['matched'] if previous is not None else 0,
+            'seconds': seconds,
+            'fullSeconds': fullSeconds if previous is not None else seconds,
+            'savedSeconds': max(fullSeconds - seconds, 0.0) if previous is not None else 0.0,
+        }
+        return entityColorsToBuilder
+
+    def _indexedEntities(self, filename, starts, ends, entityColorsToBuilder, previous, index, counts):
+        """
+            Yields the entities between the starts and ends byte offsets of
+            filename to convert, only reading the tags of those added or
+            changed since the previous EntityIndex, and copies the output of
+            the others to their block instead, consecutive ones at once.
+            Records each entity in index, counts them in counts.
+        """
+        keys = list(iterEntityKeys(filename, starts, ends))
+        previousRows = []
+        ranges = []
+        for (handle, digest), start, end in zip(keys, starts, ends):
+            counts['entities'] += 1
+            previousRow = previous.find(handle) if previous is not None else None
+            if previousRow is None:
+                counts['added'] += 1
+            else:
+                counts['matched'] += 1
+                if not previous.unchanged(previousRow, digest):
+                    counts['changed'] += 1
+                    previousRow = None
+                elif not previous.reusable(previousRow):
+                    previousRow = None
+            previousRows.append(previousRow)
+            if previousRow is None:
+                if ranges and ranges[-1][1] == start:
+                    ranges[-1][1] = end
+                else:
+                    ranges.append([start, end])
+
+        groups = _iterEntityGroups(_iterDXFEntityTags(filename, ranges)) if ranges else iter([])
+        copies = {}
+        converted = None
+        for (handle, digest), previousRow in zip(keys, previousRows):
+            if converted is not None:
+                # _buildBlocks() handled the last entity yielded meanwhile
+                row, blockKey, before = converted
+                index.setOutput(row, index.blockId(blockKey), before, entityColorsToBuilder[blockKey].getCounts())
+                converted = None
+
+            if previousRow is not None:
+                dxftype, layer, entityColor = previous.describe(previousRow)
+                self._blockBuilder(entityColorsToBuilder, layer, entityColor)
+                self.entityCounts[dxftype] += 1
+                counts['reused'] += 1
+                row = index.add(handle, digest, dxftype, layer, entityColor)
+                blockKey = self._blockKey(layer, entityColor)
+                copy = copies.get(blockKey)
+                if copy is not None and previous.follows(previousRow, copy[1][-1]):
+                    copy[0].append(row)
+                    copy[1].append(previousRow)
+                    continue
+                if copy is not None:
+                    self._copyOutput(entityColorsToBuilder, blockKey, copy, previous, index)
+                copies[blockKey] = ([row], [previousRow])
+                continue
+
+            group = next(groups, None)
+            if group is None:
+                raise DXFStreamError('{0} changed while being converted'.format(filename))
+            entities = list(_foldEntities(iter(group), self.statistics))
+            for entity in entities:
+                blockKey = self._blockKey(entity.layer, entity.color)
+                if blockKey in copies:
+                    self._copyOutput(entityColorsToBuilder, blockKey, copies.pop(blockKey), previous, index)
+            if len(entities) == 1:
+                entity = entities[0]
+                row = index.add(handle, digest, entity.dxftype, entity.layer, entity.color)
+                if self._reusable(entity):
+                    blockKey = self._blockKey(entity.layer, entity.color)
+                    builder = entityColorsToBuilder.get(blockKey)
+                    converted = (row, blockKey, builder.getCounts() if builder is not None else _NO_COUNTS)
+            for entity in entities:
+                yield entity
+
+        if next(groups, None) is not None:
+            raise DXFStreamError('{0} changed while being converted'.format(filename))
+        if converted is not None:
+            row, blockKey, before = converted
+            index.setOutput(row, index.blockId(blockKey), before, entityColorsToBuilder[blockKey].getCounts())
+        for blockKey, copy in copies.items():
+            self._copyOutput(entityColorsToBuilder, blockKey, copy, previous, index)
+
+    def _copyOutput(self, entityColorsToBuilder, blockKey, copy, previous, index):
+        """Copy the output of consecutive rows of the previous EntityIndex to their block"""
+        rows, previousRows = copy
+        builder = entityColorsToBuilder[blockKey]
+        base = builder.getCounts()
+        previous.copyOutput(builder, previousRows[0], previousRows[-1])
+        index.addCopy(rows, index.blockId(blockKey), base, previous, previousRows)
+
+    def convert(self, filename):
+        """
+            Returns an ordered dict of entity color, or (layer, entity color)
+            with splitLayers, to the PolyDataBuilder holding those entities.
+            In the labels text mode, text is gathered in the labels builder.
+        """
+        if self.textMode not in TEXT_MODES:
+            raise ValueError('Unknown text mode: {0}'.format(self.textMode))
+        if self.blockMode not in BLOCK_MODES:
+            raise ValueError('Unknown block mode: {0}'.format(self.blockMode))
+        self._startConversion(filename)
+
+        if self.streamEntities:
+            try:
+                ranges = self._selectedRanges(filename) if self.filterLayers() else None
+                if self.entityIndex:
+                    return self._convertIndexed(filename, ranges)
+                if self.parseJobs > 1:
+                    return self._convertParallel(filename, ranges)
+                return self._buildBlocks(iterDXFEntities(filename, self.statistics, ranges))
+            except DXFStreamError as err:
+                warning_message('Streaming parser failed ({0}), falling back to dxfgrabber'.format(err))
+                if self.statistics is not None:
+                    self.statistics = ConversionStatistics()
+                    self.statistics.addEvent('streamFallback')
+
+        start = timeit.default_timer()
+        self._read_data_file(filename)
+        if self.statistics is not None:
+            self.statistics.addStage('load', timeit.default_timer() - start)
+        self.glyphCache.resetStatistics()
+        entities = self._dxf.entities
+        if self.filterLayers():
+            entities = self._filteredEntities(entities)
+        return self._buildBlocks(entities)
+
+
+def _convertEntityRanges(task):
+    """
+        Worker of DXFConverter._convertParallel(), converts the entities of
+        a file within byte ranges.  Returns the toPartial() of each block,
+        by key, along with what else the conversion gathered.
+    """
+    filename, ranges, options = task
+    converter = DXFConverter(**options)
+    converter._startConversion(filename)
+    entityColorsToBuilder = converter._buildBlocks(iterDXFEntities(filename, converter.statistics, ranges))
+    partials = [(key, builder.entityColor, builder.layer, builder.toPartial())
+                for key, builder in entityColorsToBuilder.items()]
+    return (partials, converter.labels, converter.instances, converter.blockGeometries, converter.entityCounts,
+            converter.skippedText, converter.statistics,
+            (converter.glyphCache.hits, converter.glyphCache.misses))
+
+
+#------------------------------------------------------------------------------
+# Sidecar of the arrays converted by the reader, reopening a file skips parsing
+#------------------------------------------------------------------------------
+def sidecar_path(filename):
+    """Path of the sidecar of a DXF file, e.g. lev1146.dxf.npz"""
+    return '{0}.npz'.format(filename)
+
+
+def _flattenArrays(arrays, prefix, points, cells, data=None):
+    """Add points, cells and arrays by name to arrays, under names starting with prefix, returns the data names"""
+    arrays['{0}.points'.format(prefix)] = points
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        arrays['{0}.{1}.sizes'.format(prefix, name)] = cells[name][0]
+        arrays['{0}.{1}.connectivity'.format(prefix, name)] = cells[name][1]
+    for name, values in (data or {}).items():
+        arrays['{0}.data.{1}'.format(prefix, name)] = values
+    return list((data or {}).keys())
+
+
+def _unflattenArrays(arrays, prefix, dataNames=()):
+    points = arrays['{0}.points'.format(prefix)]
+    cells = dict([(name, (arrays['{0}.{1}.sizes'.format(prefix, name)],
+                          arrays['{0}.{1}.connectivity'.format(prefix, name)]))
+                  for name in ('verts', 'lines', 'polys', 'strips')])
+    data = collections.OrderedDict([(name, arrays['{0}.data.{1}'.format(prefix, name)]) for name in dataNames])
+    return points, cells, data
+
+
+def write_sidecar(path, key, conversion):
+    """Save a conversion of the reader, see ReaderEngine.convert(), with its key to an .npz file"""
+    arrays = {}
+    meta = dict([(name, value) for name, value in conversion.items()
+                 if name not in ('blocks', 'labels', 'instances', 'blockGeometries')])
+    meta['key'] = key
+    meta['blocks'] = []
+    for i, block in enumerate(conversion['blocks']):
+        meta['blocks'].append(dict([(name, block[name])
+                                    for name in ('color', 'layer', 'layerNames', 'weldStatistics')]))
+        meta['blocks'][-1]['cellData'] = _flattenArrays(arrays, 'block{0}'.format(i), block['points'], block['cells'],
+                                                        block['cellData'])
+    for name in ('labels', 'instances'):
+        meta[name] = None
+        if conversion[name] is not None:
+            meta[name] = _flattenArrays(arrays, name, *conversion[name])
+    for i, (points, cells) in enumerate(conversion['blockGeometries']):
+        _flattenArrays(arrays, 'geometry{0}'.format(i), points, cells)
+    arrays['meta'] = numpy.array([json.dumps(meta)])
+    _savez(path, arrays)
+
+
+def _savez(path, arrays):
+    """Save arrays by name to an .npz file, under a temporary name first, a reader may be loading it"""
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'wb') as fp:
+        numpy.savez(fp, **arrays)
+    replace_file(tmp, path)
+
+
+def replace_file(tmp, path):
+    """Move tmp over path in a single step, so readers find either file whole, never none"""
+    if hasattr(os, 'replace'):
+        os.replace(tmp, path)
+    elif os.name == 'nt' and os.path.exists(path):
+        # Python 2 cannot rename over a file on Windows
+        os.remove(path)
+        os.rename(tmp, path)
+    else:
+        os.rename(tmp, path)
+
+
+def read_sidecar(path, key):
+    """
+        The conversion saved at path by write_sidecar(), None when missing,
+        saved with another key or unreadable, e.g. truncated, the file is
+        then converted again
+    """
+    if not os.path.isfile(path):
+        return None
+    try:
+        return _readSidecar(path, key)
+    except NPZ_READ_ERRORS as err:
+        warning_message('Cannot read sidecar {0} ({1}), converting the file again'.format(path, err))
+        return None
+
+
+def _readSidecar(path, key):
+    arrays = numpy.load(path)
+    try:
+        conversion = json.loads(str(arrays['meta'][0]), object_pairs_hook=collections.OrderedDict)
+        if conversion.pop('key') != key:
+            return None
+
+        for i, block in enumerate(conversion['blocks']):
+            block['points'], block['cells'], cellData = _unflattenArrays(arrays, 'block{0}'.format(i),
+                                                                         block['cellData'])
+            block['cellData'] = cellData or None
+        for name in ('labels', 'instances'):
+            if conversion[name] is not None:
+                conversion[name] = _unflattenArrays(arrays, name, conversion[name])
+        conversion['blockGeometries'] = [_unflattenArrays(arrays, 'geometry{0}'.format(i))[:2]
+                                         for i in range(len(conversion['blockNames']))]
+    finally:
+        arrays.close()
+
+    return conversion
+
+
+#------------------------------------------------------------------------------
+# Entity index of a conversion, a revised file is converted as a delta of it
+#------------------------------------------------------------------------------
+# Columns of a row of an EntityIndex: the handle and hash of the entity, its
+# type and layer, as ids of their names, its color and block, then the
+# getCounts() of its block before and after it
+_INDEX_HANDLE, _INDEX_HASH, _INDEX_TYPE, _INDEX_LAYER, _INDEX_COLOR, _INDEX_BLOCK = range(6)
+_INDEX_STARTS = slice(6, 16)
+_INDEX_ENDS = slice(16, 26)
+_NO_COUNTS = (0,) * 10
+
+
+class EntityIndex(object):
+    """
+        What a conversion made of each entity of a file: its handle, a hash
+        of its bytes, its type, layer and color, and the part of the arrays
+        of its block it added, between the getCounts() of the block before
+        and after it.  Saved along with the toPartial() of those blocks, so
+        a conversion of a revision of the file copies the output of the
+        entities it did not change from there instead of converting them
+        again, see DXFConverter.  Rows are gathered in Python lists, moved
+        to numpy arrays every FLUSH_SIZE entities.
+    """
+    def __init__(self):
+        self.typeNames = []
+        self.layerNames = []
+        self.blockKeys = []
+        self.fullSeconds = None
+        self.fullEntities = None
+        self._typeIds = {}
+        self._layerIds = {}
+        self._blockIds = {}
+        self._rows = []
+        self._chunks = []
+        self._runs = []
+        self._numberOfRows = 0
+        # Set by load()
+        self.table = None
+        self._bases = None
+        self._partial = None
+        self._handleRows = None
+        self._follows = None
+
+    def __len__(self):
+        return self._numberOfRows
+
+    def _nameId(self, name, names, ids):
+        nameId = ids.get(name)
+        if nameId is None:
+            nameId = ids[name] = len(names)
+            names.append(name)
+        return nameId
+
+    def blockId(self, key):
+        """Id of the block of the DXFConverter with that key, in the order blocks are saved"""
+        return self._nameId(key, self.blockKeys, self._blockIds)
+
+    def add(self, handle, digest, dxftype, layer, color):
+        """Record an entity, returns its row.  Its output is not reusable until setOutput()."""
+        if len(self._rows) >= FLUSH_SIZE:
+            self._chunks.append(numpy.array(self._rows, dtype=numpy.int64))
+            self._rows = []
+        self._rows.append((handle, digest, self._nameId(dxftype, self.typeNames, self._typeIds),
+                           self._nameId(layer, self.layerNames, self._layerIds), color, -1) + _NO_COUNTS + _NO_COUNTS)
+        self._numberOfRows += 1
+        return self._numberOfRows - 1
+
+    def setOutput(self, row, block, start, end):
+        """Locate the output of the last row added, between the start and end counts of block"""
+        assert row == self._numberOfRows - 1
+        self._rows[-1] = self._rows[-1][:_INDEX_BLOCK] + (block,) + tuple(start) + tuple(end)
+
+    def addCopy(self, rows, block, base, previous, previousRows):
+        """
+            Locate the output of rows, copied from the consecutive
+            previousRows of the previous EntityIndex to block, which then
+            had base counts, see copyOutput()
+        """
+        self._runs.append((rows, block, base, previous, previousRows))
+
+    def _table(self):
+        """All the rows, with the output of those copied from a previous index located"""
+        chunks = self._chunks + ([numpy.array(self._rows, dtype=numpy.int64)] if self._rows else [])
+        table = numpy.concatenate(chunks) if chunks else numpy.zeros((0, 26), dtype=numpy.int64)
+        self._chunks = []
+        self._rows = []
+        for rows, block, base, previous, previousRows in self._runs:
+            previousRows = numpy.array(previousRows)
+            shift = numpy.array(base, dtype=numpy.int64) - previous.table[previousRows[0], _INDEX_STARTS]
+            rows = numpy.array(rows)
+            table[rows, _INDEX_BLOCK] = block
+            table[rows, _INDEX_STARTS] = previous.table[previousRows, _INDEX_STARTS] + shift
+            table[rows, _INDEX_ENDS] = previous.table[previousRows, _INDEX_ENDS] + shift
+        self._runs = []
+        return table
+
+    def save(self, path, key, partials):
+        """
+            Save the index, with key and the toPartial() of each of its
+            blockKeys, to an .npz file.  The arrays of the blocks are saved
+            one after another, with the counts of those before each block
+            as its bases, see getCounts().
+        """
+        names = ('verts', 'lines', 'polys', 'strips')
+        bases = numpy.zeros((len(partials) + 1, 10), dtype=numpy.int64)
+        for i, (points, cells, glyphPoints, glyphCells) in enumerate(partials):
+            bases[i + 1] = bases[i] + ([len(points)] + [len(cells[name][0]) for name in names] +
+                                       [len(glyphPoints)] + [len(glyphCells[name][0]) for name in names])
+        arrays = { 'table': self._table(), 'bases': bases[:-1] }
+        _flattenArrays(arrays, 'blocks', *_concatenatePartials([partial[:2] for partial in partials]))
+        _flattenArrays(arrays, 'glyphs', *_concatenatePartials([partial[2:] for partial in partials]))
+        arrays['meta'] = numpy.array([json.dumps({
+            'key': key,
+            'typeNames': self.typeNames,
+            'layerNames': self.layerNames,
+            'fullSeconds': self.fullSeconds,
+            'fullEntities': self.fullEntities,
+        })])
+        _savez(path, arrays)
+
+    @classmethod
+    def load(cls, path, key):
+        """
+            The index saved at path, None when missing, saved with another
+            key or unreadable, e.g. truncated, the conversion then converts
+            the whole file and saves a new index
+        """
+        if not os.path.isfile(path):
+            return None
+        try:
+            return cls._read(path, key)
+        except NPZ_READ_ERRORS as err:
+            warning_message('Cannot read entity index {0} ({1}), converting the whole file'.format(path, err))
+            return None
+
+    @classmethod
+    def _read(cls, path, key):
+        arrays = numpy.load(path)
+        try:
+            meta = json.loads(str(arrays['meta'][0]))
+            if meta['key'] != key:
+                return None
+
+            index = cls()
+            index.table = arrays['table']
+            index.typeNames = meta['typeNames']
+            index.layerNames = meta['layerNames']
+            index.fullSeconds = meta['fullSeconds']
+            index.fullEntities = meta['fullEntities']
+            index._numberOfRows = len(index.table)
+            index._bases = arrays['bases']
+            points, cells, _ = _unflattenArrays(arrays, 'blocks')
+            glyphPoints, glyphCells, _ = _unflattenArrays(arrays, 'glyphs')
+            index._partial = (points, _cellOffsets(cells), glyphPoints, _cellOffsets(glyphCells))
+        finally:
+            arrays.close()
+
+        # Look entities up by handle, leaving out those without one or sharing it
+        handles = index.table[:, _INDEX_HANDLE]
+        _, inverse, counts = numpy.unique(handles, return_inverse=True, return_counts=True)
+        rows = numpy.flatnonzero((handles >= 0) & (counts[inverse.ravel()] == 1))
+        index._handleRows = dict(zip(handles[rows].tolist(), rows.tolist()))
+
+        # The row whose output the output of each row follows in their block, -1 if none
+        index._follows = numpy.full(len(index.table), -1, dtype=numpy.int64)
+        blocks = index.table[:, _INDEX_BLOCK]
+        rows = numpy.flatnonzero(blocks >= 0)
+        rows = rows[numpy.argsort(blocks[rows], kind='mergesort')]
+        adjacent = ((blocks[rows[1:]] == blocks[rows[:-1]]) &
+                    (index.table[rows[1:], _INDEX_STARTS] == index.table[rows[:-1], _INDEX_ENDS]).all(axis=1))
+        index._follows[rows[1:][adjacent]] = rows[:-1][adjacent]
+        return index
+
+    def find(self, handle):
+        """Row of the entity with that handle, None if there is none"""
+        return self._handleRows.get(handle) if handle >= 0 else None
+
+    def numberOfHandles(self):
+        return len(self._handleRows)
+
+    def unchanged(self, row, digest):
+        return self.table[row, _INDEX_HASH] == digest
+
+    def reusable(self, row):
+        return self.table[row, _INDEX_BLOCK] >= 0
+
+    def follows(self, row, previousRow):
+        """Whether the output of row comes right after that of previousRow, so both are copied at once"""
+        return self._follows[row] == previousRow
+
+    def describe(self, row):
+        """The type, layer and color of the entity of a row"""
+        return (self.typeNames[self.table[row, _INDEX_TYPE]], self.layerNames[self.table[row, _INDEX_LAYER]],
+                int(self.table[row, _INDEX_COLOR]))
+
+    def copyOutput(self, builder, firstRow, lastRow):
+        """Append the output of the rows from firstRow to lastRow, consecutive in their block, to builder"""
+        points, cells, glyphPoints, glyphCells = self._partial
+        base = self._bases[self.table[firstRow, _INDEX_BLOCK]]
+        first = self.table[firstRow, _INDEX_STARTS]
+        start = first + base
+        end = self.table[lastRow, _INDEX_ENDS] + base
+
+        firstId = builder.insertPointArray(points[start[0]:end[0]])
+        for i, name in enumerate(('verts', 'lines', 'polys', 'strips'), 1):
+            if end[i] > start[i]:
+                sizes, connectivity, offsets = cells[name]
+                ids = connectivity[offsets[start[i]]:offsets[end[i]]]
+                getattr(builder, name).insertCells(sizes[start[i]:end[i]], ids + (firstId - first[0]))
+
+        if end[5] > start[5]:
+            glyph = {}
+            for i, name in enumerate(('verts', 'lines', 'polys', 'strips'), 6):
+                if end[i] > start[i]:
+                    sizes, connectivity, offsets = glyphCells[name]
+                    glyph[name] = (sizes[start[i]:end[i]], connectivity[offsets[start[i]]:offsets[end[i]]] - first[5])
+            builder.addGlyph(glyphPoints[start[5]:end[5]], glyph)
+
+
+def _concatenatePartials(partials):
+    """The (points, cells) of a list of them, one after another, point ids staying relative to each"""
+    empty = numpy.zeros(0, dtype=ID_TYPE)
+    points = numpy.concatenate([numpy.zeros((0, 3))] + [points for points, _ in partials])
+    cells = dict([(name, (numpy.concatenate([empty] + [cells[name][0] for _, cells in partials]),
+                          numpy.concatenate([empty] + [cells[name][1] for _, cells in partials])))
+                  for name in ('verts', 'lines', 'polys', 'strips')])
+    return points, cells
+
+
+def _cellOffsets(cells):
+    """Add to each (sizes, connectivity) of cells the offset of each cell in connectivity, and of the end"""
+    return dict([(name, (sizes, connectivity, numpy.concatenate([[0], numpy.cumsum(sizes)])))
+                 for name, (sizes, connectivity) in cells.items()])
+
+
+#------------------------------------------------------------------------------
+# Conversions of the ParaView reader, kept around between pipeline updates
+#------------------------------------------------------------------------------
+class ReaderEngine(object):
+    """
+        Converts files for PythonDXFReader with its DXFConverter, into
+        vtkMultiBlockDataSets.  Keeps the last outputs in memory, by file,
+        file modification time and options, and, with sidecar on, the
+        converted arrays in a sidecar next to the file.  conversion holds
+        what the conversion of the last output found out, and cacheHit
+        where that output came from.
+    """
+    def __init__(self):
+        self.converter = DXFConverter()
+        self.outputCache = collections.OrderedDict()
+        self.outputCacheSize = DEFAULT_OUTPUT_CACHE_SIZE
+        self.sidecar = False
+        self.mergeBlocks = False
+        self.cacheHit = None
+        self.conversion = {
+            'entityCounts': {},
+            'glyphCacheStatistics': (0, 0),
+            'weldStatistics': (0, 0),
+            'blockNames': [],
+            'layerIndex': None,
+            'statistics': None,
+        }
+
+    def setOutputCacheSize(self, size):
+        self.outputCacheSize = max(0, size)
+        while len(self.outputCache) > self.outputCacheSize:
+            self.outputCache.popitem(last=False)
+
+    def outputKey(self, filename):
+        """What the output depends on: the file, as last modified, and the options changing the output"""
+        converter = self.converter
+        return json.dumps([
+            os.path.abspath(filename), os.path.getmtime(filename), os.path.getsize(filename),
+            CONVERTER_VERSION, converter.rotateText, converter.streamEntities, converter.weldTolerance,
+            converter.origin, converter.collectStatistics, converter.includeLayers, converter.excludeLayers,
+            converter.splitLayers, converter.textMode, converter.blockMode, self.mergeBlocks,
+        ])
+
+    def read(self, filename):
+        """The vtkMultiBlockDataSet of the file, converted or reused"""
+        key = self.outputKey(filename)
+        cached = self.outputCache.pop(key, None)
+        if cached is not None:
+            self.cacheHit = 'memory'
+            multiBlock, self.conversion = cached
+        else:
+            conversion = None
+            path = sidecar_path(filename)
+            if self.sidecar:
+                conversion = read_sidecar(path, key)
+            self.cacheHit = 'sidecar' if conversion is not None else None
+            if conversion is None:
+                conversion = self.convert(filename)
+                if self.sidecar:
+                    try:
+                        write_sidecar(path, key, conversion)
+                    except (IOError, OSError) as err:
+                        warning_message('Cannot write the sidecar {0}: {1}'.format(path, err))
+
+            multiBlock = vtkMultiBlockDataSet()
+            self.buildOutput(multiBlock, conversion)
+            self.conversion = dict([(name, value) for name, value in conversion.items()
+                                    if name not in ('blocks', 'labels', 'instances', 'blockGeometries')])
+            self.conversion['weldStatistics'] = (0, 0)
+            for block in conversion['blocks']:
+                self.conversion['weldStatistics'] = addWeldStatistics(self.conversion['weldStatistics'],
+                                                                      block['weldStatistics'])
+
+        if self.outputCacheSize > 0:
+            self.outputCache[key] = (multiBlock, self.conversion)
+            while len(self.outputCache) > self.outputCacheSize:
+                self.outputCache.popitem(last=False)
+        return multiBlock
+
+    def convert(self, filename):
+        """
+            Convert the file, returns a dict of the arrays of its blocks,
+            labels, instances and inserted blocks along with what the
+            conversion found out, as saved in sidecars
+        """
+        converter = self.converter
+        entityColorsToBuilder = converter.convert(filename)
+
+        start = timeit.default_timer()
+        blocks = []
+        if self.mergeBlocks:
+            # A single block with the colors, and layers, of its cells
+            builders = list(entityColorsToBuilder.values())
+            dtype = numpy.float64 if converter.origin is None else numpy.float32
+            points, cells, cellCounts = mergeBuilders(builders, dtype)
+            ids, layerNames = layerIds([builder.layer for builder in builders])
+            weldStatistics = (0, 0)
+            for builder in builders:
+                weldStatistics = addWeldStatistics(weldStatistics, builder.weldStatistics)
+            blocks.append({
+                'color': None,
+                'layer': None,
+                'points': points,
+                'cells': cells,
+                'cellData': blockCellData(cellCounts, [builder.entityColor for builder in builders],
+                                          ids if converter.splitLayers else None),
+                'layerNames': layerNames if converter.splitLayers else None,
+                'weldStatistics': weldStatistics,
+            })
+            builders = None
+        else:
+            for builder in entityColorsToBuilder.values():
+                points, cells = builder.toArrays()
+                blocks.append({
+                    'color': builder.entityColor,
+                    'layer': builder.layer,
+                    'points': points,
+                    'cells': cells,
+                    'cellData': None,
+                    'layerNames': None,
+                    'weldStatistics': builder.weldStatistics,
+                })
+        entityColorsToBuilder = None
+
+        conversion = {
+            'blocks': blocks,
+            'origin': converter.origin,
+            'labels': converter.labels.toArrays() if converter.textMode == 'labels' else None,
+            'instances': converter.instances.toArrays() if converter.blockMode == 'instances' else None,
+            'blockNames': list(converter.instances.blockNames),
+            'blockGeometries': [blockArrays(name, converter.blockGeometries[name])[:2]
+                                for name in converter.instances.blockNames],
+            'entityCounts': dict(converter.entityCounts),
+            'glyphCacheStatistics': (converter.glyphCache.hits, converter.glyphCache.misses),
+            'layerIndex': converter.layerIndex,
+            'statistics': None,
+        }
+        if converter.statistics is not None:
+            converter.statistics.addStage('build', timeit.default_timer() - start)
+            conversion['statistics'] = converter.statistics.toDict()
+
+        return conversion
+
+    def buildOutput(self, output, conversion):
+        """Fill output with the blocks of a conversion, see convert()"""
+        start = timeit.default_timer()
+        origin = conversion['origin']
+        originData = collections.OrderedDict()
+        if origin is not None:
+            originData['Origin'] = numpy.array([origin], dtype=numpy.float64)
+
+        # Labels, instances and the blocks they place follow the color blocks
+        blocks = []
+        for block in conversion['blocks']:
+            fieldData = collections.OrderedDict()
+            if block['color'] is not None:
+                fieldData['EntityColor'] = numpy.array([block['color']], dtype=numpy.int16)
+            fieldData.update(originData)
+            if block['layerNames'] is not None:
+                fieldData['LayerNames'] = numpy.array(block['layerNames'], dtype='U')
+            blocks.append((block['layer'], arraysToPolyData(block['points'], block['cells'], fieldData,
+                                                            cellData=block['cellData'])))
+        numberOfBlocks = len(blocks)
+        if conversion['labels'] is not None:
+            points, cells, pointData = conversion['labels']
+            blocks.append(('Labels', arraysToPolyData(points, cells, originData, pointData)))
+        if conversion['instances'] is not None:
+            points, cells, pointData = conversion['instances']
+            fieldData = collections.OrderedDict(originData)
+            fieldData['BlockNames'] = numpy.array(conversion['blockNames'], dtype='U')
+            blocks.append(('Instances', arraysToPolyData(points, cells, fieldData, pointData)))
+            for name, (points, cells) in zip(conversion['blockNames'], conversion['blockGeometries']):
+                points, cells, fieldData = blockArrays(name, (points, cells))
+                blocks.append(('Block {0}'.format(name), arraysToPolyData(points, cells, fieldData)))
+
+        output.SetNumberOfBlocks(len(blocks))
+        for blockIdx, (name, polyData) in enumerate(blocks):
+            output.SetBlock(blockIdx, polyData)
+            if name is not None:
+                output.GetMetaData(blockIdx).Set(vtkCompositeDataSet.NAME(), name)
+
+        statistics = conversion['statistics']
+        if statistics is not None:
+            statistics['stages']['build'] = statistics['stages'].get('build', 0.0) + timeit.default_timer() - start
+            statisticsArray = vtkStringArray()
+            statisticsArray.SetName('ConversionStatistics')
+            statisticsArray.InsertNextValue(json.dumps(untimedStatistics(statistics), sort_keys=True))
+            for i in range(numberOfBlocks):
+                output.GetBlock(i).GetFieldData().AddArray(statisticsArray)
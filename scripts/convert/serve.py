@@ -0,0 +1,466 @@
+"""
+    Local mineplan asset server of the DXF to VTP converter.
+
+    Serves a directory of converted files, with the manifest written by the
+    converter (--manifest) or by watch.py, the way the mineplan API and its
+    blob storage serve them to the client.  This is for on-site deployments
+    without access to either, and for tests of the client:
+
+        python serve.py --directory /data/converted --port 8000
+
+    Then set the base URL of the client to http://host:8000/api.
+    GET /api/v1/mineplan returns the manifest as a mineplan, with the file
+    of each piece turned into a URL of the server, and the files are
+    served under /files/.  Responses carry strong ETags, derived from the
+    sha of the files in the manifest, and ask to be revalidated, so a
+    viewer loading an unchanged mine plan again only gets 304s.  Files
+    with a .gz or .br copy written at conversion time (--precompress) are
+    sent compressed to the clients accepting it.  Byte ranges of the files
+    can be requested, conditionally with If-Range.
+
+    Needs Python 3.7, for ThreadingHTTPServer.  tests/test_serve.py
+    serves a converted file on a free port and checks the responses.
+"""
+import email.utils, hashlib, http.client, http.server, json, os, sys, threading
+import urllib.parse
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import converter
+
+
+DEFAULT_PORT = 8000
+
+# Where the files of the pieces are served from
+FILES_PATH = '/files/'
+
+CONTENT_TYPES = {
+    '.vtp': 'text/xml',
+    '.json': 'application/json',
+    '.bin': 'application/octet-stream',
+}
+
+# Precompressed encodings, the best compressing first
+PREFERRED_ENCODINGS = ('br', 'gzip')
+
+# Sizes of the reads copying a file to a response
+COPY_CHUNK_SIZE = 1 << 20
+
+
+def _etag(sha, encoding=None):
+    """Strong ETag of a file with that sha, each encoding being a representation of its own"""
+    return '"{0}.{1}"'.format(sha, encoding) if encoding else '"{0}"'.format(sha)
+
+
+def _etagMatches(header, etag, weak=True):
+    """Whether an If-Match or If-None-Match header lists etag, comparing weakly for If-None-Match"""
+    for candidate in header.split(','):
+        candidate = candidate.strip()
+        if candidate == '*':
+            return True
+        if weak and candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def _acceptedEncodings(header):
+    """The content codings an Accept-Encoding header accepts, by quality, '*' standing for any other"""
+    accepted = {}
+    for item in (header or '').split(','):
+        parts = [part.strip() for part in item.split(';')]
+        if not parts[0]:
+            continue
+        quality = 1.0
+        for param in parts[1:]:
+            if param.startswith('q='):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        accepted[parts[0].lower()] = quality
+    return accepted
+
+
+def negotiateEncoding(header, available):
+    """The available precompressed encoding the Accept-Encoding header prefers, None for identity"""
+    accepted = _acceptedEncodings(header)
+    best, bestQuality = None, 0.0
+    for encoding in available:
+        quality = accepted.get(encoding, accepted.get('*', 0.0))
+        if quality > bestQuality:
+            best, bestQuality = encoding, quality
+    return best
+
+
+def parseRange(header, size):
+    """
+        The (start, end) byte offsets, end excluded, of a single range
+        Range header over a file of size bytes.  Returns None when the
+        header is invalid or asks for several ranges, in which case the
+        whole file is sent, and raises ValueError when the range is not
+        satisfiable.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, dash, last = spec.strip().partition('-')
+    if not dash or not (first or last) or not (first + last).isdigit():
+        return None
+
+    if not first:
+        # The last bytes of the file
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(spec)
+        return max(0, size - length), size
+
+    start = int(first)
+    end = min(size, int(last) + 1) if last else size
+    if start >= size or end <= start:
+        raise ValueError(spec)
+    return start, end
+
+
+class AssetIndex(object):
+    """
+        What the server knows of its directory: the manifest, reloaded when
+        it changes, and the sha of every file, taken from the manifest or
+        computed once per modification of the files it does not list.
+    """
+    def __init__(self, directory, manifestPath=None, mineplanPath=None):
+        self.directory = os.path.abspath(directory)
+        self.manifestPath = manifestPath or os.path.join(self.directory, 'manifest.json')
+        self.mineplanPath = mineplanPath
+        self._lock = threading.Lock()
+        self._manifest = None
+        self._manifestSignature = None
+        self._shas = {}
+        self._computedShas = {}
+
+    def _load(self):
+        """The manifest, reloaded when its file changed"""
+        try:
+            stat = os.stat(self.manifestPath)
+            signature = (stat.st_size, stat.st_mtime)
+        except OSError:
+            signature = None
+
+        with self._lock:
+            if signature != self._manifestSignature:
+                manifest = { 'pieces': [] }
+                if signature is not None:
+                    with open(self.manifestPath) as fp:
+                        manifest = json.load(fp)
+                shas = {}
+                self._collectShas(manifest, shas)
+                self._manifest, self._shas, self._manifestSignature = manifest, shas, signature
+            return self._manifest, self._shas
+
+    def _collectShas(self, value, shas):
+        """Gather the sha of every file entry, pieces and their levels of detail, layers, blocks..."""
+        if isinstance(value, dict):
+            if isinstance(value.get('file'), str) and value.get('sha'):
+                shas[value['file']] = value['sha']
+            for item in value.values():
+                self._collectShas(item, shas)
+        elif isinstance(value, list):
+            for item in value:
+                self._collectShas(item, shas)
+
+    def mineplan(self, baseUrl):
+        """The manifest as the response of the mineplan API, a list of one mineplan, with URLs of the files"""
+        manifest, _ = self._load()
+        pieces = []
+        for piece in manifest.get('pieces', []):
+            piece = dict(piece)
+            piece['file'] = '{0}{1}{2}'.format(baseUrl, FILES_PATH, urllib.parse.quote(piece['file']))
+            pieces.append(piece)
+
+        mineplan = {}
+        if self.mineplanPath:
+            with open(self.mineplanPath) as fp:
+                mineplan = json.load(fp)
+            if isinstance(mineplan, list):
+                mineplan = mineplan[0]
+        mineplan = dict(mineplan, pieces=pieces)
+        if 'boundaries' not in mineplan:
+            mineplan['boundaries'] = self._boundaries(pieces)
+        if 'categories' not in mineplan:
+            categories = []
+            for piece in pieces:
+                category = piece.get('category')
+                if category and category not in categories:
+                    categories.append(category)
+            mineplan['categories'] = [{ 'name': name, 'label': name.capitalize() } for name in categories]
+        return [mineplan]
+
+    def _boundaries(self, pieces):
+        """Union of the bounds of the pieces, in drawing coordinates"""
+        boundaries = [1.0, -1.0, 1.0, -1.0, 1.0, -1.0]
+        for piece in pieces:
+            bounds = piece.get('bounds')
+            if not bounds or bounds[0] > bounds[1]:
+                continue
+            origin = (piece.get('extra_json_attributes') or {}).get('origin') or [0.0, 0.0, 0.0]
+            bounds = [b + origin[i // 2] for i, b in enumerate(bounds)]
+            if boundaries[0] > boundaries[1]:
+                boundaries = bounds
+            else:
+                boundaries = [min(a, b) if i % 2 == 0 else max(a, b)
+                              for i, (a, b) in enumerate(zip(boundaries, bounds))]
+        return boundaries
+
+    def path(self, name):
+        """Path of a file of the directory by name, None for anything else"""
+        if not name or name.startswith('.') or '/' in name or '\\' in name:
+            return None
+        path = os.path.join(self.directory, name)
+        return path if os.path.isfile(path) else None
+
+    def sha(self, name, path):
+        """The sha of a file, from the manifest when it lists the file"""
+        _, shas = self._load()
+        if name in shas:
+            return shas[name]
+        stat = os.stat(path)
+        signature = (stat.st_size, stat.st_mtime)
+        with self._lock:
+            cached = self._computedShas.get(name)
+        if cached is None or cached[0] != signature:
+            cached = (signature, converter.file_sha256(path))
+            with self._lock:
+                self._computedShas[name] = cached
+        return cached[1]
+
+
+class AssetRequestHandler(http.server.BaseHTTPRequestHandler):
+    """Serves the mineplan of the AssetIndex of the server, and the files of its directory"""
+    protocol_version = 'HTTP/1.1'
+    server_version = 'MineplanAssetServer/1.0'
+
+    def do_OPTIONS(self):
+        # Preflight of the cross-origin requests of the client, which send an Authorization
+        self.send_response(204)
+        self._sendCommonHeaders()
+        self.send_header('Access-Control-Allow-Methods', 'GET, HEAD, OPTIONS')
+        self.send_header('Access-Control-Allow-Headers',
+                         'Authorization, Range, If-None-Match, If-Modified-Since, If-Range')
+        self.send_header('Access-Control-Max-Age', '86400')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def do_GET(self):
+        self._serve(sendBody=True)
+
+    def do_HEAD(self):
+        self._serve(sendBody=False)
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            http.server.BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def _sendCommonHeaders(self):
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Access-Control-Expose-Headers',
+                         'ETag, Content-Encoding, Content-Length, Content-Range, Accept-Ranges')
+
+    def _serve(self, sendBody):
+        path = urllib.parse.urlsplit(self.path).path
+        if path.rstrip('/').endswith('/v1/mineplan'):
+            self._serveMineplan(sendBody)
+        elif path.startswith(FILES_PATH):
+            self._serveFile(urllib.parse.unquote(path[len(FILES_PATH):]), sendBody)
+        else:
+            self._sendError(404, 'Not found: {0}'.format(path), sendBody)
+
+    def _baseUrl(self):
+        host = self.headers.get('Host') or '{0}:{1}'.format(*self.server.server_address[:2])
+        return 'http://{0}'.format(host)
+
+    def _serveMineplan(self, sendBody):
+        body = json.dumps(self.server.index.mineplan(self._baseUrl()), sort_keys=True).encode('utf-8')
+        etag = _etag(hashlib.sha256(body).hexdigest())
+        if _etagMatches(self.headers.get('If-None-Match', ''), etag):
+            self._sendNotModified(etag)
+            return
+
+        self.send_response(200)
+        self._sendCommonHeaders()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if sendBody:
+            self.wfile.write(body)
+
+    def _serveFile(self, name, sendBody):
+        index = self.server.index
+        path = index.path(name)
+        if path is None:
+            self._sendError(404, 'No such file: {0}'.format(name), sendBody)
+            return
+
+        available = [encoding for encoding in PREFERRED_ENCODINGS
+                     if os.path.isfile(converter.precompressed_path(path, encoding))]
+        encoding = negotiateEncoding(self.headers.get('Accept-Encoding'), available)
+        sentPath = converter.precompressed_path(path, encoding) if encoding else path
+        etag = _etag(index.sha(name, path), encoding)
+        stat = os.stat(sentPath)
+        size = stat.st_size
+        lastModified = email.utils.formatdate(stat.st_mtime, usegmt=True)
+
+        # Preconditions, in the order of RFC 7232
+        ifMatch = self.headers.get('If-Match')
+        if ifMatch is not None and not _etagMatches(ifMatch, etag, weak=False):
+            self._sendError(412, 'Precondition failed', sendBody)
+            return
+        ifNoneMatch = self.headers.get('If-None-Match')
+        if ifNoneMatch is not None:
+            if _etagMatches(ifNoneMatch, etag):
+                self._sendNotModified(etag, lastModified)
+                return
+        elif self._notModifiedSince(stat.st_mtime):
+            self._sendNotModified(etag, lastModified)
+            return
+
+        start, end = 0, size
+        status = 200
+        rangeHeader = self.headers.get('Range')
+        if rangeHeader and self._ifRangeHolds(etag, lastModified):
+            try:
+                byteRange = parseRange(rangeHeader, size)
+            except ValueError:
+                self.send_response(416)
+                self._sendCommonHeaders()
+                self.send_header('Content-Range', 'bytes */{0}'.format(size))
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            if byteRange is not None:
+                start, end = byteRange
+                status = 206
+
+        self.send_response(status)
+        self._sendCommonHeaders()
+        contentType = CONTENT_TYPES.get(os.path.splitext(name)[1].lower(), 'application/octet-stream')
+        self.send_header('Content-Type', contentType)
+        self.send_header('Content-Length', str(end - start))
+        if status == 206:
+            self.send_header('Content-Range', 'bytes {0}-{1}/{2}'.format(start, end - 1, size))
+        if encoding:
+            self.send_header('Content-Encoding', encoding)
+        self.send_header('Vary', 'Accept-Encoding')
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', lastModified)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+        if not sendBody:
+            return
+
+        with open(sentPath, 'rb') as fp:
+            fp.seek(start)
+            remaining = end - start
+            while remaining > 0:
+                chunk = fp.read(min(COPY_CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                self.wfile.write(chunk)
+                remaining -= len(chunk)
+
+    def _notModifiedSince(self, mtime):
+        header = self.headers.get('If-Modified-Since')
+        if not header:
+            return False
+        try:
+            since = email.utils.parsedate_to_datetime(header).timestamp()
+        except (TypeError, ValueError, IndexError):
+            return False
+        return int(mtime) <= since
+
+    def _ifRangeHolds(self, etag, lastModified):
+        """Whether to honor the Range header: no If-Range, or one naming the representation sent"""
+        ifRange = self.headers.get('If-Range')
+        if not ifRange:
+            return True
+        if ifRange.startswith('"') or ifRange.startswith('W/'):
+            return ifRange == etag
+        return ifRange == lastModified
+
+    def _sendNotModified(self, etag, lastModified=None):
+        self.send_response(304)
+        self._sendCommonHeaders()
+        self.send_header('ETag', etag)
+        if lastModified:
+            self.send_header('Last-Modified', lastModified)
+        self.send_header('Cache-Control', 'no-cache')
+        self.end_headers()
+
+    def _sendError(self, status, message, sendBody):
+        body = json.dumps({ 'detail': message }).encode('utf-8')
+        self.send_response(status)
+        self._sendCommonHeaders()
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        if sendBody:
+            self.wfile.write(body)
+
+
+class AssetServer(http.server.ThreadingHTTPServer):
+    """HTTP server of an AssetIndex, one thread per connection"""
+    daemon_threads = True
+
+    def __init__(self, index, host='127.0.0.1', port=DEFAULT_PORT, quiet=False):
+        http.server.ThreadingHTTPServer.__init__(self, (host, port), AssetRequestHandler)
+        self.index = index
+        self.quiet = quiet
+
+    @property
+    def url(self):
+        """Base URL of the API, to configure the client with"""
+        return 'http://{0}:{1}/api'.format(*self.server_address[:2])
+
+
+def start_server(directory, host='127.0.0.1', port=0, manifestPath=None, mineplanPath=None, quiet=True):
+    """
+        Serve directory from a background thread, on a free port by default,
+        for tests standing the server in for the remote API.  Returns the
+        AssetServer, shutdown() stops it.
+    """
+    server = AssetServer(AssetIndex(directory, manifestPath, mineplanPath), host, port, quiet)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Mineplan asset server of converted DXF files")
+    parser.add_argument('--directory', default=None, help="Directory of the converted files and their manifest")
+    parser.add_argument('--manifest', default=None,
+                        help="Path to the manifest of the files (default: manifest.json in --directory)")
+    parser.add_argument('--mineplan', default=None,
+                        help="Mineplan JSON giving the boundaries and categories (default: derived from the pieces)")
+    parser.add_argument('--host', default='127.0.0.1', help="Address to listen on, 0.0.0.0 for every interface")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help="Port to listen on")
+    parser.add_argument('--quiet', action='store_true', help="Do not log requests")
+    args = parser.parse_args()
+
+    if not args.directory:
+        parser.error('--directory is required')
+
+    server = AssetServer(AssetIndex(args.directory, args.manifest, args.mineplan), args.host, args.port, args.quiet)
+    print('Serving {0} at {1}'.format(args.directory, server.url))
+    sys.stdout.flush()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
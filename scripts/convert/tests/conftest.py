@@ -0,0 +1,15 @@
+import os, sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import benchmark
+
+
+@pytest.fixture
+def dxf_file(tmp_path):
+    """A generated DXF file of line work, 3DFACE entities and polyface shells, without text so VTK is not needed"""
+    path = str(tmp_path / 'lev1.dxf')
+    benchmark.generate_dxf(path, polylines=200, lwpolylines=200, lines=400, faces=50, shells=2, shell_size=6)
+    return path
@@ -0,0 +1,75 @@
+import numpy
+import pytest
+
+import engine
+
+
+def writeDXF(path, blocks, entities):
+    """Write the group codes of blocks and entities, lists of (code, value), as an ascii DXF file"""
+    tags = [(0, 'SECTION'), (2, 'BLOCKS')] + blocks + [(0, 'ENDSEC'), (0, 'SECTION'), (2, 'ENTITIES')] + \
+        entities + [(0, 'ENDSEC'), (0, 'EOF')]
+    with open(path, 'w') as fp:
+        fp.write(''.join(['{0:>3}\n{1}\n'.format(code, value) for code, value in tags]))
+
+
+def line(start, end, color=1):
+    return [(0, 'LINE'), (8, 'A'), (62, color), (10, start[0]), (20, start[1]), (30, 0.0),
+            (11, end[0]), (21, end[1]), (31, 0.0)]
+
+
+def insert(name, position, rotation=0.0, columns=1, columnSpacing=0.0, color=1):
+    return [(0, 'INSERT'), (8, 'A'), (62, color), (2, name), (10, position[0]), (20, position[1]), (30, 0.0),
+            (50, rotation), (70, columns), (44, columnSpacing)]
+
+
+@pytest.fixture
+def block_file(tmp_path):
+    """A block of two lines from its base point (1, 1), inserted twice, once rotated in two columns"""
+    path = str(tmp_path / 'blocks.dxf')
+    blocks = [(0, 'BLOCK'), (8, '0'), (2, 'DRILL'), (70, 0), (10, 1.0), (20, 1.0), (30, 0.0)] + \
+        line((1, 1), (2, 1)) + line((2, 1), (2, 2)) + [(0, 'ENDBLK'), (8, '0')]
+    entities = insert('DRILL', (10, 20)) + insert('DRILL', (30, 20), rotation=90.0, columns=2, columnSpacing=5.0) + \
+        line((5, 20), (10, 20)) + insert('MISSING', (0, 0))
+    writeDXF(path, blocks, entities)
+    return path
+
+
+def test_expanded_blocks_are_line_work(block_file):
+    converter = engine.DXFConverter(blockMode='expand', weldTolerance=0.0, collectStatistics=True)
+    builder = converter.convert(block_file)[1]
+    assert builder.getCounts()[5] == 0
+    points, cells = builder.toArrays()
+
+    # Three copies of two lines of two points, and the LINE ending at the first copy
+    assert builder.weldStatistics == (14, 10)
+    assert points.dtype == numpy.float32
+    assert cells['lines'][0].tolist() == [2] * 7
+    segments = set([tuple(map(tuple, points[cells['lines'][1][i:i + 2]].round(6).tolist()))
+                    for i in range(0, 14, 2)])
+    assert ((10, 20, 0), (11, 20, 0)) in segments and ((11, 20, 0), (11, 21, 0)) in segments
+    assert ((30, 20, 0), (30, 21, 0)) in segments and ((30, 21, 0), (29, 21, 0)) in segments
+    assert ((30, 25, 0), (30, 26, 0)) in segments
+    assert ((5, 20, 0), (10, 20, 0)) in segments
+    events = converter.statistics.toDict()['events']
+    assert (events['inserts'], events['unknownBlockInserts']) == (2, 1)
+
+
+def test_instances(block_file):
+    converter = engine.DXFConverter(blockMode='instances')
+    builders = converter.convert(block_file)
+    assert builders[1].toArrays()[1]['lines'][0].tolist() == [2]
+
+    points, cells, pointData = converter.instances.toArrays()
+    assert points.tolist() == [[10, 20, 0], [30, 20, 0]]
+    assert cells['verts'][1].tolist() == [0, 1]
+    assert converter.instances.blockNames == ['DRILL']
+    assert pointData['BlockId'].tolist() == [0, 0]
+    assert pointData['Rotation'].tolist() == [0, 90]
+    assert pointData['Columns'].tolist() == [1, 2]
+    assert pointData['ColumnSpacing'].tolist() == [0, 5]
+    assert pointData['EntityColor'].tolist() == [1, 1]
+
+    # Relative to the base point of the block
+    blockPoints, blockCells = converter.blockGeometry('DRILL')
+    assert blockPoints.tolist() == [[0, 0, 0], [1, 0, 0], [1, 0, 0], [1, 1, 0]]
+    assert blockCells['lines'][1].tolist() == [0, 1, 2, 3]
@@ -0,0 +1,98 @@
+import numpy
+import pytest
+
+import engine
+
+pytestmark = pytest.mark.skipif(not engine.HAVE_VTK, reason='building vtkPolyData needs VTK')
+
+
+class Entity(object):
+    def __init__(self, dxftype, **attributes):
+        self.dxftype = dxftype
+        self.__dict__.update(attributes)
+
+
+def entities(seed=0):
+    """Random line work of every type handled point by point before the bulk builder"""
+    rand = numpy.random.RandomState(seed)
+    result = []
+    for i in range(60):
+        coords = [tuple(p) for p in rand.uniform(-1e6, 1e6, (rand.randint(2, 9), 3))]
+        kind = i % 4
+        if kind == 0:
+            result.append(Entity('POLYLINE', points=coords))
+        elif kind == 1:
+            result.append(Entity('LWPOLYLINE', points=[p[:2] for p in coords], elevation=coords[0][2],
+                                 is_closed=bool(i % 3)))
+        elif kind == 2:
+            result.append(Entity('LINE', start=coords[0], end=coords[1]))
+        else:
+            result.append(Entity('POINT', point=coords[0]))
+    return result
+
+
+HANDLERS = {
+    'POLYLINE': engine.handlePolyLine,
+    'LWPOLYLINE': engine.handleLWPolyLine,
+    'LINE': engine.handleLine,
+    'POINT': engine.handlePoint,
+}
+
+
+def perPointPolyData(entities):
+    """The block as the reader built it before, one InsertNextPoint and InsertCellPoint at a time"""
+    polyData = engine.createPolyData(1)
+    points = polyData.GetPoints()
+    points.SetDataTypeToDouble()
+    for entity in entities:
+        if entity.dxftype == 'POINT':
+            polyData.GetVerts().InsertNextCell(1)
+            polyData.GetVerts().InsertCellPoint(points.InsertNextPoint(entity.point))
+            continue
+        if entity.dxftype == 'LWPOLYLINE':
+            coords = [(p[0], p[1], entity.elevation) for p in entity.points]
+        elif entity.dxftype == 'LINE':
+            coords = [entity.start, entity.end]
+        else:
+            coords = entity.points
+        ids = [points.InsertNextPoint(p) for p in coords]
+        if getattr(entity, 'is_closed', False):
+            ids.append(ids[0])
+        polyData.GetLines().InsertNextCell(len(ids))
+        for pid in ids:
+            polyData.GetLines().InsertCellPoint(pid)
+    return polyData
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_build_matches_per_point_insertion(seed):
+    builder = engine.PolyDataBuilder(1, doublePrecision=True)
+    for entity in entities(seed):
+        HANDLERS[entity.dxftype](entity, builder)
+    built = builder.build()
+    expected = perPointPolyData(entities(seed))
+
+    points, cells = engine.polyDataToNumpy(built)
+    expectedPoints, expectedCells = engine.polyDataToNumpy(expected)
+    assert numpy.array_equal(points, expectedPoints)
+    assert sorted(cells) == sorted(expectedCells) == ['lines', 'verts']
+    for name in cells:
+        assert numpy.array_equal(cells[name][0], expectedCells[name][0])
+        assert numpy.array_equal(cells[name][1], expectedCells[name][1])
+    assert built.GetFieldData().GetArray('EntityColor').GetValue(0) == 1
+
+
+def test_create_cell_array_round_trip():
+    sizes = numpy.array([2, 5, 1, 3], dtype=engine.ID_TYPE)
+    connectivity = numpy.arange(sizes.sum(), dtype=engine.ID_TYPE)[::-1].copy()
+    cells = engine.createCellArray(sizes, connectivity)
+    assert cells.GetNumberOfCells() == 4
+
+    roundTrip = engine.cellArrayToNumpy(cells)
+    assert roundTrip[0].tolist() == sizes.tolist()
+    assert roundTrip[1].tolist() == connectivity.tolist()
+
+
+def test_create_cell_array_empty():
+    empty = numpy.zeros(0, dtype=engine.ID_TYPE)
+    assert engine.createCellArray(empty, empty).GetNumberOfCells() == 0
@@ -0,0 +1,44 @@
+import json, os, shutil, subprocess, sys
+
+CLI_SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'cli.py')
+
+
+def run(*args):
+    return subprocess.check_output([sys.executable, CLI_SCRIPT] + list(args), universal_newlines=True)
+
+
+def readStatistics(path):
+    with open(path) as fp:
+        return json.load(fp)
+
+
+def test_statistics_of_cached_conversion(dxf_file, tmp_path):
+    cache = str(tmp_path / 'cache')
+    statistics = str(tmp_path / 'stats.json')
+    output = str(tmp_path / 'lev1.vtp')
+
+    run('--input-file', dxf_file, '--output-file', output, '--cache-dir', cache, '--statistics', statistics)
+    assert readStatistics(statistics)['entityTypes']['LINE']['count'] == 400
+
+    printed = run('--input-file', dxf_file, '--output-file', output, '--cache-dir', cache, '--statistics', statistics)
+    assert readStatistics(statistics) == { 'cached': True }
+    assert '{"cached": true}' in printed
+
+
+def test_statistics_of_cached_batch_conversion(dxf_file, tmp_path):
+    inputDir = tmp_path / 'drop'
+    inputDir.mkdir()
+    shutil.copyfile(dxf_file, str(inputDir / 'lev1.dxf'))
+    args = ['--input-dir', str(inputDir), '--output-dir', str(tmp_path / 'out'), '--jobs', '1',
+            '--cache-dir', str(tmp_path / 'cache'), '--statistics', str(tmp_path / 'stats.json')]
+    run(*args)
+
+    shutil.copyfile(dxf_file, str(inputDir / 'lev2.dxf'))
+    with open(str(inputDir / 'lev2.dxf'), 'a') as fp:
+        fp.write('\n')
+    printed = run(*args)
+    statistics = readStatistics(str(tmp_path / 'stats.json'))
+    assert sorted(statistics) == [str(inputDir / 'lev1.dxf'), str(inputDir / 'lev2.dxf')]
+    assert statistics[str(inputDir / 'lev1.dxf')] == { 'cached': True }
+    assert statistics[str(inputDir / 'lev2.dxf')]['entityTypes']['LINE']['count'] == 400
+    assert '1 files were copied from the conversion cache' in printed
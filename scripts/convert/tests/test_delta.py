@@ -0,0 +1,77 @@
+import os
+
+import converter
+
+DELTA_OPTIONS = converter.DEFAULT_CONVERSION_OPTIONS._replace(delta=True)
+
+
+def readEntities(path):
+    """The lines of the file before, in and after its ENTITIES section, the entities as lists of lines"""
+    with open(path) as fp:
+        lines = fp.read().split('\n')
+    start = lines.index('ENTITIES') + 1
+    end = start
+    while not (lines[end].strip() == '0' and lines[end + 1] == 'ENDSEC'):
+        end += 1
+    entities = []
+    for i in range(start, end, 2):
+        if lines[i].strip() == '0' and lines[i + 1] not in ('VERTEX', 'SEQEND'):
+            entities.append([])
+        entities[-1].extend(lines[i:i + 2])
+    return lines[:start], entities, lines[end:]
+
+
+def writeEntities(path, head, entities, tail):
+    with open(path, 'w') as fp:
+        fp.write('\n'.join(head + [line for entity in entities for line in entity] + tail))
+
+
+def revise(path):
+    """Move a point of the first LINE, remove the second entity and add a copy of the third with a new handle"""
+    head, entities, tail = readEntities(path)
+    line = next(entity for entity in entities if entity[1] == 'LINE')
+    x = line.index(' 10') + 1
+    line[x] = repr(float(line[x]) + 1.5)
+    del entities[1]
+    copy = list(entities[2])
+    copy[copy.index('  5') + 1] = 'FFFFF'
+    entities.append(copy)
+    writeEntities(path, head, entities, tail)
+
+
+def test_delta_conversion_gives_the_full_conversion(dxf_file, tmp_path):
+    deltaOutput = str(tmp_path / 'delta' / 'lev1.vtp')
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(weld_tolerance=0.01, cell_colors=True)
+
+    first = converter.dxf_to_vtp(dxf_file, deltaOutput, options._replace(delta=True))
+    assert os.path.isfile(converter.entity_index_path(deltaOutput))
+    assert first['sha'] == converter.dxf_to_vtp(dxf_file, str(tmp_path / 'full0.vtp'), options)['sha']
+
+    revise(dxf_file)
+    delta = converter.dxf_to_vtp(dxf_file, deltaOutput, options._replace(delta=True))
+    full = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'full1.vtp'), options)
+
+    assert delta['sha'] == full['sha']
+    assert delta['entityCounts'] == full['entityCounts']
+    counts = delta['delta']
+    assert (counts['added'], counts['changed'], counts['removed']) == (1, 1, 1)
+    assert counts['reused'] == sum(full['entityCounts'].values()) - 2
+    assert counts['converted'] == 2
+
+
+def test_unchanged_file_reuses_every_entity(dxf_file, tmp_path):
+    output = str(tmp_path / 'lev1.vtp')
+    first = converter.dxf_to_vtp(dxf_file, output, DELTA_OPTIONS)
+    again = converter.dxf_to_vtp(dxf_file, output, DELTA_OPTIONS)
+    assert again['sha'] == first['sha']
+    assert again['delta']['converted'] == 0
+
+
+def test_unreadable_index_converts_the_whole_file(dxf_file, tmp_path):
+    output = str(tmp_path / 'lev1.vtp')
+    first = converter.dxf_to_vtp(dxf_file, output, DELTA_OPTIONS)
+    with open(converter.entity_index_path(output), 'wb') as fp:
+        fp.write(b'PK\x03\x04 truncated')
+    again = converter.dxf_to_vtp(dxf_file, output, DELTA_OPTIONS)
+    assert again['sha'] == first['sha']
+    assert again['delta']['reused'] == 0
@@ -0,0 +1,67 @@
+import numpy
+import pytest
+
+import benchmark
+import converter
+import engine
+
+
+@pytest.fixture
+def text_dxf_file(tmp_path):
+    """A generated DXF file of line work, TEXT and MTEXT entities"""
+    path = str(tmp_path / 'lev1.dxf')
+    benchmark.generate_dxf(path, polylines=50, lwpolylines=50, lines=100, texts=30, mtexts=20)
+    return path
+
+
+def expectedLabels(path):
+    """The text, position, alignment and color of the TEXT and MTEXT entities of a file, in file order"""
+    labels = []
+    for entity in engine.iterDXFEntities(path):
+        if entity.dxftype == 'TEXT':
+            labels.append((entity.text, entity.align_point or entity.insert,
+                           engine.textAlignment(entity.halign, entity.valign), entity.color))
+        elif entity.dxftype == 'MTEXT':
+            labels.append((entity.raw_text, entity.insert, entity.attachment_point, entity.color))
+    return labels
+
+
+def test_text_becomes_labeled_points(text_dxf_file):
+    dxfConverter = engine.DXFConverter(textMode='labels')
+    builders = dxfConverter.convert(text_dxf_file)
+    # No glyph is drawn in the color blocks
+    assert sum([builder.getCounts()[5] for builder in builders.values()]) == 0
+
+    points, cells, pointData = dxfConverter.labels.toArrays()
+    expected = expectedLabels(text_dxf_file)
+    assert len(expected) == 50
+    assert pointData['Text'].tolist() == [text for text, _, _, _ in expected]
+    assert numpy.array_equal(points, numpy.array([position for _, position, _, _ in expected]))
+    assert pointData['Alignment'].tolist() == [alignment for _, _, alignment, _ in expected]
+    assert pointData['EntityColor'].tolist() == [color for _, _, _, color in expected]
+    assert cells['verts'][1].tolist() == list(range(50))
+
+
+def test_labels_file(text_dxf_file, tmp_path):
+    origin = (651450.0, 4767432.0, 0.0)
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(text_mode='labels', origin=origin)
+    stats = converter.dxf_to_vtp(text_dxf_file, str(tmp_path / 'lev1.vtp'), options)
+    assert stats['labels']['labels'] == 50
+    assert stats['labels']['output'] == converter.labels_path(stats['output'])
+    assert stats['skippedText'] == 0
+    assert converter.mineplan_piece(stats)['labels'] == 'lev1.labels.vtp'
+
+    # Written relative to the origin, like the line work
+    pytest.importorskip('vtkmodules')
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+
+    vtpReader = vtkXMLPolyDataReader()
+    vtpReader.SetFileName(stats['labels']['output'])
+    vtpReader.Update()
+    polyData = vtpReader.GetOutput()
+    points = numpy_support.vtk_to_numpy(polyData.GetPoints().GetData())
+    expected = numpy.array([position for _, position, _, _ in expectedLabels(text_dxf_file)]) - origin
+    assert points.dtype == numpy.float32
+    assert numpy.allclose(points, expected, atol=1e-2)
+    assert polyData.GetPointData().GetAbstractArray('Text').GetNumberOfValues() == 50
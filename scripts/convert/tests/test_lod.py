@@ -0,0 +1,124 @@
+import numpy
+import pytest
+
+import converter
+
+
+def recursiveSimplify(coords, tolerance):
+    """Textbook recursive Douglas-Peucker, the indices of the points kept"""
+    first, last = coords[0], coords[-1]
+    if len(coords) < 3:
+        return list(range(len(coords)))
+    chord = last - first
+    length = numpy.sqrt((chord * chord).sum())
+    offsets = coords[1:-1] - first
+    if length > 0:
+        distances = numpy.sqrt((numpy.cross(offsets, chord) ** 2).sum(axis=1)) / length
+    else:
+        distances = numpy.sqrt((offsets * offsets).sum(axis=1))
+    farthest = int(numpy.argmax(distances)) + 1
+    if distances[farthest - 1] <= tolerance:
+        return [0, len(coords) - 1]
+    left = recursiveSimplify(coords[:farthest + 1], tolerance)
+    right = recursiveSimplify(coords[farthest:], tolerance)
+    return left[:-1] + [farthest + i for i in right]
+
+
+def crossings(points, sizes, connectivity):
+    """The pairs of segments of the polylines crossing in plan view, other than at their ends"""
+    ends = numpy.cumsum(sizes)
+    segments = [(connectivity[i], connectivity[i + 1]) for start, end in zip(ends - sizes, ends)
+                for i in range(start, end - 1)]
+
+    def orientation(a, b, c):
+        return numpy.sign((b[0] - a[0]) * (c[1] - a[1]) - (b[1] - a[1]) * (c[0] - a[0]))
+
+    found = []
+    for i, (a, b) in enumerate(segments):
+        for j, (c, d) in enumerate(segments[:i]):
+            p, q, r, s = points[a], points[b], points[c], points[d]
+            if orientation(p, q, r) * orientation(p, q, s) < 0 and orientation(r, s, p) * orientation(r, s, q) < 0:
+                found.append((j, i))
+    return found
+
+
+@pytest.mark.parametrize('tolerance', [0.5, 2.0, 8.0])
+@pytest.mark.parametrize('seed', range(3))
+def test_matches_recursive_douglas_peucker(seed, tolerance):
+    # Lines going one way in x, on levels far apart, never cross, so only
+    # the Douglas-Peucker pass applies
+    rand = numpy.random.RandomState(seed)
+    lines = []
+    for level in range(20):
+        count = rand.randint(2, 60)
+        x = numpy.cumsum(rand.uniform(0.1, 3, count))
+        lines.append(numpy.column_stack([x, rand.normal(0, 3, count), numpy.full(count, 100.0 * level)]))
+    points = numpy.concatenate(lines)
+    sizes = numpy.array([len(line) for line in lines], dtype=converter.ID_TYPE)
+    connectivity = numpy.arange(len(points), dtype=converter.ID_TYPE)
+
+    simplifiedSizes, simplified = converter.simplifyLines(points, sizes, connectivity, tolerance)
+    expected = []
+    offset = 0
+    for line in lines:
+        expected.extend([offset + i for i in recursiveSimplify(line, tolerance)])
+        offset += len(line)
+    assert simplified.tolist() == expected
+    assert simplifiedSizes.tolist() == [len(recursiveSimplify(line, tolerance)) for line in lines]
+
+
+def test_near_parallel_lines_do_not_cross():
+    # The small bump of the first line is within tolerance of its chord,
+    # the large one of the second line reaches into it from below
+    points = numpy.array([
+        [0, 0, 0], [4, 0, 0], [5, 0.8, 0], [6, 0, 0], [10, 0, 0],
+        [0, -1, 0], [4.5, -1, 0], [5, 0.3, 0], [5.5, -1, 0], [10, -1, 0],
+    ], dtype=numpy.float64)
+    sizes = numpy.array([5, 5], dtype=converter.ID_TYPE)
+    connectivity = numpy.arange(10, dtype=converter.ID_TYPE)
+    assert crossings(points, sizes, connectivity) == []
+
+    simplifiedSizes, simplified = converter.simplifyLines(points, sizes, connectivity, 0.9)
+    assert crossings(points, simplifiedSizes, simplified) == []
+    assert 2 in simplified.tolist()
+    assert simplifiedSizes.sum() < 10
+
+
+def test_self_crossing_is_not_introduced():
+    # Without the first corners, the line would cut through its last segment
+    points = numpy.array([[7, 4, 0], [9, 8, 0], [9, 5, 0], [6, 0, 0], [3, 3, 0], [5, 1, 0], [8, 5, 0]],
+                         dtype=numpy.float64)
+    sizes = numpy.array([7], dtype=converter.ID_TYPE)
+    connectivity = numpy.arange(7, dtype=converter.ID_TYPE)
+    assert crossings(points, sizes, connectivity) == []
+    assert crossings(points, [5], numpy.array([0, 3, 4, 5, 6])) != []
+
+    simplifiedSizes, simplified = converter.simplifyLines(points, sizes, connectivity, 2.0)
+    assert crossings(points, simplifiedSizes, simplified) == []
+
+
+def test_lines_on_other_levels_may_cross():
+    # Lines crossing in plan view but on levels far apart are simplified alone
+    points = numpy.array([
+        [0, 0, 0], [4, 0, 0], [5, 0.8, 0], [6, 0, 0], [10, 0, 0],
+        [0, -1, 50], [4.5, -1, 50], [5, 0.3, 50], [5.5, -1, 50], [10, -1, 50],
+    ], dtype=numpy.float64)
+    sizes = numpy.array([5, 5], dtype=converter.ID_TYPE)
+    connectivity = numpy.arange(10, dtype=converter.ID_TYPE)
+    simplifiedSizes, simplified = converter.simplifyLines(points, sizes, connectivity, 0.9)
+    assert simplified.tolist() == [0, 4, 5, 6, 7, 8, 9]
+
+
+def test_random_line_work_crosses_no_more():
+    rand = numpy.random.RandomState(0)
+    lines = [rand.uniform(0, 20, 2) + numpy.cumsum(rand.uniform(-1, 1, (rand.randint(2, 15), 2)), axis=0)
+             for _ in range(40)]
+    points = numpy.column_stack([numpy.concatenate(lines), numpy.zeros(sum(map(len, lines)))])
+    sizes = numpy.array([len(line) for line in lines], dtype=converter.ID_TYPE)
+    connectivity = numpy.arange(len(points), dtype=converter.ID_TYPE)
+    before = len(crossings(points, sizes, connectivity))
+
+    simplifiedSizes, simplified = converter.simplifyLines(points, sizes, connectivity, 1.0)
+    # Segments which crossed before may only be left with fewer crossings
+    assert len(crossings(points, simplifiedSizes, simplified)) <= before
+    assert simplifiedSizes.sum() < len(points)
@@ -0,0 +1,60 @@
+import numpy
+import pytest
+
+import converter
+import engine
+
+
+@pytest.mark.parametrize('weldTolerance, origin', [(None, None), (0.01, None), (0.01, (651450.0, 4767432.0, 0.0))])
+def test_single_pass_matches_append(dxf_file, weldTolerance, origin):
+    dtype = numpy.float64 if origin is None else numpy.float32
+
+    def convert():
+        dxfConverter = engine.DXFConverter(weldTolerance=weldTolerance, origin=origin, splitLayers=True)
+        return list(dxfConverter.convert(dxf_file).values())
+
+    blocks = [builder.toArrays() for builder in convert()]
+    expectedPoints, expectedCells = engine.appendBlocks(blocks, dtype)
+    builders = convert()
+    points, cells, cellCounts = engine.mergeBuilders(builders, dtype)
+
+    assert points.dtype == expectedPoints.dtype and numpy.array_equal(points, expectedPoints)
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        assert numpy.array_equal(cells[name][0], expectedCells[name][0])
+        assert numpy.array_equal(cells[name][1], expectedCells[name][1])
+    assert cellCounts == engine.blockCellCounts(blocks)
+
+    # Cells are numbered verts first, then lines, polys and strips, like vtkPolyData does
+    colors = [builder.entityColor for builder in builders]
+    cellData = engine.blockCellData(cellCounts, colors)
+    expectedColors = numpy.concatenate([numpy.repeat(colors, [counts[name] for counts in cellCounts])
+                                        for name in ('verts', 'lines', 'polys', 'strips')])
+    assert cellData['EntityColor'].tolist() == expectedColors.tolist()
+
+
+def test_cell_colors_keep_the_geometry(dxf_file, tmp_path):
+    pytest.importorskip('vtkmodules')
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+
+    def read(path):
+        vtpReader = vtkXMLPolyDataReader()
+        vtpReader.SetFileName(path)
+        vtpReader.Update()
+        return vtpReader.GetOutput()
+
+    options = converter.DEFAULT_CONVERSION_OPTIONS
+    plain = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'plain.vtp'), options)
+    colored = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'colored.vtp'), options._replace(cell_colors=True))
+    assert (colored['points'], colored['cells']) == (plain['points'], plain['cells'])
+
+    polyData, expected = read(colored['output']), read(plain['output'])
+    points, cells = engine.polyDataToNumpy(polyData)
+    expectedPoints, expectedCells = engine.polyDataToNumpy(expected)
+    assert numpy.array_equal(points, expectedPoints)
+    assert sorted(cells) == sorted(expectedCells)
+    for name in cells:
+        assert numpy.array_equal(cells[name][1], expectedCells[name][1])
+    colors = numpy_support.vtk_to_numpy(polyData.GetCellData().GetArray('EntityColor'))
+    assert len(colors) == colored['cells']
+    assert set(colors.tolist()) == set([entity.color for entity in engine.iterDXFEntities(dxf_file)])
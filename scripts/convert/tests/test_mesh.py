@@ -0,0 +1,89 @@
+import numpy
+
+import engine
+
+
+class Entity(object):
+    def __init__(self, **attributes):
+        self.handle = '1F'
+        self.__dict__.update(attributes)
+
+
+class Vertex(object):
+    def __init__(self, flags, location=(0.0, 0.0, 0.0), vtx=None):
+        self.flags = flags
+        self.location = location
+        self.vtx = vtx
+
+
+def convert(handler, entity):
+    builder = engine.PolyDataBuilder(1, doublePrecision=True)
+    result = handler(entity, builder)
+    points, cells = builder.toArrays()
+    return result, points, cells
+
+
+def polys(cells):
+    sizes, connectivity = cells['polys']
+    return [connectivity[start:start + size].tolist() for start, size in zip(numpy.cumsum(sizes) - sizes, sizes)]
+
+
+def test_3dface_quad_and_triangle():
+    corners = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 1)]
+    _, points, cells = convert(engine.handle3DFace, Entity(points=corners))
+    assert points.tolist() == [list(map(float, c)) for c in corners]
+    assert polys(cells) == [[0, 1, 2, 3]]
+
+    # Triangles repeat their third corner
+    _, points, cells = convert(engine.handle3DFace, Entity(points=corners[:3] + [corners[2]]))
+    assert len(points) == 3
+    assert polys(cells) == [[0, 1, 2]]
+
+
+def test_3dface_without_enough_corners_is_dropped():
+    result, points, cells = convert(engine.handle3DFace, Entity(points=[(0, 0, 0), (1, 0, 0)]))
+    assert result is False
+    assert len(points) == 0
+
+
+def test_polyface():
+    locations = [(0, 0, 0), (1, 0, 0), (1, 1, 0), (0, 1, 0), (2, 0, 0)]
+    vertices = [Vertex(192, location) for location in locations]
+    # A quad, a triangle with a hidden edge, and a face referring past the vertex table
+    vertices += [Vertex(128, vtx=(1, 2, 3, 4)), Vertex(128, vtx=(2, -5, 3, 0)), Vertex(128, vtx=(1, 2, 9, 0))]
+    _, points, cells = convert(engine.handlePolyFace, Entity(vertices=vertices))
+    assert points.tolist() == [list(map(float, l)) for l in locations]
+    assert polys(cells) == [[0, 1, 2, 3], [1, 4, 2]]
+
+
+def test_polymesh_closed_in_n():
+    m, n = 2, 3
+    vertices = [Vertex(64, (float(i), float(j), 0.0)) for i in range(m) for j in range(n)]
+    entity = Entity(vertices=vertices, mcount=m, ncount=n, is_mclosed=False, is_nclosed=True)
+    _, points, cells = convert(engine.handlePolyMesh, entity)
+    assert len(points) == m * n
+    assert polys(cells) == [[0, 1, 4, 3], [1, 2, 5, 4], [2, 0, 3, 5]]
+
+
+def test_polymesh_with_missing_vertices_is_dropped():
+    vertices = [Vertex(64, (float(i), 0.0, 0.0)) for i in range(5)]
+    entity = Entity(vertices=vertices, mcount=2, ncount=3, is_mclosed=False, is_nclosed=False)
+    result, points, _ = convert(engine.handlePolyMesh, entity)
+    assert result is False
+    assert len(points) == 0
+
+
+def test_streamed_meshes(dxf_file):
+    counts = {}
+    builder = engine.PolyDataBuilder(1, doublePrecision=True)
+    for entity in engine.iterDXFEntities(dxf_file):
+        counts[entity.dxftype] = counts.get(entity.dxftype, 0) + 1
+        if entity.dxftype in ('3DFACE', 'POLYFACE'):
+            engine.handleEntity(entity, builder)
+    _, cells = builder.toArrays()
+
+    assert counts['3DFACE'] == 50 and counts['POLYFACE'] == 2
+    sizes = cells['polys'][0]
+    # Each shell is a 6 by 6 grid of vertices, its squares split into two triangles
+    assert (sizes == 3).sum() >= 2 * 2 * 5 * 5
+    assert len(sizes) == 50 + 2 * 2 * 5 * 5
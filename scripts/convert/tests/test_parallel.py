@@ -0,0 +1,45 @@
+import numpy
+import pytest
+
+import converter
+import engine
+
+
+@pytest.fixture
+def small_parts(monkeypatch):
+    # The generated file is far below the 4 MB parts, lower them so it splits
+    monkeypatch.setattr(engine, 'PARALLEL_PART_SIZE', 1 << 16)
+
+
+def convertMerged(path, parseJobs):
+    readerEngine = engine.ReaderEngine()
+    readerEngine.mergeBlocks = True
+    readerEngine.converter.parseJobs = parseJobs
+    readerEngine.converter.splitLayers = True
+    readerEngine.converter.collectStatistics = True
+    return readerEngine.convert(path)
+
+
+def test_parse_jobs_match_a_single_process(dxf_file, small_parts):
+    serial = convertMerged(dxf_file, 1)
+    parallel = convertMerged(dxf_file, 3)
+    assert parallel['statistics']['events']['parseJobs'] == 3
+    assert 'parseJobs' not in serial['statistics']['events']
+
+    block, expected = parallel['blocks'][0], serial['blocks'][0]
+    assert numpy.array_equal(block['points'], expected['points'])
+    assert sorted(block['cells']) == sorted(expected['cells'])
+    for name in expected['cells']:
+        assert numpy.array_equal(block['cells'][name][0], expected['cells'][name][0])
+        assert numpy.array_equal(block['cells'][name][1], expected['cells'][name][1])
+    assert numpy.array_equal(block['cellData']['EntityColor'], expected['cellData']['EntityColor'])
+    assert numpy.array_equal(block['cellData']['LayerId'], expected['cellData']['LayerId'])
+    assert block['layerNames'] == expected['layerNames']
+    assert parallel['entityCounts'] == serial['entityCounts']
+
+
+def test_parse_jobs_write_the_same_file(dxf_file, small_parts, tmp_path):
+    options = converter.DEFAULT_CONVERSION_OPTIONS
+    serial = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'serial.vtp'), options)
+    parallel = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'parallel.vtp'), options._replace(parse_jobs=3))
+    assert parallel['sha'] == serial['sha']
@@ -0,0 +1,118 @@
+import numpy
+import pytest
+
+import converter
+import engine
+
+
+def someCells(numberOfPoints):
+    empty = (numpy.zeros(0, dtype=converter.ID_TYPE), numpy.zeros(0, dtype=converter.ID_TYPE))
+    return {
+        'verts': empty,
+        'lines': (numpy.array([2, 3], dtype=converter.ID_TYPE), numpy.array([0, 1, 1, 2, 3], dtype=converter.ID_TYPE)),
+        'polys': (numpy.array([3], dtype=converter.ID_TYPE),
+                  numpy.array([numberOfPoints - 1, 0, 2], dtype=converter.ID_TYPE)),
+        'strips': empty,
+    }
+
+
+@pytest.mark.parametrize('bits', converter.QUANTIZED_BITS)
+def test_quantize_points(bits):
+    points = numpy.random.RandomState(0).uniform([650200, 4766170, -500], [652700, 4768695, 1200], (1000, 3))
+    quantized, offset, scale = converter.quantizePoints(points, bits)
+    limit = 2 ** (bits - 1) - 1
+    assert quantized.dtype == (numpy.int16 if bits == 16 else numpy.int32)
+    # The farthest points use the whole range
+    assert (numpy.abs(quantized).max(axis=0) == limit).all()
+    assert (numpy.abs(offset + quantized * scale - points) <= 0.5 * scale + 1e-9).all()
+
+
+def test_quantize_flat_points():
+    quantized, offset, scale = converter.quantizePoints(numpy.array([[1.0, 2.0, 5.0], [3.0, 2.0, 5.0]]), 16)
+    assert scale[1:].tolist() == [1.0, 1.0]
+    assert (quantized[:, 1:] == 0).all()
+
+
+def test_quantize_needs_16_or_32_bits():
+    with pytest.raises(ValueError):
+        converter.quantizePoints(numpy.zeros((1, 3)), 8)
+
+
+@pytest.mark.parametrize('bits', converter.QUANTIZED_BITS)
+def test_round_trip(tmp_path, bits):
+    points = numpy.random.RandomState(1).uniform(-100, 100, (50, 3))
+    cells = someCells(len(points))
+    cellData = { 'EntityColor': numpy.array([1, 1, 7], dtype=numpy.int16),
+                 'LayerId': numpy.array([0, 2, 1], dtype=numpy.int32) }
+    fieldData = { 'Origin': numpy.array([[651450.0, 4767432.0, 0.0]]) }
+    path = str(tmp_path / 'lev1.q{0}.bin'.format(bits))
+
+    written = converter.write_quantized(path, points, cells, fieldData, cellData, bits)
+    header, readPoints, readCells, readCellData = converter.read_quantized(path)
+
+    assert header == written
+    assert header['points'] == len(points)
+    assert header['fieldData']['Origin'] == [[651450.0, 4767432.0, 0.0]]
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        assert readCells[name][0].tolist() == cells[name][0].tolist()
+        assert readCells[name][1].tolist() == cells[name][1].tolist()
+    assert readCellData['EntityColor'].tolist() == [1, 1, 7]
+    assert readCellData['LayerId'].tolist() == [0, 2, 1]
+    assert header['maxError'] == (0.5 * numpy.array(header['scale'])).tolist()
+    assert (numpy.abs(readPoints - points) <= numpy.array(header['maxError']) + 1e-9).all()
+    assert len(converter.check_quantized(path, points, cells, cellData)) == 3
+
+
+def test_check_finds_other_cells(tmp_path):
+    points = numpy.zeros((4, 3))
+    path = str(tmp_path / 'lev1.q16.bin')
+    converter.write_quantized(path, points, someCells(len(points)))
+    other = someCells(len(points))
+    other['lines'] = (other['lines'][0], other['lines'][1][::-1].copy())
+    with pytest.raises(ValueError):
+        converter.check_quantized(path, points, other)
+
+
+def test_read_rejects_other_files(tmp_path):
+    path = tmp_path / 'lev1.vtp'
+    path.write_bytes(b'<?xml version="1.0"?>')
+    with pytest.raises(ValueError):
+        converter.read_quantized(str(path))
+
+
+def readVTP(path):
+    """The points, cells and cell data of a VTP file"""
+    pytest.importorskip('vtkmodules')
+    from vtkmodules.util import numpy_support
+    from vtkmodules.vtkIOXML import vtkXMLPolyDataReader
+
+    vtpReader = vtkXMLPolyDataReader()
+    vtpReader.SetFileName(path)
+    vtpReader.Update()
+    polyData = vtpReader.GetOutput()
+    points, cells = engine.polyDataToNumpy(polyData)
+    cellData = polyData.GetCellData()
+    arrays = dict([(cellData.GetArrayName(i), numpy_support.vtk_to_numpy(cellData.GetArray(i)))
+                   for i in range(cellData.GetNumberOfArrays())])
+    return points, cells, arrays
+
+
+def test_conversion_round_trip(dxf_file, tmp_path):
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(quantize_bits=16, cell_colors=True, layer_ids=True)
+    stats = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'lev1.vtp'), options)
+    header, points, cells, cellData = converter.read_quantized(stats['quantized']['output'])
+    expectedPoints, expectedCells, expectedCellData = readVTP(stats['output'])
+
+    assert len(points) == stats['points'] == len(expectedPoints)
+    # Dequantized points are within half the scale of each axis, give or take the rounding of doubles
+    errors = numpy.abs(points - expectedPoints).max(axis=0)
+    rounding = 4 * numpy.spacing(numpy.abs(expectedPoints).max(axis=0))
+    assert (errors <= 0.5 * numpy.array(header['scale']) + rounding).all()
+    for name in ('verts', 'lines', 'polys', 'strips'):
+        expected = expectedCells.get(name, (numpy.zeros(0), numpy.zeros(0)))
+        assert numpy.array_equal(cells[name][0], expected[0])
+        assert numpy.array_equal(cells[name][1], expected[1])
+    assert sorted(cellData) == ['EntityColor', 'LayerId']
+    assert len(cellData['EntityColor']) == stats['cells']
+    assert numpy.array_equal(cellData['EntityColor'], expectedCellData['EntityColor'])
+    assert numpy.array_equal(cellData['LayerId'], expectedCellData['LayerId'])
@@ -0,0 +1,176 @@
+import gzip, http.client, json, os, urllib.parse
+
+import pytest
+
+import converter
+import serve
+
+
+@pytest.mark.parametrize('header, expected', [
+    ('bytes=0-99', (0, 100)),
+    ('bytes=100-199', (100, 200)),
+    ('bytes=900-', (900, 1000)),
+    ('bytes=900-5000', (900, 1000)),
+    ('bytes=-50', (950, 1000)),
+    ('bytes=-5000', (0, 1000)),
+    ('BYTES = 10-19', (10, 20)),
+    # Ignored, the whole file is sent
+    ('items=0-99', None),
+    ('bytes=0-9,20-29', None),
+    ('bytes=-', None),
+    ('bytes=a-b', None),
+    ('bytes=10', None),
+])
+def test_parse_range(header, expected):
+    assert serve.parseRange(header, 1000) == expected
+
+
+@pytest.mark.parametrize('header, size', [
+    ('bytes=1000-', 1000),
+    ('bytes=200-100', 1000),
+    ('bytes=-0', 1000),
+    ('bytes=-10', 0),
+])
+def test_unsatisfiable_range(header, size):
+    with pytest.raises(ValueError):
+        serve.parseRange(header, size)
+
+
+@pytest.fixture
+def server(tmp_path):
+    content = bytes(bytearray(range(256))) * 40
+    path = tmp_path / 'lev1.vtp'
+    path.write_bytes(content)
+    converter.precompress(str(path), 'gzip')
+    server = serve.start_server(str(tmp_path))
+    yield server, content
+    server.shutdown()
+    server.server_close()
+
+
+def request(server, headers):
+    return get(server, serve.FILES_PATH + 'lev1.vtp', headers)
+
+
+def test_range_request(server):
+    server, content = server
+    status, headers, body = request(server, { 'Range': 'bytes=100-199' })
+    assert status == 206
+    assert body == content[100:200]
+    assert headers['content-range'] == 'bytes 100-199/{0}'.format(len(content))
+
+    status, _, body = request(server, { 'Range': 'bytes=-50' })
+    assert status == 206 and body == content[-50:]
+
+
+def test_unsatisfiable_range_request(server):
+    server, content = server
+    status, headers, body = request(server, { 'Range': 'bytes={0}-'.format(len(content)) })
+    assert status == 416
+    assert headers['content-range'] == 'bytes */{0}'.format(len(content))
+    assert body == b''
+
+
+def test_if_range(server):
+    server, content = server
+    status, headers, _ = request(server, {})
+    etag = headers['etag']
+    status, _, body = request(server, { 'Range': 'bytes=10-19', 'If-Range': etag })
+    assert status == 206 and body == content[10:20]
+    status, _, body = request(server, { 'Range': 'bytes=10-19', 'If-Range': '"stale"' })
+    assert status == 200 and body == content
+
+
+def test_range_of_compressed_file(server):
+    server, content = server
+    status, headers, whole = request(server, { 'Accept-Encoding': 'gzip' })
+    assert headers['content-encoding'] == 'gzip' and gzip.decompress(whole) == content
+    # Ranges are of the bytes sent, those of the compressed file
+    status, headers, body = request(server, { 'Accept-Encoding': 'gzip', 'Range': 'bytes=0-9' })
+    assert status == 206 and body == whole[:10]
+    assert headers['content-range'] == 'bytes 0-9/{0}'.format(len(whole))
+
+
+@pytest.fixture
+def converted(dxf_file, tmp_path):
+    """A server of a converted file, with a level of detail and a gzip copy, listed in the manifest"""
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(lod_tolerances=[1.0], precompressed=['gzip'])
+    output = tmp_path / 'out'
+    stats = converter.dxf_to_vtp(dxf_file, str(output / 'lev1.vtp'), options)
+    converter.write_manifest(str(output / 'manifest.json'), [converter.mineplan_piece(stats)])
+    with open(stats['output'], 'rb') as fp:
+        content = fp.read()
+    server = serve.start_server(str(output))
+    yield server, stats, content
+    server.shutdown()
+    server.server_close()
+
+
+def get(server, path, headers=None, method='GET'):
+    connection = http.client.HTTPConnection(*server.server_address[:2])
+    try:
+        connection.request(method, path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, dict((k.lower(), v) for k, v in response.getheaders()), response.read()
+    finally:
+        connection.close()
+
+
+def test_mineplan(converted):
+    server, stats, _ = converted
+    status, headers, body = get(server, '/api/v1/mineplan?site_code=OT&network_code=HNUG')
+    assert status == 200
+    mineplan = json.loads(body.decode('utf-8'))[0]
+    assert mineplan['pieces'][0]['file'] == server.url[:-len('/api')] + serve.FILES_PATH + 'lev1.vtp'
+    assert mineplan['pieces'][0]['sha'] == stats['sha']
+    assert mineplan['categories'] == [{ 'name': 'plan', 'label': 'Plan' }]
+    status, _, body = get(server, '/api/v1/mineplan', { 'If-None-Match': headers['etag'] })
+    assert status == 304 and body == b''
+
+
+def test_piece_without_category(converted, tmp_path):
+    server, stats, _ = converted
+    piece = converter.mineplan_piece(stats)
+    other = dict(piece, file='lev2.vtp', label='Level 2')
+    del other['category']
+    converter.write_manifest(str(tmp_path / 'out' / 'manifest.json'), [piece, other])
+    status, _, body = get(server, '/api/v1/mineplan')
+    assert status == 200
+    mineplan = json.loads(body.decode('utf-8'))[0]
+    assert [p['label'] for p in mineplan['pieces']] == ['Level 1', 'Level 2']
+    assert mineplan['categories'] == [{ 'name': 'plan', 'label': 'Plan' }]
+
+
+def test_conditional_requests(converted):
+    server, stats, content = converted
+    status, headers, body = get(server, serve.FILES_PATH + 'lev1.vtp')
+    assert status == 200 and body == content
+    assert headers['etag'] == serve._etag(stats['sha'])
+    assert 'content-encoding' not in headers
+    status, _, body = get(server, serve.FILES_PATH + 'lev1.vtp', { 'If-None-Match': headers['etag'] })
+    assert status == 304 and body == b''
+    status, _, _ = get(server, serve.FILES_PATH + 'lev1.vtp', { 'If-Modified-Since': headers['last-modified'] })
+    assert status == 304
+    status, _, _ = get(server, serve.FILES_PATH + 'lev1.vtp', { 'If-Match': '"stale"' })
+    assert status == 412
+
+
+def test_content_negotiation(converted):
+    server, stats, content = converted
+    status, headers, body = get(server, serve.FILES_PATH + 'lev1.vtp', { 'Accept-Encoding': 'gzip, deflate' })
+    assert status == 200 and headers['content-encoding'] == 'gzip'
+    assert gzip.decompress(body) == content
+    assert headers['etag'] == serve._etag(stats['sha'], 'gzip')
+    _, headers, _ = get(server, serve.FILES_PATH + 'lev1.vtp', { 'Accept-Encoding': 'gzip;q=0, identity' })
+    assert 'content-encoding' not in headers
+
+
+def test_head_and_other_files(converted):
+    server, stats, content = converted
+    status, headers, body = get(server, serve.FILES_PATH + 'lev1.vtp', method='HEAD')
+    assert status == 200 and body == b'' and headers['content-length'] == str(len(content))
+    lod = stats['lods'][0]
+    status, headers, _ = get(server, serve.FILES_PATH + urllib.parse.quote(os.path.basename(lod['output'])))
+    assert status == 200 and headers['etag'] == serve._etag(lod['sha'])
+    for path in (serve.FILES_PATH + '..%2Flev1.dxf', serve.FILES_PATH + 'missing.vtp', '/api/v1/other'):
+        assert get(server, path)[0] == 404
@@ -0,0 +1,83 @@
+import os
+
+import numpy
+import pytest
+
+import benchmark
+import engine
+
+
+@pytest.fixture
+def text_dxf_file(tmp_path):
+    path = str(tmp_path / 'lev1.dxf')
+    benchmark.generate_dxf(path, polylines=50, lwpolylines=50, lines=100, texts=20, mtexts=10, faces=20)
+    return path
+
+
+def assertSame(value, expected, where='conversion'):
+    """Compare conversions down to their arrays, JSON turning tuples into lists"""
+    if isinstance(expected, numpy.ndarray):
+        assert isinstance(value, numpy.ndarray), where
+        assert value.dtype == expected.dtype and numpy.array_equal(value, expected), where
+    elif isinstance(expected, dict):
+        assert sorted(value) == sorted(expected), where
+        for name in expected:
+            assertSame(value[name], expected[name], '{0}.{1}'.format(where, name))
+    elif isinstance(expected, (list, tuple)):
+        assert len(value) == len(expected), where
+        for i, (item, expectedItem) in enumerate(zip(value, expected)):
+            assertSame(item, expectedItem, '{0}[{1}]'.format(where, i))
+    else:
+        assert value == expected, where
+
+
+def readerEngine(sidecar=True):
+    readerEngine = engine.ReaderEngine()
+    readerEngine.sidecar = sidecar
+    readerEngine.mergeBlocks = True
+    converter = readerEngine.converter
+    converter.splitLayers = True
+    converter.textMode = 'labels'
+    converter.weldTolerance = 0.01
+    converter.origin = (651450.0, 4767432.0, 0.0)
+    return readerEngine
+
+
+def test_sidecar_round_trip(text_dxf_file, tmp_path):
+    conversion = readerEngine().convert(text_dxf_file)
+    path = str(tmp_path / 'lev1.sidecar.npz')
+    engine.write_sidecar(path, 'key', conversion)
+
+    assertSame(engine.read_sidecar(path, 'key'), conversion)
+    assert conversion['labels'] is not None and conversion['blocks'][0]['layerNames']
+    # Saved with other options, or unreadable
+    assert engine.read_sidecar(path, 'other key') is None
+    with open(path, 'r+b') as fp:
+        fp.truncate(os.path.getsize(path) // 2)
+    assert engine.read_sidecar(path, 'key') is None
+
+
+def test_reader_reuses_the_sidecar(text_dxf_file):
+    pytest.importorskip('vtkmodules')
+    first = readerEngine()
+    output = first.read(text_dxf_file)
+    assert first.cacheHit is None
+    assert os.path.isfile(engine.sidecar_path(text_dxf_file))
+    first.read(text_dxf_file)
+    assert first.cacheHit == 'memory'
+
+    again = readerEngine()
+    reused = again.read(text_dxf_file)
+    assert again.cacheHit == 'sidecar'
+    assertSame(again.conversion, first.conversion)
+    assert reused.GetNumberOfBlocks() == output.GetNumberOfBlocks()
+    for i in range(output.GetNumberOfBlocks()):
+        block, expected = reused.GetBlock(i), output.GetBlock(i)
+        assert (block.GetNumberOfPoints(), block.GetNumberOfCells()) == \
+            (expected.GetNumberOfPoints(), expected.GetNumberOfCells())
+
+    # A revised file is converted again
+    os.utime(text_dxf_file, (os.path.getmtime(text_dxf_file) + 10,) * 2)
+    revised = readerEngine()
+    revised.read(text_dxf_file)
+    assert revised.cacheHit is None
@@ -0,0 +1,79 @@
+import numpy
+import pytest
+
+import benchmark
+import engine
+
+dxfgrabber = pytest.importorskip('dxfgrabber')
+
+# The attributes of each entity type the handlers read
+ATTRIBUTES = {
+    'LINE': ['start', 'end'],
+    'LWPOLYLINE': ['points', 'elevation', 'is_closed'],
+    'POLYLINE': ['points', 'is_closed'],
+    '3DFACE': ['points'],
+    'TEXT': ['text', 'insert', 'height', 'rotation', 'halign', 'valign', 'align_point'],
+    'MTEXT': ['raw_text', 'insert', 'height', 'xdirection', 'attachment_point'],
+}
+
+
+@pytest.fixture
+def text_dxf_file(tmp_path):
+    """A generated DXF file of every entity type of the benchmark, text included"""
+    path = str(tmp_path / 'lev1.dxf')
+    benchmark.generate_dxf(path, polylines=100, lwpolylines=100, lines=200, texts=50, mtexts=50, faces=50,
+                           shells=2, shell_size=6)
+    return path
+
+
+def test_streamed_entities_match_dxfgrabber(text_dxf_file):
+    expected = dxfgrabber.readfile(text_dxf_file).entities
+    streamed = list(engine.iterDXFEntities(text_dxf_file))
+
+    assert [e.dxftype for e in streamed] == [e.dxftype for e in expected]
+    for entity, reference in zip(streamed, expected):
+        assert (entity.handle, entity.layer, entity.color) == (reference.handle, reference.layer, reference.color)
+        for name in ATTRIBUTES.get(entity.dxftype, []):
+            value, referenceValue = getattr(entity, name), getattr(reference, name)
+            if name == 'elevation':
+                # dxfgrabber keeps the LWPOLYLINE elevation as a point
+                referenceValue = referenceValue[2] if isinstance(referenceValue, tuple) else referenceValue
+            if name == 'xdirection':
+                # Normalized in another order than dxfgrabber does, to the last bit
+                assert numpy.allclose(value, referenceValue, rtol=0, atol=1e-15), (entity.dxftype, name)
+                continue
+            assert numpy.array_equal(numpy.array(value, dtype=object), numpy.array(referenceValue, dtype=object)), \
+                (entity.dxftype, name)
+        if entity.dxftype == 'POLYFACE':
+            points, faces = engine.meshArrays(entity)
+            referencePoints, referenceFaces = engine.meshArrays(reference)
+            assert numpy.array_equal(points, referencePoints)
+            assert numpy.array_equal(faces, referenceFaces)
+
+
+def test_streamed_conversion_matches_dxfgrabber(dxf_file):
+    streamed = engine.DXFConverter(streamEntities=True).convert(dxf_file)
+    loaded = engine.DXFConverter(streamEntities=False).convert(dxf_file)
+
+    assert sorted(streamed) == sorted(loaded)
+    for key in streamed:
+        points, cells = streamed[key].toArrays()[:2]
+        expectedPoints, expectedCells = loaded[key].toArrays()[:2]
+        assert numpy.array_equal(points, expectedPoints)
+        assert sorted(cells) == sorted(expectedCells)
+        for name in cells:
+            assert numpy.array_equal(cells[name][0], expectedCells[name][0])
+            assert numpy.array_equal(cells[name][1], expectedCells[name][1])
+
+
+def test_missing_seqend_is_counted(tmp_path):
+    path = str(tmp_path / 'noseqend.dxf')
+    with open(path, 'w') as fp:
+        fp.write('0\nSECTION\n2\nENTITIES\n0\nPOLYLINE\n8\nA\n70\n0\n'
+                 '0\nVERTEX\n10\n0.0\n20\n0.0\n30\n0.0\n0\nVERTEX\n10\n1.0\n20\n0.0\n30\n0.0\n'
+                 '0\nLINE\n8\nA\n10\n0.0\n20\n0.0\n11\n1.0\n21\n1.0\n0\nENDSEC\n0\nEOF\n')
+    statistics = engine.ConversionStatistics()
+    entities = list(engine.iterDXFEntities(path, statistics))
+    assert [e.dxftype for e in entities] == ['POLYLINE', 'LINE']
+    assert entities[0].points == [(0.0, 0.0, 0.0), (1.0, 0.0, 0.0)]
+    assert statistics.toDict()['events'].get('missingSeqend') == 1
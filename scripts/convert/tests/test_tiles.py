@@ -0,0 +1,59 @@
+import json, os
+
+import numpy
+
+import converter
+import engine
+
+
+def lineCells(pairs):
+    return {
+        'verts': (numpy.zeros(0, dtype=converter.ID_TYPE), numpy.zeros(0, dtype=converter.ID_TYPE)),
+        'lines': (numpy.full(len(pairs), 2, dtype=converter.ID_TYPE),
+                  numpy.array(pairs, dtype=converter.ID_TYPE).ravel()),
+        'polys': (numpy.zeros(0, dtype=converter.ID_TYPE), numpy.zeros(0, dtype=converter.ID_TYPE)),
+        'strips': (numpy.zeros(0, dtype=converter.ID_TYPE), numpy.zeros(0, dtype=converter.ID_TYPE)),
+    }
+
+
+def test_cells_go_to_the_tile_of_their_center():
+    points = numpy.array([[0.1, 0.1, 0], [0.4, 0.1, 0], [0.45, 0.1, 0], [0.7, 0.1, 0], [0.9, 0.9, 0], [0.95, 0.9, 0]])
+    cells = lineCells([[0, 1], [2, 3], [4, 5]])
+    cellData = { 'EntityColor': numpy.array([1, 2, 3], dtype=numpy.int16) }
+    tiles = list(converter.tileCells(points, cells, [0, 1, 0, 1, 0, 0], (2, 2, 1), cellData))
+
+    assert [tuple(int(i) for i in index) for index, _, _, _ in tiles] == [(0, 0, 0), (1, 0, 0), (1, 1, 0)]
+    # The line across the tile edge is kept whole in the tile holding its center
+    index, tilePoints, tiledCells, tiledCellData = tiles[1]
+    assert tilePoints.tolist() == [[0.45, 0.1, 0], [0.7, 0.1, 0]]
+    assert tiledCells['lines'][1].tolist() == [0, 1]
+    assert tiledCellData['EntityColor'].tolist() == [2]
+
+
+def test_every_cell_is_in_one_tile():
+    rand = numpy.random.RandomState(0)
+    points = rand.uniform(0, 100, (300, 3))
+    cells = lineCells(rand.randint(0, 300, (500, 2)))
+    tiles = list(converter.tileCells(points, cells, engine.pointBounds(points), (3, 2, 2)))
+    assert sum([len(c['lines'][0]) for _, _, c, _ in tiles]) == 500
+    tiledLines = sorted(map(tuple, numpy.concatenate([p[c['lines'][1]].reshape(-1, 6) for _, p, c, _ in tiles])))
+    assert tiledLines == sorted(map(tuple, points[cells['lines'][1]].reshape(-1, 6)))
+
+
+def test_tile_bounds_are_those_of_their_points(dxf_file, tmp_path):
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(tiles=(3, 3), quantize_bits=32)
+    stats = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'out' / 'lev1.vtp'), options)
+    with open(stats['tiling']['output']) as fp:
+        index = json.load(fp)
+
+    assert index['divisions'] == [3, 3, 1]
+    assert sum([tile['cells'] for tile in index['tiles']]) == stats['cells']
+    for tile in index['tiles']:
+        assert os.path.isfile(str(tmp_path / 'out' / tile['file']))
+        header, points, _, _ = converter.read_quantized(str(tmp_path / 'out' / tile['quantized']['file']))
+        assert len(points) == tile['points']
+        assert header['bounds'] == tile['bounds']
+        # Tiles hold the cells centered in their grid cell, their points may overflow it
+        low, high = numpy.array(tile['bounds'][0::2]), numpy.array(tile['bounds'][1::2])
+        cellLow, cellHigh = numpy.array(tile['cell'][0::2]), numpy.array(tile['cell'][1::2])
+        assert ((low <= cellHigh) & (high >= cellLow)).all()
@@ -0,0 +1,81 @@
+import asyncio, json, shutil, sys
+
+import pytest
+
+import converter
+
+if sys.version_info < (3, 7):
+    pytest.skip('watch.py needs Python 3.7', allow_module_level=True)
+
+import watch
+
+
+async def write_slowly(source, path, pieces, interval):
+    """Write source to path in pieces, interval seconds apart, like a copy over a slow share"""
+    with open(source, 'rb') as fp:
+        data = fp.read()
+    size = len(data) // pieces + 1
+    with open(path, 'wb') as fp:
+        for start in range(0, len(data), size):
+            fp.write(data[start:start + size])
+            fp.flush()
+            await asyncio.sleep(interval)
+
+
+def test_dropped_files_are_converted_once_settled(dxf_file, tmp_path):
+    watchDir = tmp_path / 'drop'
+    outputDir = tmp_path / 'converted'
+    watchDir.mkdir()
+    shutil.copyfile(dxf_file, str(watchDir / 'lev1.dxf'))
+    jobs = []
+    daemon = watch.WatchDaemon(str(watchDir), str(outputDir), 2, pollInterval=0.1, settleTime=1.0, report=jobs.append)
+
+    async def scenario():
+        # Written more slowly than it settles, lev2.dxf must only be converted once complete
+        written = asyncio.ensure_future(write_slowly(dxf_file, str(watchDir / 'lev2.dxf'), 8, 0.5))
+        await daemon.run(idleExit=1.5)
+        await written
+
+    asyncio.run(scenario())
+
+    expected = converter.dxf_to_vtp(dxf_file, str(tmp_path / 'expected.vtp'))
+    for name in ('lev1', 'lev2'):
+        assert converter.file_sha256(str(outputDir / '{0}.vtp'.format(name))) == expected['sha']
+    assert sorted(job['input'] for job in jobs) == [str(watchDir / 'lev1.dxf'), str(watchDir / 'lev2.dxf')]
+    assert all(job['error'] is None and not job['cached'] for job in jobs)
+
+    with open(daemon.manifestPath) as fp:
+        pieces = json.load(fp)['pieces']
+    assert [piece['file'] for piece in pieces] == ['lev1.vtp', 'lev2.vtp']
+    assert pieces[1]['label'] == 'Level 2'
+    assert pieces[1]['sha'] == expected['sha']
+    assert pieces[1]['entity_counts'] == expected['entityCounts']
+
+    with open(daemon.metricsPath) as fp:
+        metrics = json.load(fp)
+    assert metrics['jobs'] == { 'queued': 2, 'converted': 2 }
+    assert metrics['queueDepth'] == 0 and metrics['running'] == 0
+    assert metrics['maxQueueDepth'] >= 1
+    latency = metrics['latency']
+    for name in ('wait', 'convert', 'total'):
+        assert 0 <= latency[name]['p50'] <= latency[name]['max']
+    assert latency['total']['max'] >= latency['convert']['max']
+    assert len(metrics['lastJobs']) == 2
+
+
+def test_debouncer_waits_for_unchanged_files(tmp_path):
+    path = str(tmp_path / 'lev1.dxf')
+    with open(path, 'w') as fp:
+        fp.write('0\n')
+    debouncer = watch.FileDebouncer(settleTime=5.0)
+    assert debouncer.scan([path], now=0) == []
+    assert debouncer.pending() == 1
+    assert debouncer.scan([path], now=4) == []
+    assert debouncer.scan([path], now=5) == [path]
+    assert debouncer.pending() == 0
+    # Settled files are only reported again after changing
+    assert debouncer.scan([path], now=20) == []
+    with open(path, 'a') as fp:
+        fp.write('EOF\n')
+    assert debouncer.scan([path], now=21) == []
+    assert debouncer.scan([path], now=26) == [path]
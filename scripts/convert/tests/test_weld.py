@@ -0,0 +1,75 @@
+import numpy
+import pytest
+
+import engine
+
+
+def checkWeld(points, tolerance, welded, ids):
+    """No point moved by more than tolerance, and the points kept are farther than tolerance apart"""
+    assert len(ids) == len(points)
+    assert (numpy.sqrt(((welded[ids] - points) ** 2).sum(axis=1)) <= tolerance).all()
+    # Each point kept is an input point, kept in input order
+    positions = [numpy.nonzero((points == point).all(axis=1))[0][0] for point in welded]
+    assert (ids[positions] == numpy.arange(len(welded))).all()
+    assert (numpy.diff(positions) > 0).all()
+    distances = ((welded[:, None, :] - welded[None, :, :]) ** 2).sum(axis=2)
+    numpy.fill_diagonal(distances, numpy.inf)
+    assert (distances > tolerance * tolerance).all()
+
+
+def test_exact_duplicates():
+    points = numpy.array([[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [1.0, 2.0, 3.0], [0.0, -0.0, 0.0], [-0.0, 0.0, 0.0]])
+    welded, ids = engine.weldPoints(points, 0)
+    assert welded.tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0], [0.0, 0.0, 0.0]]
+    assert ids.tolist() == [0, 1, 0, 2, 2]
+
+
+def test_points_straddling_a_cell_edge_merge():
+    points = numpy.array([[0.999, 0.0, 0.0], [1.001, 0.0, 0.0]])
+    welded, ids = engine.weldPoints(points, 0.01)
+    assert len(welded) == 1
+    assert ids.tolist() == [0, 0]
+
+
+def test_points_in_one_cell_farther_than_tolerance_stay():
+    # Both in the cell [0, 1) of each axis, but sqrt(3) * 0.9 apart
+    points = numpy.array([[0.05, 0.05, 0.05], [0.95, 0.95, 0.95]])
+    welded, ids = engine.weldPoints(points, 1.0)
+    assert len(welded) == 2
+    assert ids.tolist() == [0, 1]
+
+
+def test_chains_are_not_merged_into_one_point():
+    points = numpy.array([[0.0, 0.0, 0.0], [0.8, 0.0, 0.0], [1.6, 0.0, 0.0]])
+    welded, ids = engine.weldPoints(points, 1.0)
+    assert welded.tolist() == [[0.0, 0.0, 0.0], [1.6, 0.0, 0.0]]
+    assert ids.tolist() == [0, 0, 1]
+
+
+@pytest.mark.parametrize('tolerance', [0.15, 0.5, 1.0])
+@pytest.mark.parametrize('seed', range(5))
+def test_random_points(seed, tolerance):
+    rand = numpy.random.RandomState(seed)
+    points = rand.uniform(-3, 3, (200, 3)).round(1)
+    points = numpy.concatenate([points, points[:50]])
+    welded, ids = engine.weldPoints(points, tolerance)
+    checkWeld(points, tolerance, welded, ids)
+
+
+def test_dense_cluster():
+    # Comparing every pair of points of a cell would take 10^10 distances
+    rand = numpy.random.RandomState(0)
+    points = rand.uniform(0, 0.02, (100000, 3))
+    welded, ids = engine.weldPoints(points, 0.01)
+    assert len(welded) < 100
+    checkWeld(points, 0.01, welded, ids)
+
+
+def test_builder_welds_line_work():
+    builder = engine.PolyDataBuilder(1, weldTolerance=0.01, doublePrecision=True)
+    for start, end in (((0, 0, 0), (1, 0, 0)), ((1.001, 0, 0), (2, 0, 0))):
+        builder.insertLine(builder.insertPoints([start, end]), 2)
+    points, cells = builder.toArrays()
+    assert len(points) == 3
+    assert builder.weldStatistics == (4, 3)
+    assert cells['lines'][1].tolist() == [0, 1, 1, 2]
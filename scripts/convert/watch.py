@@ -0,0 +1,367 @@
+"""
+    Watch-folder daemon of the DXF to VTP converter.
+
+    Watches a drop directory for DXF files, waits until each new or changed
+    file has stopped changing, since revisions are often copied over slow
+    shares, and queues it for conversion on a pool of worker processes.  The
+    VTP files, and a manifest describing them as mineplan pieces, are
+    written to an output directory, along with the depth of the queue and
+    the latency of the jobs, as they complete:
+
+        python watch.py --watch-dir /data/drop --output-dir /data/converted --jobs 4
+
+    Needs Python 3.7, for asyncio and the initializer of the worker
+    processes.  tests/test_watch.py runs the daemon over a temporary
+    directory, with one of the files written slowly in pieces.
+"""
+import asyncio, collections, concurrent.futures, concurrent.futures.process, json, os, signal, sys, time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import engine
+import converter
+
+
+# Seconds between two scans of the watched directory
+DEFAULT_POLL_INTERVAL = 1.0
+
+# Seconds a file must keep the same size and modification time before it
+# is converted, so files still being copied are left alone
+DEFAULT_SETTLE_TIME = 5.0
+
+# Number of files waiting for a worker before the scans wait for room
+DEFAULT_QUEUE_SIZE = 64
+
+# Number of the latest jobs whose latencies make the percentiles of the metrics
+LATENCY_WINDOW = 1000
+
+
+class FileDebouncer(object):
+    """
+        Tracks the size and modification time of files across scans of a
+        directory.  A file settles once both stayed the same for settleTime
+        seconds, and settles again only after changing.
+    """
+    def __init__(self, settleTime=DEFAULT_SETTLE_TIME):
+        self.settleTime = settleTime
+        self._seen = {}
+        self._settled = {}
+
+    def scan(self, paths, now=None):
+        """Returns those of paths which settled since the last scan, forgetting the files gone since"""
+        now = time.time() if now is None else now
+        settled = []
+        current = set()
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            current.add(path)
+            signature = (stat.st_size, stat.st_mtime)
+            seen = self._seen.get(path)
+            if seen is None or seen[0] != signature:
+                self._seen[path] = (signature, now)
+            elif now - seen[1] >= self.settleTime and self._settled.get(path) != signature:
+                self._settled[path] = signature
+                settled.append(path)
+
+        for path in set(self._seen) - current:
+            del self._seen[path]
+            self._settled.pop(path, None)
+        return settled
+
+    def pending(self):
+        """Number of files seen changing which did not settle yet"""
+        return len([path for path, (signature, _) in self._seen.items() if self._settled.get(path) != signature])
+
+
+def _percentiles(values):
+    if not values:
+        return None
+    values = sorted(values)
+    pick = lambda fraction: values[min(len(values) - 1, int(fraction * len(values)))]
+    return { 'p50': pick(0.5), 'p95': pick(0.95), 'max': values[-1], 'mean': sum(values) / len(values) }
+
+
+class WatchMetrics(object):
+    """
+        Queue depth and job latencies of the daemon.  Each job is timed
+        waiting in the queue (wait), converting in a worker (convert) and
+        from its file settling to its output being written (total).
+    """
+    def __init__(self):
+        self.started = time.time()
+        self.queueDepth = 0
+        self.maxQueueDepth = 0
+        self.running = 0
+        self.counts = collections.Counter()
+        self.latencies = dict([(name, collections.deque(maxlen=LATENCY_WINDOW))
+                               for name in ('wait', 'convert', 'total')])
+        self.lastJobs = collections.deque(maxlen=20)
+
+    def setQueueDepth(self, depth):
+        self.queueDepth = depth
+        self.maxQueueDepth = max(self.maxQueueDepth, depth)
+
+    def addJob(self, job):
+        self.counts['failed' if job['error'] else ('cached' if job['cached'] else 'converted')] += 1
+        self.latencies['wait'].append(job['started'] - job['settled'])
+        self.latencies['convert'].append(job['finished'] - job['started'])
+        self.latencies['total'].append(job['finished'] - job['settled'])
+        self.lastJobs.append(job)
+
+    def toDict(self):
+        return {
+            'uptime': time.time() - self.started,
+            'queueDepth': self.queueDepth,
+            'maxQueueDepth': self.maxQueueDepth,
+            'running': self.running,
+            'jobs': dict(self.counts),
+            'latency': dict([(name, _percentiles(list(values))) for name, values in self.latencies.items()]),
+            'lastJobs': list(self.lastJobs),
+        }
+
+
+def _write_json(path, value):
+    # Viewers may read the file at any time, replace it in one step
+    tmp = '{0}.{1}.tmp'.format(path, os.getpid())
+    with open(tmp, 'w') as fp:
+        json.dump(value, fp, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+class WatchDaemon(object):
+    """
+        Converts the DXF files of watchDir to VTP files of the same name in
+        outputDir as they settle (see FileDebouncer), with the
+        ConversionOptions options of converter.dxf_to_vtp().  Files are queued on an asyncio queue
+        of queueSize, and converted on jobs worker processes.  A file
+        settling again while queued or converting is converted once more
+        after that job, never by two jobs at once, which would write the same
+        outputs.  A worker process dying replaces the pool, which is broken
+        then, and its job is retried once.  The manifest
+        of the converted files and the metrics (see WatchMetrics) are
+        rewritten after each job, to manifest.json and metrics.json in
+        outputDir by default.  report(job) is called as each job completes.
+    """
+    def __init__(self, watchDir, outputDir, jobs=1, options=None, pollInterval=DEFAULT_POLL_INTERVAL,
+                 settleTime=DEFAULT_SETTLE_TIME, queueSize=DEFAULT_QUEUE_SIZE, manifestPath=None,
+                 metricsPath=None, report=None):
+        self.watchDir = watchDir
+        self.outputDir = outputDir
+        self.jobs = max(1, jobs)
+        self.options = options or converter.DEFAULT_CONVERSION_OPTIONS
+        self.pollInterval = pollInterval
+        self.queueSize = queueSize
+        self.manifestPath = manifestPath or os.path.join(outputDir, 'manifest.json')
+        self.metricsPath = metricsPath or os.path.join(outputDir, 'metrics.json')
+        self.report = report
+        self.debouncer = FileDebouncer(settleTime)
+        self.metrics = WatchMetrics()
+        self._pool = None
+        self._inFlight = set()
+        self._rerun = {}
+
+        # Pieces of earlier runs stay in the manifest until converted again
+        self.pieces = {}
+        if os.path.isfile(self.manifestPath):
+            with open(self.manifestPath) as fp:
+                self.pieces = dict([(piece['file'], piece) for piece in json.load(fp)['pieces']])
+
+    async def run(self, stop=None, idleExit=None):
+        """
+            Watch and convert until stop, an asyncio.Event, is set, or once
+            nothing was queued, converting or changing for idleExit seconds.
+            Jobs already queued are completed before returning.
+        """
+        if not os.path.isdir(self.outputDir):
+            os.makedirs(self.outputDir)
+
+        queue = asyncio.Queue(self.queueSize)
+        self._pool = self._newPool()
+        workers = [asyncio.ensure_future(self._work(queue)) for _ in range(self.jobs)]
+        try:
+            await self._watch(queue, stop, idleExit)
+            await queue.join()
+        finally:
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            self._pool.shutdown(wait=True)
+
+        return self.metrics
+
+    def _newPool(self):
+        initializer = converter._init_batch_worker if self.options.engine == 'paraview' else None
+        return concurrent.futures.ProcessPoolExecutor(self.jobs, initializer=initializer)
+
+    def _replacePool(self, pool):
+        """Replace a pool broken by a worker process dying, unless another job did already"""
+        if self._pool is pool:
+            pool.shutdown(wait=False)
+            self._pool = self._newPool()
+
+    async def _watch(self, queue, stop, idleExit):
+        lastActivity = time.time()
+        while stop is None or not stop.is_set():
+            for path in self.debouncer.scan(converter.find_dxf_files(self.watchDir)):
+                if path in self._inFlight:
+                    # Converted again once its current job completes
+                    self._rerun[path] = time.time()
+                    continue
+                # Waits for room in the queue when the workers fall behind
+                self._inFlight.add(path)
+                await queue.put({ 'input': path, 'settled': time.time() })
+                self.metrics.counts['queued'] += 1
+                self.metrics.setQueueDepth(queue.qsize())
+
+            now = time.time()
+            if queue.qsize() or self.metrics.running or self.debouncer.pending():
+                lastActivity = now
+            elif idleExit is not None and now - lastActivity >= idleExit:
+                return
+
+            if stop is None:
+                await asyncio.sleep(self.pollInterval)
+            else:
+                try:
+                    await asyncio.wait_for(stop.wait(), self.pollInterval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _work(self, queue):
+        while True:
+            job = await queue.get()
+            path = job['input']
+            self.metrics.setQueueDepth(queue.qsize())
+            try:
+                while job is not None:
+                    await self._convert(job)
+                    # The file settled again meanwhile, convert its latest revision
+                    settled = self._rerun.pop(path, None)
+                    job = { 'input': path, 'settled': settled } if settled is not None else None
+                    if job is not None:
+                        self.metrics.counts['queued'] += 1
+            finally:
+                self._rerun.pop(path, None)
+                self._inFlight.discard(path)
+                queue.task_done()
+
+    async def _convert(self, job):
+        loop = asyncio.get_running_loop()
+        self.metrics.running += 1
+        name = os.path.splitext(os.path.basename(job['input']))[0]
+        task = (job['input'], os.path.join(self.outputDir, '{0}.vtp'.format(name)), self.options)
+        job['started'] = time.time()
+        stats = None
+        for attempt in range(2):
+            pool = self._pool
+            try:
+                result = await loop.run_in_executor(pool, converter._batch_convert, task)
+                _, job['output'], job['error'], _, stats = result
+                break
+            except Exception as err:
+                job['output'], job['error'] = task[1], '{0}: {1}'.format(type(err).__name__, err)
+                if not isinstance(err, concurrent.futures.process.BrokenProcessPool):
+                    break
+                # A worker process died, which breaks the whole pool
+                self._replacePool(pool)
+        job['finished'] = time.time()
+        job['cached'] = bool(stats and stats['cached'])
+
+        if job['error'] is None:
+            piece = converter.mineplan_piece(stats)
+            self.pieces[piece['file']] = piece
+            _write_json(self.manifestPath, { 'pieces': [self.pieces[f] for f in sorted(self.pieces)] })
+        self.metrics.running -= 1
+        self.metrics.addJob(job)
+        _write_json(self.metricsPath, self.metrics.toDict())
+        if self.report:
+            self.report(job)
+
+
+def print_job(job):
+    status = 'ok' if job['error'] is None else 'FAILED ({0})'.format(job['error'])
+    if job['cached']:
+        status = 'cached'
+    print('{0} -> {1}: {2}, waited {3:.2f}s, converted in {4:.2f}s'.format(
+        job['input'], job['output'], status, job['started'] - job['settled'], job['finished'] - job['started']))
+    sys.stdout.flush()
+
+
+if __name__ == '__main__':
+    import argparse, multiprocessing
+
+    parser = argparse.ArgumentParser(description="Watch a directory and convert the DXF files dropped there to VTP")
+    parser.add_argument('--watch-dir', default=None, help="Directory where DXF files are dropped")
+    parser.add_argument('--output-dir', default=None,
+                        help="Directory where VTP files, the manifest and the metrics are written")
+    parser.add_argument('--jobs', type=int, default=multiprocessing.cpu_count(), help="Number of worker processes")
+    parser.add_argument('--poll-interval', type=float, default=DEFAULT_POLL_INTERVAL,
+                        help="Seconds between two scans of --watch-dir")
+    parser.add_argument('--settle-time', type=float, default=DEFAULT_SETTLE_TIME,
+                        help="Seconds a file must stay unchanged before it is converted")
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Number of files waiting for a worker before scans wait for room")
+    parser.add_argument('--manifest', default=None,
+                        help="Path to the manifest of the converted files (default: manifest.json in --output-dir)")
+    parser.add_argument('--metrics', default=None,
+                        help="Path to the JSON file of queue and latency metrics (default: metrics.json in "
+                             "--output-dir)")
+    parser.add_argument('--exit-when-idle', type=float, default=None, metavar='SECONDS',
+                        help="Exit once nothing was queued, converting or changing for this long")
+    parser.add_argument('--engine', choices=converter.ENGINES, default='standalone',
+                        help="Convert with the standalone engine, or through the ParaView reader plugin (needs "
+                             "pvpython)")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Directory of previous conversions, unchanged inputs are copied from there instead of "
+                             "converted")
+    parser.add_argument('--mineplan', default=None, help="Mineplan JSON whose boundaries give the origin of the points")
+    parser.add_argument('--weld-tolerance', type=float, default=None,
+                        help="Merge points of the line work closer than this distance, in drawing units")
+    parser.add_argument('--text-mode', choices=engine.TEXT_MODES, default='glyphs',
+                        help="Draw text as vector text glyphs, or write it as labeled points")
+    parser.add_argument('--block-mode', choices=engine.BLOCK_MODES, default='ignore',
+                        help="Drop INSERT entities, write them as instances, or expand them")
+    parser.add_argument('--cell-colors', action='store_true', help="Write the entity color of every cell as cell data")
+    parser.add_argument('--quantize', type=int, choices=converter.QUANTIZED_BITS, default=None, metavar='BITS',
+                        help="Also write a copy of each file with its points quantized to 16 or 32 bit integers")
+    parser.add_argument('--precompress', nargs='+', choices=list(converter.PRECOMPRESSED_ENCODINGS.keys()), default=[],
+                        metavar='ENCODING', help="Also write gzip and/or br compressed copies of the converted files, "
+                                                 "for serve.py")
+    parser.add_argument('--delta', action='store_true',
+                        help="Convert revised files as a delta of their previous conversion, only converting the "
+                             "entities added or changed")
+    args = parser.parse_args()
+
+    if not (args.watch_dir and args.output_dir):
+        parser.error('--watch-dir and --output-dir are required')
+
+    options = converter.DEFAULT_CONVERSION_OPTIONS._replace(
+        engine=args.engine,
+        cache_dir=args.cache_dir,
+        origin=converter.mineplan_origin(args.mineplan) if args.mineplan else None,
+        weld_tolerance=args.weld_tolerance,
+        text_mode=args.text_mode,
+        block_mode=args.block_mode,
+        cell_colors=args.cell_colors,
+        quantize_bits=args.quantize,
+        precompressed=args.precompress,
+        delta=args.delta,
+    )
+    daemon = WatchDaemon(args.watch_dir, args.output_dir, args.jobs, options, args.poll_interval, args.settle_time,
+                         args.queue_size, args.manifest, args.metrics, report=print_job)
+
+    async def main():
+        stop = asyncio.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            try:
+                asyncio.get_running_loop().add_signal_handler(signum, stop.set)
+            except NotImplementedError:
+                pass
+        await daemon.run(stop, args.exit_when_idle)
+
+    print('Watching {0}, converting to {1} on {2} workers'.format(args.watch_dir, args.output_dir, daemon.jobs))
+    sys.stdout.flush()
+    asyncio.run(main())